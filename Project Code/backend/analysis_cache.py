@@ -0,0 +1,105 @@
+import os
+import hashlib
+import pickle
+import threading
+
+CACHE_DIR_NAME = ".analysis_cache"
+MAX_CACHE_ENTRIES = 256
+DIGEST_BLOCK_SIZE = 64 * 1024
+
+
+def _content_digest(path, size):
+    # The first and last DIGEST_BLOCK_SIZE bytes, so the cost does not grow
+    # with the file. A same-size rewrite within the mtime granularity changes
+    # a CSV's header or trailing rows in practice; an edit confined to the
+    # middle of a large file is the one case this does not see.
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(DIGEST_BLOCK_SIZE))
+        if size > 2 * DIGEST_BLOCK_SIZE:
+            f.seek(size - DIGEST_BLOCK_SIZE)
+        digest.update(f.read(DIGEST_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, key_path=None):
+    # key_path names the file in the fingerprint when `path` is a snapshot
+    # copy of it, so pinned reads share the live file's cache entry.
+    path = os.path.abspath(path)
+    key_path = os.path.abspath(key_path) if key_path else path
+    st = os.stat(path)
+    return (key_path, st.st_size, st.st_mtime_ns, _content_digest(path, st.st_size))
+
+
+def _cache_dir(csv_folder):
+    return os.path.join(csv_folder, CACHE_DIR_NAME)
+
+
+def _path_key(path):
+    return hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _entry_path(csv_folder, fingerprint):
+    # One entry per source file; the fingerprint is stored inside and compared on read.
+    return os.path.join(_cache_dir(csv_folder), _path_key(fingerprint[0]) + ".pkl")
+
+
+def get_cached_analysis(csv_folder, fingerprint):
+    entry_path = _entry_path(csv_folder, fingerprint)
+    try:
+        with open(entry_path, "rb") as f:
+            cached_fingerprint, analysis = pickle.load(f)
+    except Exception:
+        return None
+    if tuple(cached_fingerprint) != tuple(fingerprint):
+        return None
+    try:
+        os.utime(entry_path)
+    except OSError:
+        pass
+    return analysis
+
+
+def store_analysis(csv_folder, fingerprint, analysis, max_entries=MAX_CACHE_ENTRIES):
+    cache_dir = _cache_dir(csv_folder)
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_path = _entry_path(csv_folder, fingerprint)
+    tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump((fingerprint, analysis), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, entry_path)
+    evict_analysis_cache(csv_folder, max_entries)
+
+
+def evict_analysis_cache(csv_folder, max_entries=MAX_CACHE_ENTRIES):
+    # Least recently used entries go first; hits refresh the entry's mtime.
+    cache_dir = _cache_dir(csv_folder)
+    try:
+        entries = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".pkl")]
+    except FileNotFoundError:
+        return
+    if len(entries) <= max_entries:
+        return
+    entries.sort(key=lambda p: os.stat(p).st_mtime_ns if os.path.exists(p) else 0)
+    for entry_path in entries[:len(entries) - max_entries]:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+
+def invalidate_analysis_cache(csv_folder, file_path=None):
+    if file_path is None:
+        cache_dir = _cache_dir(csv_folder)
+        if os.path.isdir(cache_dir):
+            for f in os.listdir(cache_dir):
+                try:
+                    os.remove(os.path.join(cache_dir, f))
+                except OSError:
+                    pass
+        return
+    path = os.path.abspath(file_path)
+    try:
+        os.remove(os.path.join(_cache_dir(csv_folder), _path_key(path) + ".pkl"))
+    except OSError:
+        pass
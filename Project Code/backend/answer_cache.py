@@ -0,0 +1,104 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class AnswerCache:
+    # LRU + TTL cache of agent answers keyed by (normalized question, model,
+    # data version). With disk_path set, entries also persist in SQLite.
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, created REAL)"
+            )
+            self._db.commit()
+
+    def _key(self, question, model_id, data_version):
+        raw = "\x1f".join([normalize_question(question), model_id, str(data_version)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, question, model_id, data_version):
+        key = self._key(question, model_id, data_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._entries[key] = entry
+            if entry is not None and self._expired(entry[1]):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question, model_id, data_version, answer):
+        key = self._key(question, model_id, data_version)
+        created = time.time()
+        with self._lock:
+            self._entries[key] = (answer, created)
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)",
+                                 (key, json.dumps(answer, default=str), created))
+                self._db.commit()
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._db.commit()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_backed": self._db is not None,
+            }
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_expander import expand_dataset  # noqa: E402
+from error_injection import inject_errors_into_folder, read_error_manifest, score_analysis  # noqa: E402
+from data_error_recognition_agent import analyze_csv_file  # noqa: E402
+
+
+def write_seed_tables(folder):
+    pd.DataFrame({
+        "customer_id": ["C001", "C002", "C003", "C004", "C005"],
+        "name": ["John Smith", "Mary Jones", "Ann Lee", "Bob Ray", "Eve Stone"],
+        "city": ["Paris", "Rome", "Oslo", "Rome", "Lima"],
+        "joined": ["2023-01-15", "2023-02-20", "2024-03-14", "2022-12-31", "2021-07-19"],
+        "credit_limit": [1000, 2500, 1500, 3000, 1200],
+    }).to_csv(os.path.join(folder, "customers_data.csv"), index=False)
+    pd.DataFrame({
+        "order_id": [1, 2, 3, 4, 5, 6],
+        "customer_id": ["C001", "C001", "C002", "C003", "C004", "C005"],
+        "order_date": ["2024-01-13", "2024-02-17", "2024-02-21", "2024-03-30", "2024-04-14", "2024-05-25"],
+        "total": [10.5, 20.25, 3.0, 7.5, 99.99, 45.0],
+        "status": ["shipped", "shipped", "pending", "cancelled", "shipped", "pending"],
+    }).to_csv(os.path.join(folder, "orders_data.csv"), index=False)
+
+
+def run(rows, seed, mode, rates):
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        write_seed_tables(folder)
+        start = time.perf_counter()
+        expand_dataset(folder, rows, seed=seed)
+        results["expand_seconds"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        results["injected"] = inject_errors_into_folder(folder, rates=rates, seed=seed)
+        results["inject_seconds"] = round(time.perf_counter() - start, 3)
+        results["tables"] = {}
+        for filename in sorted(results["injected"]):
+            path = os.path.join(folder, filename)
+            start = time.perf_counter()
+            analysis = analyze_csv_file(path, mode=mode)
+            elapsed = time.perf_counter() - start
+            score = score_analysis(analysis, pd.read_csv(path), read_error_manifest(folder, filename))
+            score["analyze_seconds"] = round(elapsed, 3)
+            results["tables"][filename] = score
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score analyze_csv_file against injected ground truth.")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=["auto", "exact", "streaming"], default="auto")
+    parser.add_argument("--rates", type=json.loads, default=None,
+                        help='JSON error-type rates, e.g. \'{"outlier": 0.02}\'')
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.seed, args.mode, args.rates), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
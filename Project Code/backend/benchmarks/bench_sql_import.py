@@ -0,0 +1,83 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_tokenizer import write_inserts_to_csv  # noqa: E402
+
+TRICKY_NAMES = ["O''Brien", "Smith (Jr.)", "a;b", "it\\'s", "plain", "comma, inside", "(nested) parens"]
+
+
+def generate_dump(n_rows, rows_per_insert=1000, seed=0):
+    rng = random.Random(seed)
+    parts = [
+        "-- generated benchmark dump; values contain ; ( ) and quotes\n",
+        "CREATE TABLE customers (id INT PRIMARY KEY, name VARCHAR(100), balance DECIMAL(10,2), joined DATE, note TEXT);\n",
+    ]
+    for start in range(0, n_rows, rows_per_insert):
+        values = []
+        for i in range(start, min(start + rows_per_insert, n_rows)):
+            name = rng.choice(TRICKY_NAMES)
+            note = "NULL" if i % 11 == 0 else f"'note {i} /* not a comment */'"
+            values.append(f"({i}, '{name}', {rng.uniform(-100, 10000):.2f}, '2024-{1 + i % 12:02d}-{1 + i % 28:02d}', {note})")
+        parts.append("INSERT INTO customers (id, name, balance, joined, note) VALUES\n" + ",\n".join(values) + ";\n")
+    return "".join(parts)
+
+
+def legacy_regex_import(sql_text):
+    # The regex parser save_insert_statements_to_csv used before the tokenizer;
+    # kept here only to compare against.
+    insert_pattern = re.compile(
+        r"INSERT INTO\s+(\w+)\s*\(([^)]+)\)\s*VALUES\s*((?:\([^;]+?\))(?:\s*,\s*\([^;]+?\))*)\s*;",
+        re.IGNORECASE | re.DOTALL
+    )
+    rows = 0
+    for match in insert_pattern.finditer(sql_text):
+        values_block = match.group(3).replace('\n', ' ')
+        for value_str in re.findall(r"\(([^)]+)\)", values_block):
+            re.split(r",(?=(?:[^']*'[^']*')*[^']*$)", value_str)
+            rows += 1
+    return rows
+
+
+def run(sizes, rows_per_insert, legacy_max_rows):
+    results = []
+    for n_rows in sizes:
+        dump = generate_dump(n_rows, rows_per_insert)
+        with tempfile.TemporaryDirectory() as folder:
+            start = time.perf_counter()
+            counts = write_inserts_to_csv(dump, folder)
+            elapsed = time.perf_counter() - start
+        result = {
+            "rows": n_rows,
+            "bytes": len(dump),
+            "tokenizer_seconds": round(elapsed, 4),
+            "rows_per_second": round(n_rows / elapsed) if elapsed else None,
+            "rows_written": counts.get("customers", 0),
+        }
+        if n_rows <= legacy_max_rows:
+            start = time.perf_counter()
+            result["legacy_rows_found"] = legacy_regex_import(dump)
+            result["legacy_seconds"] = round(time.perf_counter() - start, 4)
+        results.append(result)
+        print(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQL dump import into per-table CSVs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 200_000])
+    parser.add_argument("--rows-per-insert", type=int, default=1000)
+    parser.add_argument("--legacy-max-rows", type=int, default=1_000,
+                        help="Only run the old regex parser up to this many rows.")
+    args = parser.parse_args()
+    run(args.sizes, args.rows_per_insert, args.legacy_max_rows)
+
+
+if __name__ == "__main__":
+    main()
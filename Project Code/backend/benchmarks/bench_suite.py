@@ -0,0 +1,265 @@
+# Benchmarks the backend functions and endpoints on synthetic corpora, with
+# chat models replaced by the deterministic fake in fake_llm.py. On top of the
+# backend's own requirements, the endpoint cases need:
+#
+#     pip install tabulate   # pandas to_markdown, used by the pandas agent's prompt
+#
+# Usage: python benchmarks/bench_suite.py --scales small medium --baseline old.json
+# (--no-endpoints skips the FastAPI cases and their extra dependencies).
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_runtime  # noqa: E402
+from synthetic_expander import expand_dataset  # noqa: E402
+from error_injection import inject_errors_into_folder  # noqa: E402
+from analysis_cache import invalidate_analysis_cache  # noqa: E402
+from data_error_recognition_agent import (  # noqa: E402
+    analyze_csv_file,
+    analyze_all_csv_files,
+    load_schema_catalog,
+    get_missing_values_by_prefix,
+)
+from data_generation_agent import save_insert_statements_to_csv  # noqa: E402
+from file_reduction_agent import reduce_files  # noqa: E402
+from sql_database import run_query  # noqa: E402
+from bench_error_detection import write_seed_tables  # noqa: E402
+from bench_sql_import import generate_dump  # noqa: E402
+from fake_llm import fake_chat_model_factory  # noqa: E402
+
+# rows: rows per seed table after expansion; tables/columns: extra unrelated
+# tables and their width, to grow the file count independently of row count.
+SCALES = {
+    "small": {"rows": 10_000, "tables": 5, "columns": 8},
+    "medium": {"rows": 100_000, "tables": 20, "columns": 16},
+    "large": {"rows": 1_000_000, "tables": 50, "columns": 32},
+}
+DEFAULT_THRESHOLD = 0.2
+
+
+def write_extra_tables(folder, tables, columns, rows, seed):
+    rng = np.random.default_rng(seed)
+    for t in range(tables):
+        data = {"id": np.arange(1, rows + 1)}
+        for c in range(columns - 1):
+            kind = c % 3
+            if kind == 0:
+                data[f"value_{c}"] = np.round(rng.normal(100, 15, rows), 2)
+            elif kind == 1:
+                data[f"code_{c}"] = rng.choice(["alpha", "beta", "gamma", "delta"], rows)
+            else:
+                data[f"count_{c}"] = rng.integers(0, 1000, rows)
+        pd.DataFrame(data).to_csv(os.path.join(folder, f"extra_{t:03d}_data.csv"), index=False)
+
+
+def build_corpus(folder, scale, seed=0):
+    write_seed_tables(folder)
+    expand_dataset(folder, scale["rows"], seed=seed)
+    write_extra_tables(folder, scale["tables"], scale["columns"], max(scale["rows"] // 10, 100), seed)
+    inject_errors_into_folder(folder, seed=seed)
+    return sum(len(pd.read_csv(os.path.join(folder, f), usecols=[0])) for f in os.listdir(folder)
+               if f.endswith(".csv"))
+
+
+def measure(fn, setup=None, repeats=3, rows=None):
+    # Median/min wall time over `repeats` untraced runs, then one run under
+    # tracemalloc for peak Python-heap memory (Arrow buffers are not traced).
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {"median_seconds": round(statistics.median(times), 4), "min_seconds": round(min(times), 4),
+              "peak_memory_mb": round(peak / 2 ** 20, 2)}
+    if rows:
+        result["rows_per_second"] = round(rows / statistics.median(times))
+    return result
+
+
+def function_cases(folder, total_rows):
+    largest = max((f for f in os.listdir(folder) if f.endswith(".csv")),
+                  key=lambda f: os.path.getsize(os.path.join(folder, f)))
+    largest_rows = len(pd.read_csv(os.path.join(folder, largest), usecols=[0]))
+    dump = generate_dump(min(total_rows, 200_000))
+    sql_folder = tempfile.mkdtemp()
+    n_files = len([f for f in os.listdir(folder) if f.endswith(".csv")])
+    cold = lambda: invalidate_analysis_cache(folder)  # noqa: E731
+    return {
+        "analyze_csv_file": (lambda: analyze_csv_file(os.path.join(folder, largest)), None, largest_rows),
+        "analyze_all_csv_files": (lambda: analyze_all_csv_files(folder), cold, total_rows),
+        "analyze_all_csv_files_cached": (lambda: analyze_all_csv_files(folder), None, total_rows),
+        "load_schema_catalog": (lambda: load_schema_catalog(folder), None, total_rows),
+        "get_missing_values_by_prefix": (lambda: get_missing_values_by_prefix(folder), None, total_rows),
+        "save_insert_statements_to_csv": (lambda: save_insert_statements_to_csv(dump, sql_folder), None,
+                                          min(total_rows, 200_000)),
+        "reduce_files": (lambda: asyncio.run(reduce_files(folder, n_files)), None, None),
+        "run_query": (lambda: run_query(folder, "SELECT status, COUNT(*) FROM orders GROUP BY status"),
+                      None, None),
+    }, sql_folder
+
+
+def _expect_ok(call):
+    # A case fails unless the endpoint answers 200 without an "error" body, so
+    # a broken endpoint cannot show up as a fast one.
+    def run():
+        response = call()
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        if response.headers.get("content-type", "").startswith("application/json"):
+            body = response.json()
+            if isinstance(body, dict) and "error" in body:
+                raise RuntimeError(f"Error response: {str(body['error'])[:200]}")
+        return response
+    return run
+
+
+def endpoint_cases(client, n_files):
+    counter = iter(range(10 ** 9))
+    return {
+        "GET /errors-analysis/": lambda: client.get("/errors-analysis/"),
+        "GET /missing-values/": lambda: client.get("/missing-values/"),
+        "GET /schema-catalog/": lambda: client.get("/schema-catalog/"),
+        "GET /sql-tables/": lambda: client.get("/sql-tables/"),
+        "POST /sql-query/": lambda: client.post("/sql-query/", data={"query": "SELECT COUNT(*) FROM orders"}),
+        "POST /reduce-files/": lambda: client.post("/reduce-files/", data={"n_keep": n_files}),
+        # A new question each call, so the answer cache never short-circuits the agent.
+        "POST /ask-csv-question/": lambda: client.post(
+            "/ask-csv-question/", data={"question": f"How many orders are there? ({next(counter)})"}),
+        "POST /ask-sql-question/": lambda: client.post(
+            "/ask-sql-question/", data={"question": f"How many customers are there? ({next(counter)})"}),
+    }
+
+
+def run_endpoints(folder, repeats):
+    import main
+    from fastapi.testclient import TestClient
+
+    results = {}
+    n_files = len([f for f in os.listdir(folder) if f.endswith(".csv")])
+    workspaces_dir = tempfile.mkdtemp()
+    main.CSV_FOLDER = folder
+    main.WORKSPACES_DIR = workspaces_dir
+    try:
+        with TestClient(main.app) as client:
+            start = time.perf_counter()
+            while client.get("/health/ready").status_code != 200:
+                if client.get("/health").json()["agent"]["state"] == "failed":
+                    raise RuntimeError("Agent warmup failed.")
+                time.sleep(0.05)
+            warmup = round(time.perf_counter() - start, 4)
+            results["warmup"] = {"median_seconds": warmup, "min_seconds": warmup, "peak_memory_mb": 0.0}
+            cases = endpoint_cases(client, n_files)
+            # Generation replaces the dataset, so it runs in a workspace of its own.
+            cases["POST /generate-ideal-data/ (parallel)"] = lambda: client.post(
+                "/generate-ideal-data/",
+                data={"industry": "Retail", "subdomain": "E-commerce", "parallel": "true", "rows_per_table": 50},
+                headers={"X-Workspace-Id": "bench-generation"},
+            )
+            for name, fn in cases.items():
+                try:
+                    results[name] = measure(_expect_ok(fn), repeats=repeats)
+                except RuntimeError as e:
+                    results[name] = {"failed": str(e)}
+    finally:
+        shutil.rmtree(workspaces_dir, ignore_errors=True)
+    return results
+
+
+def run(scales, repeats, seed, endpoints):
+    llm_runtime.set_chat_model_factory(fake_chat_model_factory)
+    results = {}
+    for name in scales:
+        scale = SCALES[name]
+        folder = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            total_rows = build_corpus(folder, scale, seed)
+            print(f"[{name}] corpus: {total_rows} rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            cases, sql_folder = function_cases(folder, total_rows)
+            for case, (fn, setup, rows) in cases.items():
+                results[f"{name}/{case}"] = measure(fn, setup, repeats, rows)
+                print(f"[{name}] {case}: {results[f'{name}/{case}']}", file=sys.stderr)
+            shutil.rmtree(sql_folder, ignore_errors=True)
+            if endpoints:
+                for case, result in run_endpoints(folder, repeats).items():
+                    results[f"{name}/{case}"] = result
+                    print(f"[{name}] {case}: {result}", file=sys.stderr)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeats": repeats, "seed": seed,
+                 "scales": {name: SCALES[name] for name in scales}},
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    # Cases whose median time or peak memory grew by more than `threshold`.
+    regressions = []
+    for case, result in current["results"].items():
+        before = baseline.get("results", {}).get(case)
+        if not before or "failed" in result or "failed" in before:
+            continue
+        for metric in ("median_seconds", "peak_memory_mb"):
+            if before.get(metric) and result[metric] > before[metric] * (1 + threshold):
+                regressions.append({"case": case, "metric": metric, "baseline": before[metric],
+                                    "current": result[metric], "ratio": round(result[metric] / before[metric], 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend functions and endpoints on synthetic corpora.")
+    parser.add_argument("--scales", nargs="+", choices=sorted(SCALES), default=["small"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-endpoints", action="store_true", help="Only benchmark the functions.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown or memory growth reported as a regression.")
+    args = parser.parse_args()
+    if not args.no_endpoints:
+        try:
+            import tabulate  # noqa: F401
+        except ImportError:
+            parser.error("the endpoint cases need tabulate (pip install tabulate), or pass --no-endpoints")
+    current = run(args.scales, args.repeats, args.seed, not args.no_endpoints)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            current["regressions"] = compare(current, json.load(f), args.threshold)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    failed = {case: result["failed"] for case, result in current["results"].items() if "failed" in result}
+    print(json.dumps(current.get("regressions", current["results"]), indent=2))
+    if failed:
+        print(json.dumps({"failed": failed}, indent=2), file=sys.stderr)
+    if current.get("regressions") or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import re
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+FAKE_SCHEMA = (
+    "CREATE TABLE customers (customer_id INT PRIMARY KEY, name VARCHAR(100), city VARCHAR(50));\n"
+    "CREATE TABLE orders (order_id INT PRIMARY KEY, customer_id INT, total DECIMAL(10,2), order_date DATE, "
+    "FOREIGN KEY (customer_id) REFERENCES customers(customer_id));"
+)
+FAKE_ANSWER = "Thought: I know the answer.\nFinal Answer: 42"
+
+_ROWS_REQUEST = re.compile(r"Generate (\d+) rows for the table (\w+)")
+_KEEP_REQUEST = re.compile(r"select the (\d+) most important files")
+_CITIES = ["Paris", "Rome", "Oslo", "Lima"]
+
+
+def fake_rows(table, rows):
+    if table.lower() == "customers":
+        values = [f"({i}, 'Customer {i}', '{_CITIES[i % len(_CITIES)]}')" for i in range(1, rows + 1)]
+        return f"INSERT INTO customers (customer_id, name, city) VALUES {', '.join(values)};"
+    values = [f"({i}, {1 + (i - 1) % rows}, {i * 10.5:.2f}, '2024-{1 + i % 12:02d}-{1 + i % 28:02d}')"
+              for i in range(1, rows + 1)]
+    return f"INSERT INTO {table} (order_id, customer_id, total, order_date) VALUES {', '.join(values)};"
+
+
+def fake_response(prompt_text):
+    # Deterministic answers keyed on the prompts the backend sends, so
+    # benchmarks measure the backend and not a model.
+    match = _ROWS_REQUEST.search(prompt_text)
+    if match:
+        return fake_rows(match.group(2), int(match.group(1)))
+    if "Generate ONLY the schema" in prompt_text:
+        return FAKE_SCHEMA
+    match = _KEEP_REQUEST.search(prompt_text)
+    if match:
+        files = re.findall(r"^(\S+\.csv) \|", prompt_text, re.MULTILINE)
+        return repr(files[:int(match.group(1))])
+    if "Action Input" in prompt_text:
+        return FAKE_ANSWER
+    if "CREATE TABLE" in prompt_text or "INSERT INTO" in prompt_text:
+        return FAKE_SCHEMA + "\n" + fake_rows("customers", 7) + "\n" + fake_rows("orders", 7)
+    return FAKE_ANSWER
+
+
+class FakeChatModel(BaseChatModel):
+    # Drop-in chat model for llm_runtime.set_chat_model_factory; counts calls.
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-benchmark"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        text = fake_response("\n".join(str(m.content) for m in messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def fake_chat_model_factory(model, temperature=0):
+    return FakeChatModel()
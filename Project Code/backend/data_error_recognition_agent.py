@@ -1,46 +1,51 @@
 import os
 import atexit
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_experimental.agents import create_csv_agent
-from langchain_experimental.tools import PythonREPLTool
+from date_inference import infer_dates, summarize_formats, summarize_format_counts
+from sketches import KLLSketch, ReservoirSample
+from analysis_cache import file_fingerprint, get_cached_analysis, store_analysis
+from dataset_versions import pin_snapshot
+from workspaces import CSV_FOLDER
+from merged_store import MERGED_FILE_NAME, refresh_merged_store
+from schema_catalog import SchemaCatalog
+from dataframe_pool import set_agent_local
+from null_index import update_null_index, sync_null_index, get_null_counts
+from llm_runtime import get_chat_model
+from telemetry import traced
 
-# Directory containing CSV files
-CSV_FOLDER = r"D:\PROJECTS\DataVerse Hub\Project Code\backend\Industry-Sub_domain Data"
-MERGED_FILE_NAME = "__merged_all_data.csv"
-temp_merged_path = os.path.join(CSV_FOLDER, MERGED_FILE_NAME)
-
-def cleanup():
-    if os.path.exists(temp_merged_path):
-        try:
-            os.remove(temp_merged_path)
-        except Exception:
-            pass
-
-atexit.register(cleanup)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+_analysis_pool = None
+SUSPICIOUS_VALUES = ['Unknown', 'unknown', 'XX', 'NULL', 'null', None]
+# Files above this size are analyzed in streaming mode unless mode="exact" is requested.
+EXACT_MODE_MAX_BYTES = int(os.getenv("EXACT_MODE_MAX_BYTES", 256 * 1024 * 1024))
+STREAM_MAX_MEMORY_MB = int(os.getenv("STREAM_MAX_MEMORY_MB", 256))
+SKETCH_K = 200
+AGENT_MODEL_ID = "mistralai/mistral-small-3.2-24b-instruct:free"
+RESERVOIR_SIZE = 100
+CATALOG_AGENT_PREFIX = """
+You are working with a relational dataset in Python. The dataframe `df` lists every column of every table
+(table, column, dtype, rows, key) and holds no data itself. Load data with
+`catalog.table("table_name", columns=["col", ...])`, and join related tables with
+`catalog.join("table_a", "table_b").to_pandas(columns=["table_a.col", "table_b.col"])`; joins follow the
+primary/foreign keys shown in `df`. Only request the columns you need.
+You should use the tools below to answer the question posed of you:"""
 
 def parse_dates_with_multiple_formats(series):
-    import dateutil.parser
-    parsed_dates = []
-    for val in series:
-        parsed = None
-        for fmt in ['%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%Y/%m/%d']:
-            try:
-                parsed = pd.to_datetime(val, format=fmt, errors='raise')
-                break
-            except Exception:
-                continue
-        if parsed is None:
-            try:
-                parsed = dateutil.parser.parse(val)
-            except Exception:
-                parsed = pd.NaT
-        parsed_dates.append(parsed)
-    return pd.Series(parsed_dates)
+    dates, _ = infer_dates(series, check=False)
+    return dates
+
+@traced("analyze_csv")
+def analyze_csv_file(file_path, mode="auto", max_memory_mb=STREAM_MAX_MEMORY_MB,
+                     sketch_k=SKETCH_K, reservoir_size=RESERVOIR_SIZE):
+    if mode not in ("auto", "exact", "streaming"):
+        raise ValueError(f"Unknown analysis mode '{mode}'.")
+    if mode == "streaming" or (mode == "auto" and os.path.getsize(file_path) > EXACT_MODE_MAX_BYTES):
+        return analyze_csv_file_streaming(file_path, max_memory_mb, sketch_k, reservoir_size)
+    return analyze_csv_file_exact(file_path)
 
-def analyze_csv_file(file_path):
+def analyze_csv_file_exact(file_path):
     df = pd.read_csv(file_path)
     analysis = {}
     analysis['file_name'] = os.path.basename(file_path)
@@ -50,83 +55,254 @@ def analyze_csv_file(file_path):
     missing_data = df.isnull().sum()
     analysis['missing_data'] = missing_data[missing_data > 0].to_dict()
     outliers = {}
+    outlier_rows = {}
     for col in df.select_dtypes(include=[float, int, np.number]).columns:
         Q1 = df[col].quantile(0.25)
         Q3 = df[col].quantile(0.75)
         IQR = Q3 - Q1
         lower_bound = Q1 - 1.5 * IQR
         upper_bound = Q3 + 1.5 * IQR
-        outlier_values = df[(df[col] < lower_bound) | (df[col] > upper_bound)][col].tolist()
+        mask = ((df[col] < lower_bound) | (df[col] > upper_bound)).to_numpy()
+        outlier_values = df[col][mask].tolist()
         if outlier_values:
             outliers[col] = outlier_values
+            outlier_rows[col] = np.flatnonzero(mask).tolist()
+    date_formats = {}
     for col in df.select_dtypes(include=['object']).columns:
         try:
-            dates = parse_dates_with_multiple_formats(df[col])
+            inferred = infer_dates(df[col])
+            if inferred is None:
+                continue
+            dates, formats = inferred
             if dates.notnull().any():
-                outlier_dates = dates[(dates < pd.Timestamp('1900-01-01')) | (dates > pd.Timestamp('2100-01-01'))]
-                if not outlier_dates.empty:
-                    outliers[col] = [str(d) for d in outlier_dates.dt.strftime('%Y-%m-%d')]
+                date_formats[col] = summarize_formats(formats)
+                out_of_range = ((dates < pd.Timestamp('1900-01-01')) | (dates > pd.Timestamp('2100-01-01'))).to_numpy()
+                if out_of_range.any():
+                    outliers[col] = [str(d) for d in dates[out_of_range].dt.strftime('%Y-%m-%d')]
+                    outlier_rows[col] = np.flatnonzero(out_of_range).tolist()
         except Exception:
             pass
     analysis['outliers'] = outliers
+    analysis['outlier_rows'] = outlier_rows
+    analysis['outlier_counts'] = {col: len(values) for col, values in outliers.items()}
+    analysis['date_formats'] = date_formats
     suspicious_values = {}
-    suspicious_list = ['Unknown', 'unknown', 'XX', 'NULL', 'null', None]
+    suspicious_cells = {}
     for col in df.select_dtypes(include=['object']).columns:
-        suspicious_vals = df[col][df[col].isin(suspicious_list)].dropna().unique().tolist()
-        if suspicious_vals:
-            suspicious_values[col] = suspicious_vals
+        mask = (df[col].isin(SUSPICIOUS_VALUES) & df[col].notna()).to_numpy()
+        if mask.any():
+            suspicious_values[col] = df[col][mask].unique().tolist()
+            suspicious_cells[col] = [[int(row), value] for row, value in zip(np.flatnonzero(mask), df[col][mask])]
     analysis['suspicious_values'] = suspicious_values
+    analysis['suspicious_cells'] = suspicious_cells
+    analysis['suspicious_counts'] = {col: len(cells) for col, cells in suspicious_cells.items()}
+    return analysis
+
+def _stream_chunksize(file_path, max_memory_mb):
+    head = pd.read_csv(file_path, nrows=1000)
+    if head.empty:
+        return 1000
+    bytes_per_row = max(1, head.memory_usage(deep=True).sum() / len(head))
+    # Leave room for the per-chunk temporaries (masks, parsed dates, sorted copies).
+    return max(1000, int(max_memory_mb * 1024 * 1024 / (bytes_per_row * 4)))
+
+def analyze_csv_file_streaming(file_path, max_memory_mb=STREAM_MAX_MEMORY_MB,
+                               sketch_k=SKETCH_K, reservoir_size=RESERVOIR_SIZE):
+    chunksize = _stream_chunksize(file_path, max_memory_mb)
+    num_rows = 0
+    columns = None
+    null_counts = None
+    sketches = {}
+    candidates = {}
+    non_numeric = set()
+    date_columns = {}
+    non_date = set()
+    date_outliers = {}
+    suspicious = {}
+    suspicious_cells = {}
+    suspicious_counts = {}
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        if columns is None:
+            columns = list(chunk.columns)
+            null_counts = pd.Series(0, index=chunk.columns, dtype='int64')
+        offset = num_rows
+        num_rows += len(chunk)
+        null_counts = null_counts.add(chunk.isnull().sum(), fill_value=0)
+        numeric_cols = set(chunk.select_dtypes(include=[float, int, np.number]).columns)
+        for col in chunk.columns:
+            if col in non_numeric:
+                continue
+            if col not in numeric_cols:
+                if chunk[col].notna().any():
+                    non_numeric.add(col)
+                    sketches.pop(col, None)
+                    candidates.pop(col, None)
+                continue
+            values = chunk[col].to_numpy(dtype=float)
+            sketch = sketches.setdefault(col, KLLSketch(k=sketch_k))
+            sketch.update(values)
+            # Keep values outside the bounds known so far; they are re-checked
+            # against the final bounds once the whole file has been seen.
+            q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+            iqr = q3 - q1
+            mask = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+            reservoir = candidates.setdefault(col, ReservoirSample(reservoir_size))
+            for row in np.flatnonzero(mask):
+                reservoir.add((offset + int(row), float(values[row])))
+        for col in chunk.select_dtypes(include=['object']).columns:
+            series = chunk[col]
+            mask = (series.isin(SUSPICIOUS_VALUES) & series.notna()).to_numpy()
+            if mask.any():
+                seen = suspicious.setdefault(col, [])
+                seen.extend(v for v in series[mask].unique().tolist() if v not in seen)
+                suspicious_counts[col] = suspicious_counts.get(col, 0) + int(mask.sum())
+                # Only the first reservoir_size cells keep their row numbers.
+                cells = suspicious_cells.setdefault(col, [])
+                for row in np.flatnonzero(mask)[:max(0, reservoir_size - len(cells))]:
+                    cells.append([offset + int(row), series.iloc[row]])
+            if col in non_date or not series.notna().any():
+                continue
+            try:
+                inferred = infer_dates(series, check=col not in date_columns)
+            except Exception:
+                inferred = None
+            if inferred is None:
+                non_date.add(col)
+                continue
+            dates, formats = inferred
+            format_counts = date_columns.setdefault(col, {})
+            for fmt, count in formats.dropna().value_counts().items():
+                format_counts[fmt] = format_counts.get(fmt, 0) + int(count)
+            out_of_range = (dates < pd.Timestamp('1900-01-01')) | (dates > pd.Timestamp('2100-01-01'))
+            if out_of_range.any():
+                reservoir = date_outliers.setdefault(col, ReservoirSample(reservoir_size))
+                for row, d in zip(np.flatnonzero(out_of_range.to_numpy()), dates[out_of_range]):
+                    reservoir.add((offset + int(row), d.strftime('%Y-%m-%d')))
+    analysis = {}
+    analysis['file_name'] = os.path.basename(file_path)
+    analysis['num_rows'] = num_rows
+    analysis['num_columns'] = len(columns or [])
+    analysis['columns'] = columns or []
+    null_counts = null_counts if null_counts is not None else pd.Series(dtype='int64')
+    analysis['missing_data'] = {col: int(n) for col, n in null_counts.items() if n > 0}
+    outliers = {}
+    outlier_rows = {}
+    outlier_counts = {}
+    for col, sketch in sketches.items():
+        q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+        iqr = q3 - q1
+        lower_bound, upper_bound = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        sample = sorted(item for item in candidates[col].items
+                        if item[1] < lower_bound or item[1] > upper_bound)
+        if sample:
+            outliers[col] = [value for _, value in sample]
+            outlier_rows[col] = [row for row, _ in sample]
+            below = sketch.rank(lower_bound)
+            above = 1 - sketch.rank(np.nextafter(upper_bound, np.inf))
+            outlier_counts[col] = max(len(sample), int(round((below + above) * sketch.count)))
+    date_formats = {}
+    for col, format_counts in date_columns.items():
+        if format_counts:
+            date_formats[col] = summarize_format_counts(format_counts)
+    for col, reservoir in date_outliers.items():
+        sample = sorted(reservoir.items)
+        outliers[col] = [value for _, value in sample]
+        outlier_rows[col] = [row for row, _ in sample]
+        outlier_counts[col] = reservoir.seen
+    analysis['outliers'] = outliers
+    analysis['outlier_rows'] = outlier_rows
+    analysis['outlier_counts'] = outlier_counts
+    analysis['date_formats'] = date_formats
+    analysis['suspicious_values'] = suspicious
+    analysis['suspicious_cells'] = suspicious_cells
+    analysis['suspicious_counts'] = suspicious_counts
+    analysis['mode'] = 'streaming'
     return analysis
 
+def _get_analysis_pool():
+    global _analysis_pool
+    if _analysis_pool is None:
+        _analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+        atexit.register(_analysis_pool.shutdown, wait=False, cancel_futures=True)
+    return _analysis_pool
+
+@traced("analyze_all_csvs")
 def analyze_all_csv_files(csv_folder):
-    results = []
-    for filename in os.listdir(csv_folder):
+    # Reads one pinned dataset version, so a concurrent write cannot mix old
+    # and new files into the result.
+    with pin_snapshot(csv_folder) as snapshot:
+        return _analyze_snapshot(csv_folder, snapshot)
+
+def _analyze_snapshot(csv_folder, snapshot):
+    results = {}
+    pending = {}
+    for filename in snapshot.files:
         if filename.lower().endswith('.csv') and filename != MERGED_FILE_NAME:
-            file_path = os.path.join(csv_folder, filename)
+            file_path = snapshot.path(filename)
             try:
-                analysis = analyze_csv_file(file_path)
-                results.append(analysis)
+                fingerprint = file_fingerprint(file_path, os.path.join(csv_folder, filename))
             except Exception as e:
-                results.append({'file_name': filename, 'error': str(e)})
-    return results
-
-def load_and_prepare_csvs(csv_folder):
-    csv_files = [f for f in os.listdir(csv_folder)
-                 if f.lower().endswith('.csv') and f != MERGED_FILE_NAME]
-    dataframes = {}
-    for fname in csv_files:
-        path = os.path.join(csv_folder, fname)
+                results[filename] = {'file_name': filename, 'error': str(e)}
+                continue
+            cached = get_cached_analysis(csv_folder, fingerprint)
+            if cached is not None:
+                results[filename] = cached
+            else:
+                pending[filename] = (file_path, fingerprint)
+    if len(pending) > 1 and ANALYSIS_WORKERS > 1:
+        pool = _get_analysis_pool()
+        futures = {filename: pool.submit(analyze_csv_file, file_path)
+                   for filename, (file_path, _) in pending.items()}
+        analyses = {}
+        for filename, future in futures.items():
+            try:
+                analyses[filename] = future.result()
+            except Exception as e:
+                analyses[filename] = e
+    else:
+        analyses = {}
+        for filename, (file_path, _) in pending.items():
+            try:
+                analyses[filename] = analyze_csv_file(file_path)
+            except Exception as e:
+                analyses[filename] = e
+    for filename, analysis in analyses.items():
+        if isinstance(analysis, Exception):
+            results[filename] = {'file_name': filename, 'error': str(analysis)}
+            continue
         try:
-            df = pd.read_csv(path)
-            prefix = os.path.splitext(fname)[0]
-            df = df.add_prefix(f"{prefix}__")
-            dataframes[fname] = df
+            store_analysis(csv_folder, pending[filename][1], analysis)
         except Exception:
             pass
-    return dataframes
+        results[filename] = analysis
+    return [results[filename] for filename in sorted(results)]
 
-def merge_dataframes(dataframes):
-    if not dataframes:
-        return None
-    dfs = list(dataframes.values())
-    merged = pd.concat(dfs, axis=1)
-    return merged
+@traced("schema_catalog")
+def load_schema_catalog(csv_folder):
+    manifest = refresh_merged_store(
+        csv_folder,
+        on_group_built=lambda fname, df, source_folder: update_null_index(csv_folder, fname, df, source_folder),
+    )
+    return SchemaCatalog(csv_folder, manifest)
+
+@traced("agent_build")
+def create_merged_csv_agent(model_id=AGENT_MODEL_ID, csv_folder=None):
+    # The agent's `df` is the catalog overview (one row per table column); data
+    # is loaded on demand through `catalog`, so only the columns a question
+    # touches are materialized.
+    from langchain_experimental.agents import create_pandas_dataframe_agent
 
-def create_merged_csv_agent(model_id="mistralai/mistral-small-3.2-24b-instruct:free"):
-    load_dotenv()
-    os.environ["OPENAI_API_KEY"] = os.getenv("MENTOR_API_KEY")
-    os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
-    dataframes = load_and_prepare_csvs(CSV_FOLDER)
-    merged_df = merge_dataframes(dataframes)
-    if merged_df is None or merged_df.empty:
+    catalog = load_schema_catalog(csv_folder or CSV_FOLDER)
+    if not catalog.table_names:
         return None
-    merged_df.to_csv(temp_merged_path, index=False)
-    csv_agent = create_csv_agent(
-        llm=ChatOpenAI(temperature=0, model=model_id),
-        path=temp_merged_path,
+    csv_agent = create_pandas_dataframe_agent(
+        get_chat_model(model_id),
+        catalog.overview(),
+        prefix=CATALOG_AGENT_PREFIX,
         verbose=True,
         allow_dangerous_code=True,
     )
+    set_agent_local(csv_agent, "catalog", catalog)
     return csv_agent
 
 def query_merged_csv_agent(question, model_id="moonshotai/kimi-dev-72b:free"):
@@ -139,14 +315,12 @@ def query_merged_csv_agent(question, model_id="moonshotai/kimi-dev-72b:free"):
     except Exception as e:
         return {"error": str(e)}
 
-def get_missing_values_by_prefix(merged_file_path):
-    df = pd.read_csv(merged_file_path)
-    prefixes = {col.split('__', 1)[0] for col in df.columns}
+@traced("missing_values")
+def get_missing_values_by_prefix(csv_folder):
+    sync_null_index(csv_folder)
     missing_values = {}
-    for prefix in prefixes:
-        cols = [col for col in df.columns if col.startswith(f"{prefix}__")]
-        missing = df[cols].isnull().sum()
-        missing = missing[missing > 0]
-        if not missing.empty:
-            missing_values[prefix] = missing.to_dict()
+    for prefix, counts in get_null_counts(csv_folder).items():
+        missing = {col: n for col, n in counts.items() if n > 0}
+        if missing:
+            missing_values[prefix] = missing
     return missing_values
@@ -1,22 +1,16 @@
 import os
-import csv
-import re
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_react_agent, AgentExecutor
-from langchain_core.prompts import PromptTemplate
-
-CSV_FOLDER = r"D:\PROJECTS\DataVerse Hub\Project Code\backend\Industry-Sub_domain Data"
-
-def generate_sales_sql(question: str, csv_folder: str) -> str:
-    if not question.strip():
-        raise ValueError("Question cannot be empty.")
-
-    load_dotenv()
-    os.environ["OPENAI_API_KEY"]  = os.getenv("MENTOR_API_KEY")
-    os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
-
-    template = """
+import asyncio
+from llm_runtime import get_chat_model, run_llm, model_slot, agent_config
+from sql_stream import stream_sql_to_dataset
+from sql_tokenizer import write_inserts_to_csv
+from dataset_versions import get_dataset
+from parallel_generation import generate_tables_parallel, stream_progress, require_generated_rows
+from data_generation_agent import generate_ideal_sql_for_industry_subdomain, generate_ideal_sql_parallel
+from error_injection import inject_errors_into_folder
+
+MODEL_ID = "mistralai/mistral-small-3.1-24b-instruct:free"
+
+SQL_PROMPT_TEMPLATE = """
     You are an expert SQL database designer and data generator.
 
     Based on the user's input, generate:
@@ -55,83 +49,128 @@ def generate_sales_sql(question: str, csv_folder: str) -> str:
     {agent_scratchpad}
     """
 
-    prompt = PromptTemplate.from_template(template)
+# Per-table version of rules 4-7 above, for the parallel pipeline.
+ERROR_ROW_RULES = """
+    IMPORTANT: at least 2 rows must contain realistic outlier values: numbers just outside the normal range,
+    typos or truncated / excessively long strings, unexpected but possible categorical values (e.g. "XX",
+    "Unknown"), odd dates (e.g. 1900-01-01, 2099-12-31, swapped month/day), or duplicated values in
+    non-primary key fields. At least 2 rows must contain NULL values in columns where NULLs are allowed.
+    The rest of the data should be plausible and typical for the domain. Do NOT use placeholder names like
+    "Outlier1"; make outliers look like real-world data errors or rare cases.
+    """
 
-    llm = ChatOpenAI(
-        model="mistralai/mistral-small-3.1-24b-instruct:free",
-        temperature=0,
-    )
+async def generate_sales_sql(question: str, csv_folder: str) -> str:
+    from langchain.agents import create_react_agent, AgentExecutor
+    from langchain_core.prompts import PromptTemplate
+
+    if not question.strip():
+        raise ValueError("Question cannot be empty.")
+
+    prompt = PromptTemplate.from_template(SQL_PROMPT_TEMPLATE)
+
+    llm = get_chat_model(MODEL_ID)
 
     agent = create_react_agent(llm=llm, prompt=prompt, tools=[])
     executor = AgentExecutor(agent=agent, tools=[], verbose=True, handle_parsing_errors=True, max_iterations=5)
     
-    result = executor.invoke({"input": question})
+    result = await run_llm(
+        MODEL_ID,
+        lambda: executor.ainvoke({"input": question}, config=agent_config()),
+        key=("with-errors", question),
+    )
     output = result["output"]
 
     output = output.replace("``````", "").strip()
-    save_insert_statements_to_csv(output, csv_folder)
-    save_sql_to_file(output, csv_folder)
+    await asyncio.to_thread(commit_generated_sql, output, csv_folder)
 
     return output
 
 def save_insert_statements_to_csv(sql_text: str, csv_folder: str):
-    insert_pattern = re.compile(
-        r"INSERT INTO\s+(\w+)\s*\(([^)]+)\)\s*VALUES\s*((?:\([^;]+?\))(?:\s*,\s*\([^;]+?\))*)\s*;",
-        re.IGNORECASE | re.DOTALL
-    )
-
-    os.makedirs(csv_folder, exist_ok=True)
-
-    matches = insert_pattern.finditer(sql_text)
-    found_any = False
-
-    for match in matches:
-        found_any = True
-        table_name = match.group(1)
-        columns = [col.strip() for col in match.group(2).split(",")]
-        values_block = match.group(3).replace('\n', ' ')
-
-        value_rows = re.findall(r"\(([^)]+)\)", values_block)
-        rows = []
-        for value_str in value_rows:
-            values = [v.strip().strip("'").strip('"') for v in re.split(r",(?=(?:[^']*'[^']*')*[^']*$)", value_str)]
-            rows.append(values)
-
-        filename = os.path.join(csv_folder, f"{table_name.lower()}_data.csv")
-        with open(filename, "w", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(columns)
-            writer.writerows(rows)
-
-    if not found_any:
+    counts = write_inserts_to_csv(sql_text, csv_folder)
+    if not counts:
         print("No INSERT INTO statements found in the SQL output.")
 
+def commit_generated_sql(sql_text: str, csv_folder: str):
+    # Replace the previous dataset with the generated tables in one commit
+    with get_dataset(csv_folder).transaction(replace=True) as txn:
+        save_insert_statements_to_csv(sql_text, txn.staging_dir)
+        save_sql_to_file(sql_text, txn.staging_dir)
+
 def save_sql_to_file(sql_text: str, csv_folder: str):
     file_path = os.path.join(csv_folder, "create_insert_statements.sql")
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(sql_text)
         
 def clear_directory_of_data_files(directory):
-    # Remove all CSV and SQL files in the directory
-    for filename in os.listdir(directory):
-        if filename.lower().endswith(('.csv', '.sql')):
-            file_path = os.path.join(directory, filename)
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass  # Optionally, log the error
-
-def generate_sql_for_industry_subdomain(industry: str, subdomain: str, csv_folder: str) -> str:
-    clear_directory_of_data_files(csv_folder)
-    
+    # Remove all CSV and SQL files in the directory, as one dataset version
+    with get_dataset(directory).transaction(replace=True):
+        pass
+
+def industry_question(industry: str, subdomain: str, tables: int = 7, rows_per_table: int = 7) -> str:
     if not industry.strip():
         raise ValueError("Industry cannot be empty.")
     if not subdomain.strip():
         raise ValueError("Sub-domain cannot be empty.")
 
-    user_question = (
+    return (
         f"Generate a realistic SQL database for the '{industry}' industry focusing on the '{subdomain}' sub-domain. "
-        "Include at least 7 tables and 7 rows per table."
+        f"Include at least {tables} tables and {rows_per_table} rows per table."
     )
-    output = generate_sales_sql(user_question, csv_folder)
+
+async def stream_sales_sql(question: str, csv_folder: str):
+    from langchain_core.prompts import PromptTemplate
+
+    if not question.strip():
+        raise ValueError("Question cannot be empty.")
+
+    prompt = PromptTemplate.from_template(SQL_PROMPT_TEMPLATE)
+    prompt_text = prompt.format(input=question, tool_names="", tools="", agent_scratchpad="")
+    llm = get_chat_model(MODEL_ID)
+    async with model_slot(MODEL_ID):
+        async for event, data in stream_sql_to_dataset(llm, prompt_text, csv_folder, save_sql_to_file):
+            yield event, data
+
+async def generate_sql_for_industry_subdomain(industry: str, subdomain: str, csv_folder: str) -> str:
+    user_question = industry_question(industry, subdomain)
+    output = await generate_sales_sql(user_question, csv_folder)
     return output
+
+async def stream_sql_for_industry_subdomain(industry: str, subdomain: str, csv_folder: str):
+    user_question = industry_question(industry, subdomain)
+    async for event in stream_sales_sql(user_question, csv_folder):
+        yield event
+
+async def generate_sql_with_errors_parallel(industry: str, subdomain: str, csv_folder: str, tables: int = 7,
+                                            rows_per_table: int = 7, on_progress=None):
+    user_question = industry_question(industry, subdomain, tables, rows_per_table)
+    output, report = await generate_tables_parallel(
+        user_question, MODEL_ID,
+        row_rules=ERROR_ROW_RULES,
+        tables=tables, rows_per_table=rows_per_table, on_progress=on_progress, cache_key="with-errors",
+    )
+    require_generated_rows(report)
+    await asyncio.to_thread(commit_generated_sql, output, csv_folder)
+    return output, report
+
+async def stream_sql_with_errors_parallel(industry: str, subdomain: str, csv_folder: str, tables: int = 7,
+                                          rows_per_table: int = 7):
+    async for event in stream_progress(
+        lambda on_progress: generate_sql_with_errors_parallel(
+            industry, subdomain, csv_folder, tables, rows_per_table, on_progress)
+    ):
+        yield event
+
+async def generate_sql_with_local_errors(industry: str, subdomain: str, csv_folder: str, parallel: bool = False,
+                                         tables: int = 7, rows_per_table: int = 7, rates=None, seed: int = 0,
+                                         on_progress=None):
+    # Generates clean data, then injects errors locally at controlled rates;
+    # the ground truth goes to .error_manifest/ next to the CSVs. The per-table
+    # report is None unless the tables were generated in parallel.
+    report = None
+    if parallel:
+        output, report = await generate_ideal_sql_parallel(industry, subdomain, csv_folder, tables,
+                                                           rows_per_table, on_progress)
+    else:
+        output = await generate_ideal_sql_for_industry_subdomain(industry, subdomain, csv_folder)
+    injected = await asyncio.to_thread(inject_errors_into_folder, csv_folder, rates=rates, seed=seed)
+    return output, injected, report
@@ -1,31 +1,64 @@
 import os
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_experimental.agents import create_csv_agent
+import asyncio
+from analysis_cache import invalidate_analysis_cache
+from dataset_versions import get_dataset
+from null_index import update_null_index
+from llm_runtime import get_chat_model, run_llm, agent_config, LLM_MAX_RETRIES
+from instruction_compiler import compile_instruction, InstructionNotApplicable
+from dataframe_pool import DATAFRAME_POOL, agent_dataframe
+from telemetry import traced
 
-load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENROUTER_MISTRAL_SMALL_API_KEY")
-os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
+MODEL_ID = "mistralai/mistral-small-3.1-24b-instruct:free"
+API_KEY_ENV = "OPENROUTER_MISTRAL_SMALL_API_KEY"
+BATCH_MAX_CONCURRENT_FILES = int(os.getenv("BATCH_MAX_CONCURRENT_FILES", 4))
 
 def list_csv_files(directory):
     return [f for f in os.listdir(directory)
             if os.path.isfile(os.path.join(directory, f)) and f.lower().endswith('.csv')]
 
-def process_instruction_file(instruction_file, csv_dir):
+def apply_compiled(instruction, df):
+    # Returns (new_df, description) for instructions the compiler handles,
+    # or None when the line has to go through the agent. Compiled steps work
+    # on a copy, so any failure (e.g. the mean of a text column) leaves df as
+    # it was for the agent.
+    compiled = compile_instruction(instruction)
+    if compiled is None:
+        return None
     try:
-        with open(instruction_file, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f if line.strip()]
+        return compiled.apply(df), compiled.description
+    except InstructionNotApplicable:
+        return None
     except Exception as e:
-        return {"error": f"Could not read file '{instruction_file}': {e}"}
-    if not lines:
-        return {"error": "Instruction file is empty."}
-    files = set(list_csv_files(csv_dir))
-    llm = ChatOpenAI(model="mistralai/mistral-small-3.1-24b-instruct:free", temperature=0)
-    agents = {}
-    results = []
+        print(f"Compiled instruction '{instruction}' failed, using the agent: {e}")
+        return None
+
+@traced("csv_write")
+def write_csv_atomic(df, file_path):
+    # Staged and renamed into place as a new dataset version; snapshots pinned
+    # by readers keep the previous contents.
+    csv_dir, filename = os.path.split(file_path)
+    with get_dataset(csv_dir).transaction([filename]) as txn:
+        df.to_csv(txn.path(filename), index=False)
+
+def file_rewritten(csv_dir, filename, df):
+    # Records a frame that has just been written; reads the file's stat and
+    # writes the null index, so it runs off the event loop.
+    DATAFRAME_POOL.commit(os.path.join(csv_dir, filename), df)
+    invalidate_analysis_cache(csv_dir, os.path.join(csv_dir, filename))
+    update_null_index(csv_dir, filename, df)
+
+def read_instruction_file(instruction_file):
+    with open(instruction_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def plan_instructions(lines, files):
+    # Groups instruction lines by target file, keeping their order within each
+    # file; lines that cannot run are returned as skipped results.
+    skipped = []
+    plan = {}
     for idx, line in enumerate(lines, 1):
         if ':' not in line:
-            results.append({
+            skipped.append({
                 "line": idx,
                 "status": "skipped",
                 "reason": "missing colon",
@@ -36,78 +69,178 @@ def process_instruction_file(instruction_file, csv_dir):
         filename = filename.strip()
         instruction = instruction.strip()
         if filename not in files:
-            results.append({
+            skipped.append({
                 "line": idx,
                 "status": "skipped",
                 "reason": f"CSV file '{filename}' not found",
                 "line_content": line
             })
             continue
-        file_path = os.path.join(csv_dir, filename)
-        if filename not in agents:
-            agents[filename] = create_csv_agent(
-                llm, file_path, verbose=False, allow_dangerous_code=True
-            )
-        agent_executor = agents[filename]
-        response = agent_executor.invoke({"input": instruction})
-        tool = agent_executor.tools[0]
+        plan.setdefault(filename, []).append((idx, instruction, line))
+    return skipped, plan
+
+async def _run_file_instructions(csv_dir, filename, steps, get_llm, emit):
+    # Every step works on one in-memory DataFrame; the file is written once at
+    # the end, or left untouched if any step fails. get_llm() is only called
+    # for lines that need the agent.
+    file_path = os.path.join(csv_dir, filename)
+    done = []
+
+    async def fail(idx, line, reason):
+        # The pooled frame or agent may have been touched in place; reload on next use.
+        DATAFRAME_POOL.invalidate(file_path)
+        for prev in done:
+            await emit({**prev, "status": "rolled_back",
+                        "reason": f"Line {idx} failed; no changes were saved to '{filename}'."})
+        await emit({"line": idx, "status": "error", "reason": reason, "line_content": line})
+        for later_idx, _, later_line in steps[len(done) + 1:]:
+            await emit({"line": later_idx, "status": "skipped",
+                        "reason": f"Line {idx} failed for '{filename}'.", "line_content": later_line})
+
+    async with DATAFRAME_POOL.lock(file_path):
         try:
-            if hasattr(tool, "df"):
-                df = tool.df
-                df.to_csv(file_path, index=False)
-            elif hasattr(tool, "locals") and "df" in tool.locals:
-                df = tool.locals["df"]
-                df.to_csv(file_path, index=False)
-            elif hasattr(tool, "_locals") and "df" in tool._locals:
-                df = tool._locals["df"]
-                df.to_csv(file_path, index=False)
-            else:
-                results.append({
-                    "line": idx,
-                    "status": "warning",
-                    "reason": "No DataFrame found to save.",
-                    "line_content": line
-                })
-                continue
+            pooled = await asyncio.to_thread(DATAFRAME_POOL.get_dataframe, file_path)
         except Exception as e:
-            results.append({
+            await fail(steps[0][0], steps[0][2], f"Could not load '{filename}': {e}")
+            return
+        # Work on a copy so a failed step leaves the pooled frame as it is on disk.
+        df = pooled.copy()
+        for idx, instruction, line in steps:
+            # Any error in a step fails this file's lines only.
+            try:
+                compiled = await asyncio.to_thread(apply_compiled, instruction, df)
+                if compiled is not None:
+                    df, description = compiled
+                    path, output = "compiled", description
+                else:
+                    agent_executor = await asyncio.to_thread(DATAFRAME_POOL.get_agent, file_path, get_llm(), df)
+                    # The agent edits df in place, so it runs once; requests are
+                    # retried by the client instead.
+                    response = await run_llm(
+                        MODEL_ID, lambda: agent_executor.ainvoke({"input": instruction}, config=agent_config()),
+                        retries=0)
+                    df = agent_dataframe(agent_executor)
+                    if df is None:
+                        await fail(idx, line, "No DataFrame found to save.")
+                        return
+                    path, output = "agent", response.get("output")
+            except Exception as e:
+                await fail(idx, line, str(e))
+                return
+            result = {
                 "line": idx,
-                "status": "warning",
-                "reason": f"Could not save changes: {e}",
+                "status": "success",
+                "path": path,
+                "output": output,
                 "line_content": line
-            })
-            continue
-        results.append({
-            "line": idx,
-            "status": "success",
-            "output": response.get("output"),
-            "line_content": line
-        })
-    return results
-
-def modify_csv_file(csv_dir, filename, instruction):
+            }
+            done.append(result)
+            await emit(result)
+        try:
+            await asyncio.to_thread(write_csv_atomic, df, file_path)
+            await asyncio.to_thread(file_rewritten, csv_dir, filename, df)
+        except Exception as e:
+            DATAFRAME_POOL.invalidate(file_path)
+            for prev in done:
+                await emit({**prev, "status": "warning", "reason": f"Could not save changes: {e}"})
+
+async def iter_instruction_results(instruction_file, csv_dir, max_concurrent_files=BATCH_MAX_CONCURRENT_FILES):
+    # Yields per-line results as they finish. A line may be reported twice when
+    # a later failure rolls its file back; the last report is authoritative.
+    try:
+        lines = read_instruction_file(instruction_file)
+    except Exception as e:
+        yield {"error": f"Could not read file '{instruction_file}': {e}"}
+        return
+    if not lines:
+        yield {"error": "Instruction file is empty."}
+        return
+    skipped, plan = plan_instructions(lines, set(list_csv_files(csv_dir)))
+    for result in skipped:
+        yield result
+    if not plan:
+        return
+    llm = None
+
+    def get_llm():
+        # Built for the first line that needs the agent, so fully compiled
+        # batches never create a client.
+        nonlocal llm
+        if llm is None:
+            llm = get_chat_model(MODEL_ID, API_KEY_ENV, max_retries=LLM_MAX_RETRIES)
+        return llm
+
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max_concurrent_files)
+
+    async def run(filename, steps):
+        async with semaphore:
+            try:
+                await _run_file_instructions(csv_dir, filename, steps, get_llm, queue.put)
+            except Exception as e:
+                # Reported against this file's lines; the other files carry on.
+                DATAFRAME_POOL.invalidate(os.path.join(csv_dir, filename))
+                for idx, _, line in steps:
+                    await queue.put({"line": idx, "status": "error",
+                                     "reason": f"Instructions for '{filename}' failed: {e}", "line_content": line})
+
+    tasks = [asyncio.ensure_future(run(filename, steps)) for filename, steps in plan.items()]
+    finished = asyncio.ensure_future(asyncio.gather(*tasks))
+    finished.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            result = await queue.get()
+            if result is None:
+                break
+            yield result
+        await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def process_instruction_file(instruction_file, csv_dir, on_result=None):
+    # on_result(result) sees every per-line result as it arrives.
+    results = {}
+    async for result in iter_instruction_results(instruction_file, csv_dir):
+        if "error" in result and "line" not in result:
+            return result
+        results[result["line"]] = result
+        if on_result is not None:
+            on_result(result)
+    return [results[idx] for idx in sorted(results)]
+
+async def modify_csv_file(csv_dir, filename, instruction):
     files = set(list_csv_files(csv_dir))
     if filename not in files:
         return {"error": f"CSV file '{filename}' not found."}
     file_path = os.path.join(csv_dir, filename)
-    llm = ChatOpenAI(model="mistralai/mistral-small-3.1-24b-instruct:free", temperature=0)
-    agent_executor = create_csv_agent(
-        llm, file_path, verbose=False, allow_dangerous_code=True
-    )
-    response = agent_executor.invoke({"input": instruction})
-    tool = agent_executor.tools[0]
-    try:
-        if hasattr(tool, "df"):
-            df = tool.df
-            df.to_csv(file_path, index=False)
-        elif hasattr(tool, "locals") and "df" in tool.locals:
-            df = tool.locals["df"]
-            df.to_csv(file_path, index=False)
-        elif hasattr(tool, "_locals") and "df" in tool._locals:
-            df = tool._locals["df"]
-            df.to_csv(file_path, index=False)
+    async with DATAFRAME_POOL.lock(file_path):
+        df = await asyncio.to_thread(DATAFRAME_POOL.get_dataframe, file_path)
+        compiled = await asyncio.to_thread(apply_compiled, instruction, df)
+        if compiled is not None:
+            df, description = compiled
+            path = "compiled"
+            output = description
         else:
-            return {"error": "No DataFrame found to save."}
-    except Exception as e:
-        return {"error": f"Could not save changes: {e}"}
-    return {"status": "success", "output": response.get("output")}
+            llm = get_chat_model(MODEL_ID, API_KEY_ENV, max_retries=LLM_MAX_RETRIES)
+            agent_executor = await asyncio.to_thread(DATAFRAME_POOL.get_agent, file_path, llm)
+            try:
+                response = await run_llm(
+                    MODEL_ID, lambda: agent_executor.ainvoke({"input": instruction}, config=agent_config()),
+                    retries=0)
+            except Exception:
+                DATAFRAME_POOL.invalidate(file_path)
+                raise
+            df = agent_dataframe(agent_executor)
+            if df is None:
+                DATAFRAME_POOL.invalidate(file_path)
+                return {"error": "No DataFrame found to save."}
+            path = "agent"
+            output = response.get("output")
+        try:
+            await asyncio.to_thread(write_csv_atomic, df, file_path)
+        except Exception as e:
+            DATAFRAME_POOL.invalidate(file_path)
+            return {"error": f"Could not save changes: {e}"}
+        await asyncio.to_thread(file_rewritten, csv_dir, filename, df)
+    return {"status": "success", "path": path, "output": output}
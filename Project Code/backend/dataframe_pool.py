@@ -0,0 +1,141 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+POOL_MAX_FILES = int(os.getenv("POOL_MAX_FILES", 32))
+POOL_MAX_MEMORY_MB = int(os.getenv("POOL_MAX_MEMORY_MB", 1024))
+
+
+def agent_dataframe(agent_executor):
+    tool = agent_executor.tools[0]
+    if hasattr(tool, "df"):
+        return tool.df
+    if hasattr(tool, "locals") and "df" in tool.locals:
+        return tool.locals["df"]
+    if hasattr(tool, "_locals") and "df" in tool._locals:
+        return tool._locals["df"]
+    return None
+
+
+def set_agent_local(agent_executor, name, value):
+    tool = agent_executor.tools[0]
+    if name == "df" and hasattr(tool, "df"):
+        tool.df = value
+    elif hasattr(tool, "locals"):
+        tool.locals[name] = value
+    elif hasattr(tool, "_locals"):
+        tool._locals[name] = value
+
+
+def set_agent_dataframe(agent_executor, df):
+    set_agent_local(agent_executor, "df", df)
+
+
+class _PooledFile:
+    def __init__(self, df, size, mtime_ns):
+        self.df = df
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+        self.agent = None
+        # Columns of the frame the agent's prompt was built from.
+        self.agent_columns = None
+
+
+class DataFramePool:
+    # Process-wide LRU of loaded CSVs and their pandas agents, keyed by path.
+    # Entries are dropped when the file changes on disk, when more than
+    # max_files are resident, or when their frames exceed max_bytes.
+
+    def __init__(self, max_files=POOL_MAX_FILES, max_bytes=POOL_MAX_MEMORY_MB * 1024 * 1024):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lock(self, path):
+        # Serializes edits to one file across the interactive and batch paths.
+        path = os.path.abspath(path)
+        with self._lock:
+            return self._file_locks.setdefault(path, asyncio.Lock())
+
+    def _fresh_entry(self, path):
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and (entry.size, entry.mtime_ns) == (st.st_size, st.st_mtime_ns):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self._entries.pop(path, None)
+            self.misses += 1
+        entry = _PooledFile(pd.read_csv(path), st.st_size, st.st_mtime_ns)
+        self._insert(path, entry)
+        return entry
+
+    def _insert(self, path, entry):
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            total = sum(e.nbytes for e in self._entries.values())
+            while len(self._entries) > 1 and (len(self._entries) > self.max_files or total > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted.nbytes
+                self.evictions += 1
+
+    def get_dataframe(self, path):
+        return self._fresh_entry(os.path.abspath(path)).df
+
+    def get_agent(self, path, llm, df=None):
+        # df is a working copy to run the agent on instead of the pooled frame.
+        # The agent's prompt shows the columns and head of the frame it was
+        # built with, so it is rebuilt once the columns change.
+        entry = self._fresh_entry(os.path.abspath(path))
+        df = entry.df if df is None else df
+        columns = tuple(df.columns)
+        if entry.agent is None or entry.agent_columns != columns:
+            from langchain_experimental.agents import create_pandas_dataframe_agent
+            entry.agent = create_pandas_dataframe_agent(llm, df, verbose=False, allow_dangerous_code=True)
+            entry.agent_columns = columns
+        else:
+            set_agent_dataframe(entry.agent, df)
+        return entry.agent
+
+    def commit(self, path, df):
+        # Records a frame that has just been written to ``path``.
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            previous = self._entries.get(path)
+        entry = _PooledFile(df, st.st_size, st.st_mtime_ns)
+        if previous is not None and previous.agent is not None and previous.agent_columns == tuple(df.columns):
+            entry.agent = previous.agent
+            entry.agent_columns = previous.agent_columns
+            set_agent_dataframe(entry.agent, df)
+        self._insert(path, entry)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "memory_bytes": sum(e.nbytes for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+DATAFRAME_POOL = DataFramePool()
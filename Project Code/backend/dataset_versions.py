@@ -0,0 +1,308 @@
+import os
+import re
+import time
+import shutil
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+VERSIONS_DIR_NAME = ".versions"
+VERSION_FILE_NAME = "VERSION"
+DATA_FILE_EXTENSIONS = (".csv", ".sql")
+# Leftover staging and snapshot directories are removed at startup once their
+# owning process has exited, or, where that cannot be checked, after this long.
+STALE_ENTRY_SECONDS = float(os.getenv("DATASET_STALE_ENTRY_SECONDS", 86400))
+
+# staging-<pid>-<id> and v<version>-<pid>[.<id>.tmp]
+_OWNED_ENTRY = re.compile(r"^(?:staging-(\d+)-|v\d+-(\d+)(?:\.|$))")
+
+_registry_lock = threading.Lock()
+_datasets = {}
+_cancel_event = contextvars.ContextVar("dataset_cancel_event", default=None)
+
+
+class CommitCancelled(Exception):
+    pass
+
+
+@contextmanager
+def cancellable_commits(event):
+    # Transactions committed in this context, including from threads started
+    # by asyncio.to_thread, are aborted instead once `event` is set. Lets a
+    # cancelled job stop work that already left the event loop.
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def _is_data_file(folder, name):
+    return name.lower().endswith(DATA_FILE_EXTENSIONS) and os.path.isfile(os.path.join(folder, name))
+
+
+def _process_alive(pid):
+    # None when it cannot be told: on Windows os.kill would end the process.
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_stale(path, entry):
+    match = _OWNED_ENTRY.match(entry)
+    if match:
+        alive = _process_alive(int(match.group(1) or match.group(2)))
+        if alive is not None:
+            return not alive
+    try:
+        return time.time() - os.path.getmtime(path) > STALE_ENTRY_SECONDS
+    except OSError:
+        return False
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class Snapshot:
+    # A pinned, read-only view of the data files as of one committed version.
+    # Files are hard links to what was committed, and commits only ever rename
+    # new files into place, so nothing a snapshot points at changes under it.
+
+    def __init__(self, dataset, version, folder, files):
+        self.dataset = dataset
+        self.version = version
+        self.folder = folder
+        self.files = files
+        self._released = False
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.dataset._unpin(self.version)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class Transaction:
+    # Writes go to a private staging directory (path(name)) and removals are
+    # recorded; commit() renames everything into place in one step, so readers
+    # see either none or all of a transaction's changes. replace=True also
+    # removes every data file that was not written in the transaction.
+
+    def __init__(self, dataset, files=(), replace=False):
+        self.dataset = dataset
+        self.files = set(files)
+        self.replace = replace
+        self.removed = set()
+        self.staging_dir = os.path.join(dataset.versions_dir, f"staging-{os.getpid()}-{uuid.uuid4().hex}")
+        os.makedirs(self.staging_dir)
+        self._locks = dataset._acquire(self.files)
+        self._done = False
+
+    def path(self, name):
+        return os.path.join(self.staging_dir, name)
+
+    def remove(self, name):
+        self.removed.add(name)
+
+    def commit(self):
+        if self._done:
+            return self.dataset.version
+        try:
+            return self.dataset._commit(self)
+        finally:
+            self._finish()
+
+    def abort(self):
+        if not self._done:
+            self._finish()
+
+    def _finish(self):
+        self._done = True
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        for lock in reversed(self._locks):
+            lock.release()
+        self._locks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+class Dataset:
+    # Versioning for one CSV folder. Writers hold per-file locks for the files
+    # they declare; commits and snapshot creation share a short commit lock, so
+    # readers never wait for a writer's staging work.
+
+    def __init__(self, csv_folder):
+        self.csv_folder = os.path.abspath(csv_folder)
+        self.versions_dir = os.path.join(self.csv_folder, VERSIONS_DIR_NAME)
+        os.makedirs(self.versions_dir, exist_ok=True)
+        self._commit_lock = threading.Lock()
+        self._file_locks = {}
+        self._pins = {}
+        self._snapshots = {}
+        self.version = self._read_version()
+        self._signature = None
+        # Staging and snapshot directories left behind by processes that have
+        # exited; other processes serving the same folder keep theirs.
+        for entry in os.listdir(self.versions_dir):
+            path = os.path.join(self.versions_dir, entry)
+            if entry != VERSION_FILE_NAME and os.path.isdir(path) and _is_stale(path, entry):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _read_version(self):
+        try:
+            with open(os.path.join(self.versions_dir, VERSION_FILE_NAME), "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_version(self):
+        path = os.path.join(self.versions_dir, VERSION_FILE_NAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(self.version))
+        os.replace(tmp_path, path)
+
+    def data_files(self):
+        return sorted(f for f in os.listdir(self.csv_folder) if _is_data_file(self.csv_folder, f))
+
+    def _current_signature(self):
+        signature = []
+        for name in self.data_files():
+            st = os.stat(os.path.join(self.csv_folder, name))
+            signature.append((name, st.st_size, st.st_mtime_ns))
+        return tuple(signature)
+
+    def file_lock(self, name):
+        with _registry_lock:
+            lock = self._file_locks.get(name)
+            if lock is None:
+                lock = self._file_locks[name] = threading.Lock()
+            return lock
+
+    def _acquire(self, names):
+        # Always in sorted order, so two writers can never wait on each other.
+        locks = []
+        for name in sorted(set(names)):
+            lock = self.file_lock(name)
+            lock.acquire()
+            locks.append(lock)
+        return locks
+
+    def transaction(self, files=(), replace=False):
+        return Transaction(self, files, replace)
+
+    def _commit(self, txn):
+        staged = sorted(os.listdir(txn.staging_dir))
+        if txn.replace:
+            # Replacing the dataset waits for every other writer to finish. The
+            # held locks are dropped and everything is taken again in one sorted
+            # pass, so this never waits on a lock while holding a later one.
+            for lock in reversed(txn._locks):
+                lock.release()
+            txn._locks = []
+            txn._locks = self._acquire(set(self.data_files() + staged) | txn.files)
+        with self._commit_lock:
+            cancel_event = _cancel_event.get()
+            if cancel_event is not None and cancel_event.is_set():
+                raise CommitCancelled("Cancelled before the changes were committed.")
+            removed = set(txn.removed)
+            if txn.replace:
+                removed.update(self.data_files())
+            for name in removed - set(staged):
+                try:
+                    os.remove(os.path.join(self.csv_folder, name))
+                except FileNotFoundError:
+                    pass
+            for name in staged:
+                os.replace(os.path.join(txn.staging_dir, name), os.path.join(self.csv_folder, name))
+            self.version += 1
+            self._write_version()
+            self._signature = self._current_signature()
+            self._collect()
+            return self.version
+
+    def snapshot(self):
+        # Pins the latest committed version. Changes made to the folder without
+        # a transaction are picked up as a new version here.
+        with self._commit_lock:
+            signature = self._current_signature()
+            if self._signature is not None and signature != self._signature:
+                self.version += 1
+                self._write_version()
+            self._signature = signature
+            version = self.version
+            if version not in self._snapshots or not os.path.isdir(self._snapshots[version][0]):
+                folder = os.path.join(self.versions_dir, f"v{version}-{os.getpid()}")
+                tmp_folder = f"{folder}.{uuid.uuid4().hex}.tmp"
+                os.makedirs(tmp_folder)
+                files = [name for name, _, _ in signature]
+                for name in files:
+                    _link_or_copy(os.path.join(self.csv_folder, name), os.path.join(tmp_folder, name))
+                shutil.rmtree(folder, ignore_errors=True)
+                os.replace(tmp_folder, folder)
+                self._snapshots[version] = (folder, files)
+            folder, files = self._snapshots[version]
+            self._pins[version] = self._pins.get(version, 0) + 1
+            self._collect()
+            return Snapshot(self, version, folder, list(files))
+
+    def _unpin(self, version):
+        with self._commit_lock:
+            self._pins[version] -= 1
+            if not self._pins[version]:
+                del self._pins[version]
+            self._collect()
+
+    def _collect(self):
+        # Snapshots of older versions go once nobody pins them; the latest one
+        # is kept for the next reader.
+        for version in [v for v in self._snapshots if v != self.version and v not in self._pins]:
+            folder, _ = self._snapshots.pop(version)
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def status(self):
+        with self._commit_lock:
+            return {"version": self.version, "pinned": dict(self._pins), "snapshots": sorted(self._snapshots)}
+
+
+def get_dataset(csv_folder):
+    key = os.path.abspath(csv_folder)
+    with _registry_lock:
+        dataset = _datasets.get(key)
+        if dataset is None:
+            dataset = _datasets[key] = Dataset(key)
+        return dataset
+
+
+def pin_snapshot(csv_folder):
+    return get_dataset(csv_folder).snapshot()
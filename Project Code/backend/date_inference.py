@@ -0,0 +1,111 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Formats tried in priority order; the first one that parses a value wins.
+PRIMARY_DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%Y/%m/%d']
+# Same layouts with day and month swapped, used for values the primary formats reject.
+SWAPPED_DATE_FORMATS = {
+    '%Y-%d-%m': '%Y-%m-%d',
+    '%m-%d-%Y': '%d-%m-%Y',
+    '%d/%m/%Y': '%m/%d/%Y',
+    '%Y/%d/%m': '%Y/%m/%d',
+}
+FALLBACK_FORMAT = 'dateutil'
+# Microsecond resolution keeps far-past/far-future outlier dates representable.
+DATE_DTYPE = 'datetime64[us]'
+
+SAMPLE_SIZE = 200
+MIN_DATE_RATIO = 0.5
+
+_DATE_LIKE = re.compile(r"\d{1,4}\s*[-/.\s]\s*(\d{1,2}|[A-Za-z]{3,9})\s*[-/.,\s]\s*\d{1,4}|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{2,4}")
+
+
+def _fallback_parse(values):
+    import dateutil.parser
+    parsed = []
+    for val in values:
+        try:
+            parsed.append(pd.Timestamp(dateutil.parser.parse(val)))
+        except Exception:
+            parsed.append(pd.NaT)
+    return parsed
+
+
+def _parse_uniques(uniques):
+    # uniques: object ndarray of distinct non-null strings
+    parsed = pd.Series(pd.NaT, index=range(len(uniques)), dtype=DATE_DTYPE)
+    formats = pd.Series(None, index=range(len(uniques)), dtype=object)
+    remaining = np.ones(len(uniques), dtype=bool)
+    candidates = PRIMARY_DATE_FORMATS + list(SWAPPED_DATE_FORMATS)
+    for fmt in candidates:
+        if not remaining.any():
+            break
+        subset = pd.Series(uniques[remaining], index=np.flatnonzero(remaining))
+        result = pd.to_datetime(subset, format=fmt, errors='coerce')
+        hit = result.notna()
+        if hit.any():
+            idx = result.index[hit]
+            parsed.iloc[idx] = result[hit].astype(DATE_DTYPE).values
+            formats.iloc[idx] = fmt
+            remaining[idx] = False
+    if remaining.any():
+        idx = np.flatnonzero(remaining)
+        fallback = pd.Series(_fallback_parse(uniques[idx]), index=idx)
+        hit = fallback.notna()
+        if hit.any():
+            hit_idx = fallback.index[hit]
+            parsed.iloc[hit_idx] = pd.to_datetime(fallback[hit]).astype(DATE_DTYPE).values
+            formats.iloc[hit_idx] = FALLBACK_FORMAT
+    return parsed, formats
+
+
+def looks_like_dates(series, sample_size=SAMPLE_SIZE, min_ratio=MIN_DATE_RATIO):
+    values = series
+    if len(values) > sample_size:
+        values = values.sample(sample_size, random_state=0)
+    values = values.dropna()
+    if values.empty:
+        values = series.dropna().head(sample_size)
+    if values.empty:
+        return False
+    values = values.astype(str)
+    if not values.str.contains(r"\d", regex=True).any():
+        return False
+    shaped = values.str.match(_DATE_LIKE.pattern)
+    if shaped.mean() < min_ratio:
+        return False
+    parsed, _ = _parse_uniques(values[shaped].unique().astype(object))
+    return parsed.notna().sum() > 0
+
+
+def infer_dates(series, sample_size=SAMPLE_SIZE, min_ratio=MIN_DATE_RATIO, check=True):
+    # Returns (dates, formats) aligned with series, or None when a sample of
+    # the column does not look like dates. Each distinct value is parsed once.
+    if check and not looks_like_dates(series, sample_size, min_ratio):
+        return None
+    codes, uniques = pd.factorize(series.astype(object).where(series.notna(), None))
+    uniques = np.asarray(uniques, dtype=object).astype(str).astype(object)
+    parsed, formats = _parse_uniques(uniques)
+    valid = codes >= 0
+    dates = pd.Series(pd.NaT, index=series.index, dtype=DATE_DTYPE)
+    matched = pd.Series(None, index=series.index, dtype=object)
+    if valid.any():
+        dates[valid] = parsed.values[codes[valid]]
+        matched[valid] = formats.values[codes[valid]]
+    return dates, matched
+
+
+def summarize_formats(formats):
+    return summarize_format_counts(formats.dropna().value_counts().to_dict())
+
+
+def summarize_format_counts(counts):
+    summary = {}
+    for fmt, count in sorted(counts.items(), key=lambda item: -item[1]):
+        entry = {'count': int(count)}
+        if fmt in SWAPPED_DATE_FORMATS:
+            entry['swapped_day_month'] = True
+            entry['expected_format'] = SWAPPED_DATE_FORMATS[fmt]
+        summary[fmt] = entry
+    return summary
@@ -0,0 +1,308 @@
+import os
+import uuid
+import shutil
+import zlib
+import numpy as np
+import pandas as pd
+from date_inference import infer_dates, SWAPPED_DATE_FORMATS, FALLBACK_FORMAT
+from merged_store import refresh_merged_store
+from dataset_versions import get_dataset
+from schema_catalog import SchemaCatalog
+from sql_database import DATA_FILE_SUFFIX, table_name_for_file
+from telemetry import traced
+
+MANIFEST_DIR_NAME = ".error_manifest"
+ERROR_TYPES = ("null", "outlier", "typo", "suspicious", "odd_date", "swapped_date", "duplicate_row")
+DEFAULT_ERROR_RATES = {
+    "null": 0.02,
+    "outlier": 0.01,
+    "typo": 0.01,
+    "suspicious": 0.005,
+    "odd_date": 0.005,
+    "swapped_date": 0.005,
+    "duplicate_row": 0.002,
+}
+SUSPICIOUS_PLACEHOLDERS = np.array(["Unknown", "unknown", "XX", "NULL", "null"], dtype=object)
+ODD_DATES = np.array(["1800-01-01", "1899-12-31", "2150-06-30", "2199-12-31"], dtype="datetime64[s]")
+# Whole-row duplicates are recorded against this pseudo-column.
+ROW_COLUMN = "*"
+
+
+def _column_kind(series):
+    values = series.dropna()
+    if values.empty:
+        return "empty", None
+    if pd.api.types.is_bool_dtype(values):
+        return "other", None
+    if pd.api.types.is_numeric_dtype(values):
+        return "numeric", None
+    inferred = infer_dates(values.astype(str))
+    if inferred is not None and inferred[0].notna().mean() >= 0.8:
+        formats = inferred[1].dropna()
+        formats = formats[(formats != FALLBACK_FORMAT) & ~formats.isin(list(SWAPPED_DATE_FORMATS))]
+        return "date", (formats.mode().iloc[0] if not formats.empty else "%Y-%m-%d")
+    return "text", None
+
+
+def _pick(rng, free, rate):
+    # Row positions among the still-untouched cells chosen with probability rate.
+    if rate <= 0:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(free & (rng.random(len(free)) < rate))
+
+
+def _typo(values, rng):
+    # Drops or transposes one character per value.
+    out = []
+    positions = rng.random(len(values))
+    swap = rng.random(len(values)) < 0.5
+    for value, p, s in zip(values, positions, swap):
+        value = str(value)
+        if len(value) < 2:
+            out.append(value + value)
+            continue
+        i = int(p * (len(value) - 1))
+        out.append(value[:i] + value[i + 1] + value[i] + value[i + 2:] if s and value[i] != value[i + 1]
+                   else value[:i] + value[i + 1:])
+    return out
+
+
+def _outliers(series, rows, rng):
+    values = series.to_numpy(dtype=float)
+    finite = values[np.isfinite(values)]
+    q1, q3 = np.percentile(finite, [25, 75])
+    spread = max(q3 - q1, np.abs(finite).max() * 0.1, 1.0)
+    # Well past the 1.5 * IQR fences on either side.
+    distance = spread * rng.uniform(4, 20, len(rows))
+    out = np.where(rng.random(len(rows)) < 0.5, q1 - distance, q3 + distance)
+    if pd.api.types.is_integer_dtype(series):
+        return np.round(out).astype(np.int64)
+    return np.round(out, 2)
+
+
+def inject_errors(df, rates=None, column_rates=None, protected=(), seed=0):
+    # Returns (corrupted copy, manifest). rates maps error type -> share of
+    # eligible cells; column_rates overrides them per column
+    # ({column: {error_type: rate}}). Each cell is corrupted at most once, and
+    # protected columns (keys) are left alone. The manifest has one row per
+    # corrupted cell: row, column, error_type, original, corrupted.
+    rates = {**DEFAULT_ERROR_RATES, **(rates or {})}
+    unknown = set(rates) - set(ERROR_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown error types: {', '.join(sorted(unknown))}")
+    column_rates = column_rates or {}
+    rng = np.random.default_rng(seed)
+    out = df.copy()
+    records = []
+
+    def record(rows, column, error_type, original, corrupted):
+        records.append(pd.DataFrame({
+            "row": rows.astype(np.int64),
+            "column": column,
+            "error_type": error_type,
+            "original": pd.Series(original, dtype=object).astype(str).to_numpy(),
+            "corrupted": pd.Series(corrupted, dtype=object).astype(str).to_numpy(),
+        }))
+
+    for column in df.columns:
+        if column in protected:
+            continue
+        col_rates = {**rates, **column_rates.get(column, {})}
+        kind, date_format = _column_kind(df[column])
+        series = df[column]
+        free = series.notna().to_numpy().copy()
+        if kind == "numeric":
+            rows = _pick(rng, free, col_rates["outlier"])
+            if len(rows):
+                corrupted = _outliers(series, rows, rng)
+                out.iloc[rows, out.columns.get_loc(column)] = corrupted
+                record(rows, column, "outlier", series.iloc[rows].to_numpy(), corrupted)
+                free[rows] = False
+        if kind == "date":
+            rows = _pick(rng, free, col_rates["odd_date"])
+            if len(rows):
+                corrupted = pd.Series(ODD_DATES[rng.integers(0, len(ODD_DATES), len(rows))]).dt.strftime(
+                    date_format).to_numpy(dtype=object)
+                out.iloc[rows, out.columns.get_loc(column)] = corrupted
+                record(rows, column, "odd_date", series.iloc[rows].to_numpy(), corrupted)
+                free[rows] = False
+            swapped_format = next((k for k, v in SWAPPED_DATE_FORMATS.items() if v == date_format), None)
+            rows = _pick(rng, free, col_rates["swapped_date"]) if swapped_format else np.empty(0, dtype=np.int64)
+            if len(rows):
+                parsed = pd.to_datetime(series.iloc[rows].astype(str), format=date_format, errors="coerce")
+                # Only dates whose day cannot also be a month become invalid
+                # in the expected format once swapped.
+                keep = parsed.notna().to_numpy() & (parsed.dt.day > 12).to_numpy()
+                rows, parsed = rows[keep], parsed[keep]
+                corrupted = parsed.dt.strftime(swapped_format).to_numpy(dtype=object)
+                out.iloc[rows, out.columns.get_loc(column)] = corrupted
+                record(rows, column, "swapped_date", series.iloc[rows].to_numpy(), corrupted)
+                free[rows] = False
+        if kind == "text":
+            rows = _pick(rng, free, col_rates["typo"])
+            if len(rows):
+                corrupted = _typo(series.iloc[rows].to_numpy(), rng)
+                out.iloc[rows, out.columns.get_loc(column)] = corrupted
+                record(rows, column, "typo", series.iloc[rows].to_numpy(), corrupted)
+                free[rows] = False
+            rows = _pick(rng, free, col_rates["suspicious"])
+            if len(rows):
+                corrupted = SUSPICIOUS_PLACEHOLDERS[rng.integers(0, len(SUSPICIOUS_PLACEHOLDERS), len(rows))]
+                out.iloc[rows, out.columns.get_loc(column)] = corrupted
+                record(rows, column, "suspicious", series.iloc[rows].to_numpy(), corrupted)
+                free[rows] = False
+        if kind != "empty":
+            rows = _pick(rng, free, col_rates["null"])
+            if len(rows):
+                original = out[column].iloc[rows].to_numpy()
+                if pd.api.types.is_integer_dtype(out[column]):
+                    # Nullable ints keep "3" from being written back as "3.0".
+                    out[column] = out[column].astype("Int64")
+                out.iloc[rows, out.columns.get_loc(column)] = None
+                record(rows, column, "null", original, [""] * len(rows))
+
+    n_duplicates = int(rng.binomial(len(df), rates["duplicate_row"])) if len(df) else 0
+    if n_duplicates:
+        sources = rng.integers(0, len(out), n_duplicates)
+        out = pd.concat([out, out.iloc[sources]], ignore_index=True)
+        rows = np.arange(len(df), len(df) + n_duplicates)
+        record(rows, ROW_COLUMN, "duplicate_row", sources, rows)
+
+    manifest = pd.concat(records, ignore_index=True) if records else pd.DataFrame(
+        columns=["row", "column", "error_type", "original", "corrupted"])
+    return out, manifest
+
+
+def _manifest_path(csv_folder, filename, manifest_dir=None):
+    manifest_dir = manifest_dir or os.path.join(csv_folder, MANIFEST_DIR_NAME)
+    return os.path.join(manifest_dir, f"{os.path.splitext(filename)[0]}.parquet")
+
+
+def _swap_manifest_dir(staged_dir, manifest_dir):
+    old_dir = f"{manifest_dir}.{uuid.uuid4().hex}.old"
+    if os.path.isdir(manifest_dir):
+        os.replace(manifest_dir, old_dir)
+    os.replace(staged_dir, manifest_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def read_error_manifest(csv_folder, filename):
+    return pd.read_parquet(_manifest_path(csv_folder, filename))
+
+
+@traced("inject_errors")
+def inject_errors_into_folder(csv_folder, rates=None, column_rates=None, seed=0):
+    # Corrupts every <table>_data.csv in place, leaving primary and foreign key
+    # columns intact so joins still work, and writes each table's ground truth
+    # to .error_manifest/<file>.parquet. column_rates may be keyed by
+    # "table.column" or by column name.
+    catalog = SchemaCatalog(csv_folder, refresh_merged_store(csv_folder))
+    # Manifests are staged next to the old ones and swapped in only once the
+    # corrupted tables are committed, so they always describe the live data.
+    manifest_dir = os.path.join(csv_folder, MANIFEST_DIR_NAME)
+    staged_dir = f"{manifest_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(staged_dir)
+    summary = {}
+    filenames = sorted(f for f in os.listdir(csv_folder) if f.lower().endswith(DATA_FILE_SUFFIX))
+    try:
+        # Corrupted tables are committed together as one dataset version.
+        with get_dataset(csv_folder).transaction(filenames) as txn:
+            for filename in filenames:
+                table = table_name_for_file(filename)
+                protected = set(catalog.primary_keys.get(table, []))
+                for r in catalog.relationships:
+                    if r["child"] == table:
+                        protected.update(r["child_columns"])
+                table_rates = {}
+                for key, value in (column_rates or {}).items():
+                    prefix, _, column = key.partition(".")
+                    if column and prefix.lower() == table:
+                        table_rates[column] = value
+                    elif not column:
+                        table_rates.setdefault(key, value)
+                path = os.path.join(csv_folder, filename)
+                df = pd.read_csv(path)
+                table_seed = [seed, zlib.crc32(table.encode("utf-8"))]
+                corrupted, manifest = inject_errors(df, rates, table_rates, protected, table_seed)
+                corrupted.to_csv(txn.path(filename), index=False)
+                manifest.to_parquet(_manifest_path(csv_folder, filename, staged_dir), index=False)
+                summary[filename] = manifest["error_type"].value_counts().to_dict()
+        _swap_manifest_dir(staged_dir, manifest_dir)
+    finally:
+        shutil.rmtree(staged_dir, ignore_errors=True)
+    return summary
+
+
+def _predicted_cells(analysis, df):
+    # {detector: {column: boolean mask}} reconstructed from an analyze_csv_file report.
+    predicted = {"missing": {}, "outliers": {}, "suspicious": {}, "swapped_dates": {}}
+    for column in analysis.get("missing_data", {}):
+        if column in df:
+            predicted["missing"][column] = df[column].isna().to_numpy()
+    date_columns = analysis.get("date_formats", {})
+    for column, values in analysis.get("outliers", {}).items():
+        if column not in df:
+            continue
+        if column in date_columns:
+            dates, _ = infer_dates(df[column], check=False)
+            mask = dates.dt.strftime("%Y-%m-%d").isin([str(v) for v in values])
+        else:
+            mask = df[column].isin(values)
+        predicted["outliers"][column] = mask.to_numpy()
+    for column, values in analysis.get("suspicious_values", {}).items():
+        if column in df:
+            predicted["suspicious"][column] = df[column].isin(values).to_numpy()
+    for column, formats in date_columns.items():
+        if column in df and any(entry.get("swapped_day_month") for entry in formats.values()):
+            _, matched = infer_dates(df[column], check=False)
+            predicted["swapped_dates"][column] = matched.isin(list(SWAPPED_DATE_FORMATS)).to_numpy()
+    return predicted
+
+
+def _ratio(a, b):
+    return round(a / b, 4) if b else None
+
+
+def score_analysis(analysis, df, manifest):
+    # Cell-level precision/recall of an analyze_csv_file report against the
+    # injection manifest for the corrupted frame df. Whole-row duplicates have
+    # no cell-level detector and are reported separately.
+    predicted = _predicted_cells(analysis, df)
+    cells = manifest[manifest["column"] != ROW_COLUMN]
+    truth = {}
+    for column, group in cells.groupby("column"):
+        mask = np.zeros(len(df), dtype=bool)
+        mask[group["row"].to_numpy()] = True
+        truth[column] = mask
+    flagged = {}
+    detector_hits = {}
+    for detector, columns in predicted.items():
+        tp = fp = 0
+        for column, mask in columns.items():
+            flagged[column] = flagged.get(column, np.zeros(len(df), dtype=bool)) | mask
+            hits = mask & truth.get(column, np.zeros(len(df), dtype=bool))
+            tp += int(hits.sum())
+            fp += int((mask & ~hits).sum())
+        detector_hits[detector] = {"flagged": tp + fp, "precision": _ratio(tp, tp + fp)}
+    tp = sum(int((flagged.get(c, 0) & m).sum()) for c, m in truth.items())
+    total_flagged = sum(int(m.sum()) for m in flagged.values())
+    total_truth = len(cells)
+    precision, recall = _ratio(tp, total_flagged), _ratio(tp, total_truth)
+    recall_by_type = {}
+    for error_type, group in cells.groupby("error_type"):
+        found = sum(int(flagged[c][g["row"].to_numpy()].sum()) for c, g in group.groupby("column") if c in flagged)
+        recall_by_type[error_type] = {"injected": len(group), "detected": found, "recall": _ratio(found, len(group))}
+    duplicates = int((manifest["column"] == ROW_COLUMN).sum())
+    return {
+        "cells": {
+            "injected": total_truth,
+            "flagged": total_flagged,
+            "true_positives": tp,
+            "precision": precision,
+            "recall": recall,
+            "f1": round(2 * precision * recall / (precision + recall), 4) if precision and recall else None,
+        },
+        "recall_by_error_type": recall_by_type,
+        "detectors": detector_hits,
+        "duplicate_rows_injected": duplicates,
+    }
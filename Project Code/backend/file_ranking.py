@@ -0,0 +1,141 @@
+import os
+import json
+import math
+import threading
+import pandas as pd
+from analysis_cache import CACHE_DIR_NAME
+from schema_catalog import singular
+from sql_database import table_name_for_file
+
+PROFILE_FILE_NAME = "file_profiles.json"
+PROFILE_SAMPLE_ROWS = 1000
+# Files up to this size are read whole so their row count is exact; larger
+# ones have it estimated from the sampled bytes per row.
+EXACT_ROWS_MAX_BYTES = 8 * 1024 * 1024
+RANKING_WEIGHTS = {"centrality": 0.35, "name": 0.3, "rows": 0.2, "cardinality": 0.15}
+IMPORTANT_NAME_HINTS = ("sale", "order", "customer", "product", "transaction", "invoice", "payment", "item")
+UNIMPORTANT_NAME_HINTS = ("log", "tmp", "temp", "backup", "audit", "staging", "archive", "test")
+
+_lock = threading.Lock()
+
+
+def _profile_path(csv_dir):
+    return os.path.join(csv_dir, CACHE_DIR_NAME, PROFILE_FILE_NAME)
+
+
+def _read_profiles(csv_dir):
+    try:
+        with open(_profile_path(csv_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_profiles(csv_dir, profiles):
+    path = _profile_path(csv_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profiles, f)
+    os.replace(tmp_path, path)
+
+
+def profile_file(path):
+    size = os.path.getsize(path)
+    if size <= EXACT_ROWS_MAX_BYTES:
+        df = pd.read_csv(path)
+        num_rows, estimated = len(df), False
+        sample = df.head(PROFILE_SAMPLE_ROWS)
+    else:
+        sample = pd.read_csv(path, nrows=PROFILE_SAMPLE_ROWS)
+        bytes_per_row = max(1.0, len(sample.to_csv(index=False).encode("utf-8")) / max(len(sample), 1))
+        num_rows, estimated = int(size / bytes_per_row), True
+    distinct = {c: round(float(sample[c].nunique(dropna=True)) / max(len(sample), 1), 4) for c in sample.columns}
+    first = sample.head(1).to_dict(orient="records")
+    return {
+        "columns": list(sample.columns),
+        "num_rows": int(num_rows),
+        "rows_estimated": estimated,
+        "distinct_ratio": distinct,
+        "sample": {k: str(v) for k, v in first[0].items()} if first else {},
+    }
+
+
+def get_file_profiles(csv_dir, files):
+    # Profiles are cached per file and reused while size and mtime match.
+    with _lock:
+        cached = _read_profiles(csv_dir)
+        profiles = {}
+        changed = set(cached) - set(files)
+        for file in files:
+            path = os.path.join(csv_dir, file)
+            st = os.stat(path)
+            entry = cached.get(file)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                profiles[file] = entry["profile"]
+                continue
+            try:
+                profile = profile_file(path)
+            except Exception as e:
+                profile = {"columns": [], "num_rows": 0, "rows_estimated": False, "distinct_ratio": {},
+                           "sample": {}, "error": str(e)}
+            cached[file] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "profile": profile}
+            profiles[file] = profile
+            changed.add(file)
+        if changed:
+            _write_profiles(csv_dir, {f: cached[f] for f in files})
+        return profiles
+
+
+def _key_names(table):
+    return {f"{table}_id", f"{singular(table)}_id"}
+
+
+def rank_files(profiles):
+    # Deterministic scores in [0, 1] combining how many other tables reference a
+    # table by key name, name hints, row count and column cardinality.
+    tables = {file: table_name_for_file(file) for file in profiles}
+    columns = {file: {c.lower() for c in p["columns"]} for file, p in profiles.items()}
+    referenced = {file: 0 for file in profiles}
+    references = {file: 0 for file in profiles}
+    for parent, table in tables.items():
+        keys = _key_names(table)
+        for child in profiles:
+            if child != parent and columns[child] & keys:
+                referenced[parent] += 1
+                references[child] += 1
+    max_degree = max((2 * referenced[f] + references[f] for f in profiles), default=0) or 1
+    max_rows = max((math.log1p(p["num_rows"]) for p in profiles.values()), default=0) or 1
+    ranking = []
+    for file, profile in profiles.items():
+        table = tables[file]
+        name = 0.5
+        if any(hint in table for hint in IMPORTANT_NAME_HINTS):
+            name = 1.0
+        elif any(hint in table for hint in UNIMPORTANT_NAME_HINTS):
+            name = 0.0
+        ratios = list(profile["distinct_ratio"].values())
+        components = {
+            "centrality": (2 * referenced[file] + references[file]) / max_degree,
+            "name": name,
+            "rows": math.log1p(profile["num_rows"]) / max_rows,
+            "cardinality": (sum(ratios) / len(ratios)) * min(1.0, len(ratios) / 8) if ratios else 0.0,
+        }
+        score = sum(RANKING_WEIGHTS[k] * v for k, v in components.items())
+        ranking.append({"file": file, "score": round(score, 4),
+                        "components": {k: round(v, 4) for k, v in components.items()}})
+    ranking.sort(key=lambda r: (-r["score"], r["file"]))
+    return ranking
+
+
+def shortlist_text(ranking, profiles, size):
+    # One compact line per shortlisted file, so prompt size does not depend on
+    # how many files the folder holds.
+    lines = []
+    for entry in ranking[:size]:
+        profile = profiles[entry["file"]]
+        columns = profile["columns"][:8]
+        more = f", +{len(profile['columns']) - 8} more" if len(profile["columns"]) > 8 else ""
+        lines.append(f"{entry['file']} | rows: {profile['num_rows']} | columns: {', '.join(columns)}{more}"
+                     f" | score: {entry['score']}")
+    return "\n".join(lines)
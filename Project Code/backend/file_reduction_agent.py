@@ -1,29 +1,27 @@
 import os
-import pandas as pd
 import re
 import ast
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
+import asyncio
+from llm_runtime import get_chat_model, run_llm
+from merged_store import MERGED_FILE_NAME
+from dataset_versions import get_dataset
+from file_ranking import get_file_profiles, rank_files, shortlist_text
+from telemetry import traced
 
-load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENROUTER_MOONSHOT_KIMI_DEV_API_KEY")
-os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
+MODEL_ID = "moonshotai/kimi-dev-72b:free"
+API_KEY_ENV = "OPENROUTER_MOONSHOT_KIMI_DEV_API_KEY"
+# Most files the LLM is shown when use_llm is set.
+SHORTLIST_MAX = 20
 
 def list_csv_files(directory):
     return [f for f in os.listdir(directory)
             if os.path.isfile(os.path.join(directory, f)) and f.lower().endswith('.csv')]
 
-def get_file_summaries(files, csv_dir):
-    summaries = []
-    for file in files:
-        path = os.path.join(csv_dir, file)
-        try:
-            df = pd.read_csv(path, nrows=3)
-            summary = f"File: {file}\nColumns: {', '.join(df.columns)}\nSample:\n{df.head(1).to_dict(orient='records')[0]}"
-        except Exception as e:
-            summary = f"File: {file}\nCould not read file: {e}"
-        summaries.append(summary)
-    return summaries
+def remove_dataset_files(csv_dir, filenames):
+    # All removals land in one dataset version
+    with get_dataset(csv_dir).transaction(filenames) as txn:
+        for f in filenames:
+            txn.remove(f)
 
 def extract_list_from_response(response):
     match = re.search(r"\[.*?\]", response, re.DOTALL)
@@ -34,38 +32,48 @@ def extract_list_from_response(response):
             return None
     return None
 
-def reduce_files(csv_dir, n_keep):
+@traced("reduce_files")
+async def reduce_files(csv_dir, n_keep, use_llm=False):
+    # Files are ranked locally from cached profiles; the LLM, when asked for,
+    # only picks from a short top-ranked list and any gap in its answer is
+    # filled from the local ranking.
     files = list_csv_files(csv_dir)
-    merged_file = "__merged_all_data.csv"
+    merged_file = MERGED_FILE_NAME
     # Exclude merged file from selection and always keep it
-    files_no_merged = [f for f in files if f != merged_file]
+    files_no_merged = sorted(f for f in files if f != merged_file)
     if not files_no_merged:
         return {"error": "No CSV files found except the merged file."}
-    summaries = get_file_summaries(files_no_merged, csv_dir)
-    summaries_text = "\n\n".join(summaries)
-    prompt = (
-        f"You are a data analyst. Here are summaries of CSV files:\n\n"
-        f"{summaries_text}\n\n"
-        f"From the above, select the {n_keep} most important files to keep (based on file names and file data)."
-        f"!IMPORTANT: The important files are the ones that contain sales, order and customer information or details about the product or industry-sub_domain."
-        f"Make sure all the important files are kept in the directory"
-        f"Return only the file names as a Python list, with no explanation or formatting, and do not include markdown or code blocks."
-        f"For example: ['file1.csv', 'file2.csv']"
-    )
-    llm = ChatOpenAI(model="moonshotai/kimi-dev-72b:free", temperature=0)
-    response = llm.invoke(prompt)
-    response_text = str(response)
-    keep_files = extract_list_from_response(response_text)
-    if not keep_files or not isinstance(keep_files, list):
-        return {"error": "Could not parse LLM response. Please check the output.", "llm_response": response_text}
-    # Only keep up to n_keep files from files_no_merged
-    keep_files = keep_files[:n_keep]
-    # Always keep merged file
-    keep_files.append(merged_file)
-    remove_files = [f for f in files if f not in keep_files and f != merged_file]
-    for f in remove_files:
+    profiles = await asyncio.to_thread(get_file_profiles, csv_dir, files_no_merged)
+    ranking = rank_files(profiles)
+    ranked = [r["file"] for r in ranking]
+    keep_files = []
+    method = "local"
+    if use_llm and n_keep < len(ranked):
+        size = min(len(ranked), max(2 * n_keep, n_keep + 5), SHORTLIST_MAX)
+        prompt = (
+            f"You are a data analyst. Here are the highest-ranked CSV files (name | rows | columns | local score):\n\n"
+            f"{shortlist_text(ranking, profiles, size)}\n\n"
+            f"From the above, select the {n_keep} most important files to keep (based on file names and file data)."
+            f"!IMPORTANT: The important files are the ones that contain sales, order and customer information or details about the product or industry-sub_domain."
+            f"Return only the file names as a Python list, with no explanation or formatting, and do not include markdown or code blocks."
+            f"For example: ['file1.csv', 'file2.csv']"
+        )
         try:
-            os.remove(os.path.join(csv_dir, f))
+            llm = get_chat_model(MODEL_ID, API_KEY_ENV)
+            response = await run_llm(MODEL_ID, lambda: llm.ainvoke(prompt), key=("reduce", prompt))
+            response_text = response.content if hasattr(response, "content") else str(response)
+            chosen = extract_list_from_response(response_text)
+            if isinstance(chosen, list):
+                shortlist = set(ranked[:size])
+                keep_files = [f for f in dict.fromkeys(chosen) if f in shortlist][:n_keep]
+                method = "llm"
         except Exception:
             pass
-    return {"kept": keep_files, "removed": remove_files}
+    keep_files += [f for f in ranked if f not in keep_files][:n_keep - len(keep_files)]
+    # Always keep merged file
+    keep_files.append(merged_file)
+    remove_files = [f for f in files if f not in keep_files and f != merged_file]
+    await asyncio.to_thread(remove_dataset_files, csv_dir, remove_files)
+    scores = {r["file"]: r["score"] for r in ranking}
+    return {"kept": keep_files, "removed": remove_files, "method": method,
+            "scores": {f: scores[f] for f in ranked}}
@@ -0,0 +1,266 @@
+import re
+import pandas as pd
+
+
+class InstructionNotApplicable(Exception):
+    pass
+
+
+class CompiledInstruction:
+    def __init__(self, description, func):
+        self.description = description
+        self._func = func
+
+    def apply(self, df):
+        # Returns a new DataFrame; raises InstructionNotApplicable when the
+        # instruction refers to columns the frame does not have.
+        return self._func(df)
+
+
+_COL = r"(?:column\s+)?(?P<{name}>'[^']+'|\"[^\"]+\"|`[^`]+`|[\w.\-]+)"
+# Unquoted values are one token; anything longer (e.g. "0 for rows where
+# ...") is left to the agent.
+_VALUE = r"(?P<value>'[^']*'|\"[^\"]*\"|most\s+frequent\s+value|[\w.\-]+)"
+# Words that qualify or combine conditions; column lists containing them are
+# not compiled.
+_QUALIFIERS = re.compile(r"\b(?:or|where|for|if|except|unless|when|but)\b", re.IGNORECASE)
+_OPS = {
+    "is not": "!=", "is": "==", "equals": "==", "equal to": "==", "==": "==", "=": "==",
+    "!=": "!=", "<>": "!=", ">=": ">=", "<=": "<=", ">": ">", "<": "<",
+    "is greater than": ">", "greater than": ">", "is less than": "<", "less than": "<",
+    "contains": "contains",
+}
+_OP_PATTERN = "|".join(re.escape(op) for op in sorted(_OPS, key=len, reverse=True))
+
+
+def _col(name):
+    return _COL.format(name=name)
+
+
+def _unquote(token):
+    token = token.strip()
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in "'\"`":
+        return token[1:-1]
+    return token
+
+
+def _resolve(df, name):
+    name = _unquote(name)
+    if name in df.columns:
+        return name
+    lowered = {str(c).lower(): c for c in df.columns}
+    if name.lower() in lowered:
+        return lowered[name.lower()]
+    raise InstructionNotApplicable(f"Column '{name}' not found.")
+
+
+def _literal(token, series=None):
+    raw = token.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "'\"":
+        return raw[1:-1]
+    if raw.lower() in ("null", "none", "nan", "missing", "empty"):
+        return None
+    if series is None or pd.api.types.is_numeric_dtype(series):
+        try:
+            number = float(raw)
+            return int(number) if number.is_integer() and "." not in raw else number
+        except ValueError:
+            pass
+    return raw
+
+
+def _split_columns(text):
+    return [c for c in (part.strip() for part in re.split(r",|\band\b", text)) if c]
+
+
+def _fill_nulls(m):
+    target, strategy = m.group("col"), m.group("value").strip()
+
+    def run(df):
+        col = _resolve(df, target)
+        series = df[col]
+        key = " ".join(strategy.lower().split())
+        if key in ("mean", "average", "the mean", "the average"):
+            fill = series.mean()
+        elif key in ("median", "the median"):
+            fill = series.median()
+        elif key in ("mode", "the mode", "most frequent value", "the most frequent value"):
+            modes = series.mode()
+            fill = modes.iloc[0] if not modes.empty else None
+        else:
+            fill = _literal(strategy, series)
+        out = df.copy()
+        out[col] = series.fillna(fill)
+        return out
+    return run
+
+
+def _drop_rows_where(m):
+    target, op, value = m.group("col"), _OPS[m.group("op").lower()], m.group("value")
+
+    def run(df):
+        col = _resolve(df, target)
+        series = df[col]
+        literal = _literal(value, series)
+        if literal is None:
+            mask = series.isna() if op == "==" else series.notna()
+        elif op == "contains":
+            mask = series.astype(str).str.contains(str(literal), regex=False, na=False)
+        elif op in ("==", "!="):
+            if pd.api.types.is_numeric_dtype(series) and isinstance(literal, (int, float)):
+                mask = series == literal
+            else:
+                mask = series.astype(str) == str(literal)
+            if op == "!=":
+                mask = ~mask & series.notna()
+        else:
+            numeric = pd.to_numeric(series, errors="coerce")
+            try:
+                bound = float(literal)
+            except (TypeError, ValueError):
+                raise InstructionNotApplicable(f"'{value}' is not a number.")
+            mask = {"<": numeric < bound, ">": numeric > bound,
+                    "<=": numeric <= bound, ">=": numeric >= bound}[op]
+        return df[~mask].reset_index(drop=True)
+    return run
+
+
+def _drop_null_rows(m):
+    targets = m.group("cols")
+
+    def run(df):
+        cols = [_resolve(df, c) for c in _split_columns(targets)] if targets else None
+        return df.dropna(subset=cols).reset_index(drop=True)
+    return run
+
+
+def _rename(m):
+    old, new = m.group("col"), _unquote(m.group("new"))
+
+    def run(df):
+        return df.rename(columns={_resolve(df, old): new})
+    return run
+
+
+def _drop_duplicates(m):
+    targets = m.group("cols")
+
+    def run(df):
+        cols = [_resolve(df, c) for c in _split_columns(targets)] if targets else None
+        return df.drop_duplicates(subset=cols).reset_index(drop=True)
+    return run
+
+
+def _drop_columns(m):
+    targets = m.group("cols")
+
+    def run(df):
+        return df.drop(columns=[_resolve(df, c) for c in _split_columns(targets)])
+    return run
+
+
+def _replace_values(m):
+    old, new, target = m.group("old"), m.group("new"), m.group("col")
+
+    def run(df):
+        col = _resolve(df, target)
+        series = df[col]
+        old_value = _literal(old, series)
+        new_value = _literal(new, series)
+        out = df.copy()
+        if old_value is None:
+            out[col] = series.fillna(new_value)
+        elif pd.api.types.is_numeric_dtype(series):
+            out[col] = series.replace(old_value, new_value)
+        else:
+            out[col] = series.where(series.astype(str) != str(old_value), new_value)
+        return out
+    return run
+
+
+def _convert(m):
+    target, kind = m.group("col"), m.group("kind").lower()
+
+    def run(df):
+        col = _resolve(df, target)
+        out = df.copy()
+        if kind in ("int", "integer"):
+            out[col] = pd.to_numeric(out[col], errors="coerce").round().astype("Int64")
+        elif kind in ("float", "number", "numeric", "decimal"):
+            out[col] = pd.to_numeric(out[col], errors="coerce")
+        elif kind in ("date", "datetime"):
+            out[col] = pd.to_datetime(out[col], errors="coerce")
+        else:
+            out[col] = out[col].astype("string")
+        return out
+    return run
+
+
+def _strip(m):
+    target = m.group("col")
+
+    def run(df):
+        col = _resolve(df, target)
+        out = df.copy()
+        out[col] = out[col].where(out[col].isna(), out[col].astype(str).str.strip())
+        return out
+    return run
+
+
+def _case(m):
+    target, kind = m.group("col"), m.group("kind").lower()
+
+    def run(df):
+        col = _resolve(df, target)
+        out = df.copy()
+        text = out[col].astype(str)
+        text = {"lowercase": text.str.lower(), "uppercase": text.str.upper(),
+                "title case": text.str.title()}[kind]
+        out[col] = out[col].where(out[col].isna(), text)
+        return out
+    return run
+
+
+_RULES = [
+    (r"(?:fill|replace|impute)\s+(?:all\s+)?(?:the\s+)?(?:nulls?|nans?|missing|empty)(?:\s+values)?\s+(?:in|of|for)\s+"
+     + _col("col") + r"\s+with\s+(?:the\s+)?" + _VALUE, _fill_nulls, "fill nulls"),
+    (r"fill\s+(?:the\s+)?(?:missing|null)\s+" + _col("col") + r"(?:\s+values)?\s+with\s+(?:the\s+)?" + _VALUE,
+     _fill_nulls, "fill nulls"),
+    (r"(?:drop|remove|delete)\s+(?:all\s+)?(?:the\s+)?rows\s+(?:with|containing|that have)\s+"
+     r"(?:any\s+)?(?:null|nan|missing|empty)(?:\s+values)?(?:\s+in\s+(?P<cols>.+?))?", _drop_null_rows, "drop null rows"),
+    (r"(?:drop|remove|delete)\s+(?:all\s+)?(?:the\s+)?rows\s+(?:where|in which|with)\s+" + _col("col")
+     + r"\s+(?P<op>" + _OP_PATTERN + r")\s+" + _VALUE, _drop_rows_where, "drop rows"),
+    (r"rename\s+" + _col("col") + r"\s+(?:to|as|into)\s+(?P<new>'[^']+'|\"[^\"]+\"|`[^`]+`|[\w.\-]+)", _rename, "rename column"),
+    (r"(?:drop|remove|delete)\s+(?:all\s+)?(?:the\s+)?duplicates?(?:\s+rows|\s+records)?"
+     r"(?:\s+(?:in|on|by|based on)\s+(?P<cols>.+?))?", _drop_duplicates, "drop duplicates"),
+    (r"(?:drop|remove|delete)\s+(?:the\s+)?columns?\s+(?P<cols>.+?)", _drop_columns, "drop columns"),
+    (r"replace\s+(?P<old>'[^']*'|\"[^\"]*\"|\S+)\s+with\s+(?P<new>'[^']*'|\"[^\"]*\"|\S+)\s+in\s+" + _col("col"),
+     _replace_values, "replace values"),
+    (r"(?:convert|cast|change)\s+" + _col("col") + r"\s+(?:to|into|as)\s+(?:an?\s+)?(?P<kind>int|integer|float|number|numeric|decimal|string|text|str|date|datetime)(?:\s+type)?",
+     _convert, "convert column"),
+    (r"(?:strip|trim)\s+(?:the\s+)?(?:leading\s+and\s+trailing\s+)?(?:whitespace|spaces)\s+(?:in|from)\s+" + _col("col")
+     + r"|(?:strip|trim)\s+" + _col("col2"), _strip, "strip whitespace"),
+    (r"(?:convert|make|change)\s+" + _col("col") + r"\s+(?:to\s+)?(?P<kind>lowercase|uppercase|title case)", _case, "change case"),
+]
+_COMPILED_RULES = [(re.compile(r"^\s*" + pattern + r"\s*[.;]?\s*$", re.IGNORECASE), build, label)
+                   for pattern, build, label in _RULES]
+
+
+class _Match:
+    # Lets rules with alternative spellings use the same group names.
+    def __init__(self, match):
+        self._match = match
+
+    def group(self, name):
+        value = self._match.groupdict().get(name)
+        if value is None and name == "col":
+            value = self._match.groupdict().get("col2")
+        return value
+
+
+def compile_instruction(instruction):
+    for pattern, build, label in _COMPILED_RULES:
+        match = pattern.match(instruction)
+        if match and not _QUALIFIERS.search(match.groupdict().get("cols") or ""):
+            return CompiledInstruction(f"{label}: {instruction.strip()}", build(_Match(match)))
+    return None
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+
+# SQLite file holding the queue; unset puts it next to the workspaces.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# Submissions beyond this many waiting jobs are rejected.
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", 100))
+# Finished jobs and their results are kept this many seconds.
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 86400))
+JOB_MAX_PARTIAL_RESULTS = 1000
+# Progress reports are written to SQLite at most this often per job; state
+# changes are always written at once.
+JOB_SAVE_INTERVAL = float(os.getenv("JOB_SAVE_INTERVAL", 1.0))
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+_COLUMNS = ("id", "kind", "workspace", "status", "params", "progress", "partial", "result", "error",
+            "created", "started", "finished")
+_JSON_COLUMNS = ("params", "progress", "partial", "result")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    # One unit of background work. report() records progress and partial
+    # results and wakes anyone watching the job. cancel_requested is set when
+    # the job is cancelled; handlers pass it on to work running in threads.
+
+    def __init__(self, queue, id, kind, workspace, status="queued", params=None, progress=None, partial=None,
+                 result=None, error=None, created=None, started=None, finished=None):
+        self.queue = queue
+        self.id = id
+        self.kind = kind
+        self.workspace = workspace
+        self.status = status
+        self.params = params or {}
+        self.progress = progress
+        self.partial = partial or []
+        self.result = result
+        self.error = error
+        self.created = created or time.time()
+        self.started = started
+        self.finished = finished
+        self.task = None
+        self.changed = asyncio.Event()
+        self.cancel_requested = threading.Event()
+        self.saved_at = 0.0
+
+    def report(self, progress=None, partial=None):
+        if progress is not None:
+            self.progress = progress
+        if partial is not None and len(self.partial) < JOB_MAX_PARTIAL_RESULTS:
+            self.partial.append(partial)
+        self.queue._save(self, force=False)
+
+    def describe(self, full=True):
+        info = {"job_id": self.id, "kind": self.kind, "status": self.status, "progress": self.progress,
+                "error": self.error, "created": self.created, "started": self.started, "finished": self.finished}
+        if self.finished:
+            info["expires"] = self.finished + self.queue.ttl
+        if full:
+            info["partial_results"] = self.partial
+            info["result"] = self.result
+        return info
+
+
+class JobQueue:
+    # Jobs are persisted in SQLite and run by a fixed number of asyncio
+    # workers. Handlers are registered per kind as async handler(job, params).
+    # After a restart, queued jobs run again; jobs that were running are
+    # marked failed, since their work may be half applied.
+
+    def __init__(self, path, workers=JOB_WORKERS, max_queued=JOB_QUEUE_MAX, ttl=JOB_RESULT_TTL,
+                 save_interval=JOB_SAVE_INTERVAL):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.save_interval = save_interval
+        self._handlers = {}
+        self._active = {}
+        self._pending = asyncio.Queue()
+        self._worker_tasks = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, workspace TEXT, status TEXT, "
+            "params TEXT, progress TEXT, partial TEXT, result TEXT, error TEXT, created REAL, started REAL, "
+            "finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_workspace ON jobs (workspace, created)")
+        self._db.commit()
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    async def start(self):
+        self.purge()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"
+            ).fetchall()
+        for row in rows:
+            job = self._from_row(row)
+            if job.status == "running":
+                self._finish(job, "failed", error="Interrupted by a server restart.")
+                continue
+            self._active[job.id] = job
+            self._pending.put_nowait(job)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        running = [job.task for job in self._active.values() if job.task is not None and not job.task.done()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, *running, return_exceptions=True)
+        with self._lock:
+            self._db.close()
+
+    def submit(self, kind, workspace, params):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}'.")
+        if sum(1 for job in self._active.values() if job.status == "queued") >= self.max_queued:
+            raise QueueFull("Too many queued jobs, try again later.")
+        self.purge()
+        job = Job(self, uuid.uuid4().hex, kind, workspace, params=params)
+        self._save(job)
+        self._active[job.id] = job
+        self._pending.put_nowait(job)
+        return job
+
+    def get(self, job_id, workspace=None):
+        job = self._active.get(job_id)
+        if job is None:
+            with self._lock:
+                row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?",
+                                       (job_id,)).fetchone()
+            job = self._from_row(row) if row else None
+        if job is None or (workspace is not None and job.workspace != workspace):
+            return None
+        return job
+
+    def list(self, workspace, limit=100):
+        self.purge()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE workspace = ? ORDER BY created DESC LIMIT ?",
+                (workspace, limit),
+            ).fetchall()
+        return [(self._active.get(row[0]) or self._from_row(row)).describe(full=False) for row in rows]
+
+    def cancel(self, job_id, workspace=None):
+        job = self.get(job_id, workspace)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_requested.set()
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            self._finish(job, "cancelled")
+        return job
+
+    async def watch(self, job_id, workspace=None, keepalive=15):
+        # Yields the job's state now and after every change, until it finishes;
+        # None is yielded as a keepalive when nothing changed for a while.
+        job = self.get(job_id, workspace)
+        if job is None:
+            return
+        while True:
+            changed = job.changed
+            yield job.describe()
+            if job.status in FINISHED_STATES:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def purge(self):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                             (time.time() - self.ttl,))
+            self._db.commit()
+
+    async def _worker(self):
+        while True:
+            job = await self._pending.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.started = time.time()
+            self._save(job)
+            job.task = asyncio.ensure_future(self._handlers[job.kind](job, job.params))
+            await asyncio.wait({job.task})
+            if job.task.cancelled():
+                self._finish(job, "cancelled")
+            elif job.task.exception() is not None:
+                self._finish(job, "failed", error=str(job.task.exception()))
+            else:
+                self._finish(job, "succeeded", result=job.task.result())
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        self._save(job)
+        self._active.pop(job.id, None)
+
+    def _save(self, job, force=True):
+        # Watchers see every change; the row is rewritten at most every
+        # save_interval seconds unless forced, since it carries all partial
+        # results so far.
+        now = time.monotonic()
+        if force or now - job.saved_at >= self.save_interval:
+            job.saved_at = now
+            values = [getattr(job, column) for column in _COLUMNS]
+            for i, column in enumerate(_COLUMNS):
+                if column in _JSON_COLUMNS:
+                    values[i] = json.dumps(values[i], default=str)
+            with self._lock:
+                self._db.execute(f"INSERT OR REPLACE INTO jobs VALUES ({', '.join('?' * len(_COLUMNS))})", values)
+                self._db.commit()
+        # Wake watchers, then give the next change a fresh event.
+        job.changed.set()
+        job.changed = asyncio.Event()
+
+    def _from_row(self, row):
+        values = dict(zip(_COLUMNS, row))
+        for column in _JSON_COLUMNS:
+            values[column] = json.loads(values[column]) if values[column] else None
+        return Job(self, **values)
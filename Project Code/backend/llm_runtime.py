@@ -0,0 +1,221 @@
+import os
+import time
+import asyncio
+import random
+import httpx
+import openai
+from dotenv import load_dotenv
+from telemetry import span, observe, inc, record_tokens
+
+# Point this at a local OpenAI-compatible server to run against a fake LLM.
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://openrouter.ai/api/v1")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 300))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1.0))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 64))
+# Per-model overrides of LLM_MAX_CONCURRENCY
+MODEL_CONCURRENCY = {}
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_http_client = None
+_async_http_client = None
+_semaphores = {}
+_inflight = {}
+_chat_model_factory = None
+_callback_types = None
+
+
+def _limits():
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS)
+
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits(), timeout=LLM_TIMEOUT)
+    return _http_client
+
+
+def get_async_http_client():
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(limits=_limits(), timeout=LLM_TIMEOUT)
+    return _async_http_client
+
+
+async def close_http_clients():
+    global _http_client, _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
+def _callback_classes():
+    # (LLMUsageCallback, AgentStepCallback), defined on first use so that
+    # importing this module does not pull in langchain_core.
+    global _callback_types
+    if _callback_types is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMUsageCallback(BaseCallbackHandler):
+            # Round-trip latency and token usage of every request a chat
+            # model makes, including the ones agents make internally.
+
+            def __init__(self, model):
+                self.model = model
+                self._starts = {}
+
+            def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+                self._starts[run_id] = time.perf_counter()
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                self._starts[run_id] = time.perf_counter()
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                start = self._starts.pop(run_id, None)
+                if start is not None:
+                    observe("dataverse_llm_request_duration_seconds", time.perf_counter() - start,
+                            model=self.model, status="ok")
+                usage = (response.llm_output or {}).get("token_usage") or {}
+                if usage:
+                    record_tokens(self.model, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                    return
+                for generations in response.generations:
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                        record_tokens(self.model, metadata.get("input_tokens"), metadata.get("output_tokens"))
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                start = self._starts.pop(run_id, None)
+                if start is not None:
+                    observe("dataverse_llm_request_duration_seconds", time.perf_counter() - start,
+                            model=self.model, status="error")
+
+        class AgentStepCallback(BaseCallbackHandler):
+            # Per-tool latency of agent steps; pass through agent_config().
+
+            def __init__(self):
+                self._starts = {}
+
+            def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+                self._starts[run_id] = ((serialized or {}).get("name", "tool"), time.perf_counter())
+
+            def _finish(self, run_id):
+                started = self._starts.pop(run_id, None)
+                if started is not None:
+                    observe("dataverse_agent_step_duration_seconds", time.perf_counter() - started[1],
+                            tool=started[0])
+
+            def on_tool_end(self, output, *, run_id, **kwargs):
+                self._finish(run_id)
+
+            def on_tool_error(self, error, *, run_id, **kwargs):
+                self._finish(run_id)
+
+        _callback_types = (LLMUsageCallback, AgentStepCallback)
+    return _callback_types
+
+
+def agent_config():
+    # config= for agent ainvoke calls, so their tool steps are timed.
+    _, agent_step_callback = _callback_classes()
+    return {"callbacks": [agent_step_callback()]}
+
+
+def set_chat_model_factory(factory):
+    # factory(model, temperature) -> chat model; None restores the OpenRouter client.
+    global _chat_model_factory
+    _chat_model_factory = factory
+
+
+def get_chat_model(model, api_key_env="MENTOR_API_KEY", temperature=0, max_retries=0):
+    # max_retries retries single requests inside the client. Agents whose
+    # tools change state set it and call run_llm with retries=0, since
+    # re-running the whole agent would repeat work already applied.
+    if _chat_model_factory is not None:
+        return _chat_model_factory(model, temperature)
+    # Imported on first use: langchain_openai pulls in the OpenAI SDK and
+    # tokenizers, which would otherwise add to every server start.
+    from langchain_openai import ChatOpenAI
+
+    llm_usage_callback, _ = _callback_classes()
+    load_dotenv()
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        api_key=os.getenv(api_key_env),
+        base_url=LLM_API_BASE,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        # Retries are otherwise handled by run_llm so they count against the
+        # model's semaphore.
+        max_retries=max_retries,
+        timeout=LLM_TIMEOUT,
+        callbacks=[llm_usage_callback(model)],
+    )
+
+
+def _semaphore(model):
+    semaphore = _semaphores.get(model)
+    if semaphore is None:
+        semaphore = _semaphores[model] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, LLM_MAX_CONCURRENCY))
+    return semaphore
+
+
+def model_slot(model):
+    # For calls that cannot go through run_llm (e.g. token streaming) but
+    # should still count against the model's concurrency limit.
+    return _semaphore(model)
+
+
+async def _run_with_retries(model, call, timeout, retries):
+    attempt = 0
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span("llm_call", model=model):
+            while True:
+                try:
+                    async with _semaphore(model):
+                        result = await asyncio.wait_for(call(), timeout)
+                    status = "ok"
+                    return result
+                except RETRYABLE_ERRORS:
+                    if attempt >= retries:
+                        raise
+                    inc("dataverse_llm_retries_total", model=model)
+                    delay = LLM_RETRY_BASE_DELAY * 2 ** attempt
+                    await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                    attempt += 1
+    finally:
+        observe("dataverse_llm_call_duration_seconds", time.perf_counter() - start, model=model)
+        inc("dataverse_llm_calls_total", model=model, status=status)
+
+
+async def run_llm(model, call, key=None, timeout=None, retries=None):
+    # call: zero-argument function returning a fresh awaitable on each attempt.
+    # Calls with the same (model, key) while one is in flight share its result.
+    timeout = LLM_TIMEOUT if timeout is None else timeout
+    retries = LLM_MAX_RETRIES if retries is None else retries
+    if key is None:
+        return await _run_with_retries(model, call, timeout, retries)
+    inflight_key = (model, key)
+    future = _inflight.get(inflight_key)
+    if future is None:
+        future = asyncio.ensure_future(_run_with_retries(model, call, timeout, retries))
+        _inflight[inflight_key] = future
+        future.add_done_callback(lambda _: _inflight.pop(inflight_key, None))
+    return await asyncio.shield(future)
@@ -1,32 +1,262 @@
 import os
-from fastapi import FastAPI, Form, UploadFile, File
-from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
+from fastapi import FastAPI, Form, UploadFile, File, Request, Depends
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from data_error_recognition_agent import (
     analyze_all_csv_files,
     create_merged_csv_agent,
     get_missing_values_by_prefix,
+    load_schema_catalog,
+    AGENT_MODEL_ID,
 )
-from data_modification_agent import modify_csv_file, process_instruction_file
+from null_index import get_null_rows
+from data_modification_agent import modify_csv_file, process_instruction_file, iter_instruction_results
 from file_reduction_agent import reduce_files
-from data_generation_agent_with_errors import generate_sql_for_industry_subdomain
-from data_generation_agent import generate_ideal_sql_for_industry_subdomain 
+from data_generation_agent_with_errors import (
+    generate_sql_for_industry_subdomain,
+    stream_sql_for_industry_subdomain,
+    generate_sql_with_errors_parallel,
+    stream_sql_with_errors_parallel,
+    generate_sql_with_local_errors,
+)
+from data_generation_agent import (
+    generate_ideal_sql_for_industry_subdomain,
+    stream_ideal_sql_for_industry_subdomain,
+    generate_ideal_sql_parallel,
+    stream_ideal_sql_parallel,
+)
+from synthetic_expander import expand_dataset
+from llm_runtime import run_llm, close_http_clients, get_chat_model, agent_config
+from answer_cache import AnswerCache, normalize_question
+from merged_store import read_manifest, data_version
+from dataset_versions import get_dataset, cancellable_commits
+from jobs import JobQueue, QueueFull, JOBS_DB_PATH, FINISHED_STATES
+from workspaces import (
+    CSV_FOLDER,
+    WORKSPACES_DIR,
+    WORKSPACE_COOKIE,
+    WORKSPACE_HEADER,
+    Workspace,
+    WorkspaceRegistry,
+    InvalidWorkspace,
+)
+from sql_database import ensure_sql_database, create_sql_database_agent, run_query, list_tables, DatasetNotFound
+from telemetry import observe, set_gauge, clear, render_metrics
+from result_encoding import (
+    encode_body,
+    summarize_analysis,
+    issue_page,
+    files_version,
+    encode_cursor,
+    decode_cursor,
+    InvalidCursor,
+    RESULT_PAGE_SIZE,
+)
+import sqlite3
+import asyncio
+import json
 import tempfile
+import time
+import uuid
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 256))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH")
+
+def load_cached_agent(workspace):
+    # Returns (agent, data version, estimated memory); the catalog memory-maps
+    # the merged store, which is about the size of the CSV files.
+    agent = create_merged_csv_agent(csv_folder=workspace.folder)
+    manifest = read_manifest(workspace.folder)
+    memory_bytes = sum(entry["size"] for entry in manifest.get("groups", {}).values()) if agent else 0
+    return agent, data_version(manifest), memory_bytes
+
+async def warm_up_agent(workspace):
+    # Builds the cached agent in a worker thread; requests are served meanwhile
+    # and /health reports progress.
+    status = workspace.agent_status
+    start = time.perf_counter()
+    try:
+        agent, version, memory_bytes = await asyncio.to_thread(load_cached_agent, workspace)
+        workspace.cached_agent, workspace.data_version = agent, version
+        app.state.workspaces.agent_loaded(workspace, memory_bytes)
+        status["state"] = "ready" if workspace.cached_agent is not None else "empty"
+    except Exception as e:
+        status.update(state="failed", error=str(e))
+    status["seconds"] = round(time.perf_counter() - start, 3)
+
+def start_agent_warmup(workspace):
+    task = workspace.warmup_task
+    if task is None or task.done():
+        workspace.agent_status.update(state="warming", error=None, seconds=None)
+        workspace.warmup_task = asyncio.create_task(warm_up_agent(workspace))
+    return workspace.warmup_task
+
+def agent_ready(workspace):
+    # A refresh keeps serving the previous agent, so the workspace stays ready.
+    return workspace.cached_agent is not None or workspace.agent_status["state"] in ("ready", "empty")
+
+def load_sql_agent(workspace):
+    # The SQL agent is rebuilt only when the dataset's SQLite database changes.
+    _, fingerprint = ensure_sql_database(workspace.folder)
+    if workspace.sql_agent_version != fingerprint:
+        workspace.sql_agent = create_sql_database_agent(workspace.folder, get_chat_model(AGENT_MODEL_ID))
+        workspace.sql_agent_version = fingerprint
+    return workspace.sql_agent, fingerprint
+
+def data_changed(workspace):
+    # The cached agent keeps answering from its own snapshot until /refresh-agent/,
+    # but answers cached before a change must not outlive it.
+    workspace.data_changed()
+
+async def get_workspace(request: Request):
+    # The workspace named by the X-Workspace-Id header or the workspace_id
+    # cookie; requests naming none share the default workspace. Agents of
+    # workspaces that were evicted or never loaded are warmed in the background.
+    workspace_id = request.headers.get(WORKSPACE_HEADER) or request.cookies.get(WORKSPACE_COOKIE)
+    workspace = request.app.state.workspaces.get(workspace_id)
+    if workspace.agent_status["state"] == "cold":
+        start_agent_warmup(workspace)
+    return workspace
 
-CSV_FOLDER = r"D:\PROJECTS\DataVerse Hub\Project Code\backend\Industry-Sub_domain Data"
-MERGED_FILE_NAME = "__merged_all_data.csv"
-MERGED_FILE_PATH = os.path.join(CSV_FOLDER, MERGED_FILE_NAME)
+def encoded_response(request, content, status_code=200):
+    # orjson-encoded body, zstd/gzip-compressed when the client accepts it.
+    body, encoding = encode_body(content, request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def sse_generation_stream(events, workspace):
+    try:
+        async for event, data in events:
+            yield sse_event(event, data)
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+    finally:
+        data_changed(workspace)
+
+# Long-running operations, shared by the endpoints and their background jobs;
+# `job`, when given, receives progress and partial results.
+
+async def run_generate_ideal(workspace, industry, subdomain, parallel, tables, rows_per_table, job=None):
+    try:
+        if parallel:
+            sql_output, report = await generate_ideal_sql_parallel(industry, subdomain, workspace.folder, tables,
+                                                                   rows_per_table, job.report if job else None)
+            return {"sql": sql_output, "tables": report}
+        sql_output = await generate_ideal_sql_for_industry_subdomain(industry, subdomain, workspace.folder)
+        return {"sql": sql_output}
+    finally:
+        data_changed(workspace)
+
+async def run_generate_with_errors(workspace, industry, subdomain, parallel, tables, rows_per_table, error_mode,
+                                   error_seed, job=None):
+    on_progress = job.report if job else None
+    try:
+        if error_mode == "local":
+            sql_output, injected, report = await generate_sql_with_local_errors(
+                industry, subdomain, workspace.folder, parallel, tables, rows_per_table, seed=error_seed,
+                on_progress=on_progress)
+            result = {"sql": sql_output, "injected_errors": injected}
+            if report is not None:
+                result["tables"] = report
+            return result
+        if parallel:
+            sql_output, report = await generate_sql_with_errors_parallel(industry, subdomain, workspace.folder,
+                                                                         tables, rows_per_table, on_progress)
+            return {"sql": sql_output, "tables": report}
+        sql_output = await generate_sql_for_industry_subdomain(industry, subdomain, workspace.folder)
+        return {"sql": sql_output}
+    finally:
+        data_changed(workspace)
+
+async def run_expand_data(workspace, rows_per_table, seed, job=None):
+    try:
+        report = await asyncio.to_thread(expand_dataset, workspace.folder, rows_per_table, seed=seed)
+    finally:
+        data_changed(workspace)
+    return {"tables": report}
+
+async def run_modify_batch(workspace, instructions, suffix, job=None):
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=suffix, encoding="utf-8", newline="") as tmp:
+        tmp.write(instructions)
+        temp_path = tmp.name
+    completed = 0
+
+    def on_result(result):
+        nonlocal completed
+        completed += 1
+        job.report({"completed": completed}, partial=result)
+
+    try:
+        return await process_instruction_file(temp_path, workspace.folder, on_result=on_result if job else None)
+    finally:
+        os.remove(temp_path)
+        data_changed(workspace)
+
+async def run_reduce_files(workspace, n_keep, use_llm, job=None):
+    try:
+        result = await reduce_files(workspace.folder, n_keep, use_llm=use_llm)
+    finally:
+        data_changed(workspace)
+    if not result or "error" in result:
+        return {"error": "No result returned from reduce_files."}
+    return result
+
+JOB_RUNNERS = {
+    "generate-ideal-data": run_generate_ideal,
+    "generate-data-with-realistic-errors": run_generate_with_errors,
+    "expand-data": run_expand_data,
+    "modify-data-batch": run_modify_batch,
+    "reduce-files": run_reduce_files,
+}
+
+def job_handler(run):
+    async def handler(job, params):
+        # Cancelling only interrupts the awaits; work already handed to a
+        # thread runs on, but its dataset commits are refused.
+        with cancellable_commits(job.cancel_requested):
+            return await run(app.state.workspaces.get(job.workspace), job=job, **params)
+    return handler
+
+def submit_job(kind, workspace, params):
+    # 202 with the job id; the job's result has the endpoint's usual response shape.
+    try:
+        job = app.state.jobs.submit(kind, workspace.id, params)
+    except QueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status,
+                                                  "status_url": f"/jobs/{job.id}",
+                                                  "events_url": f"/jobs/{job.id}/events"})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: cache agent
-    app.state.cached_agent = create_merged_csv_agent()
+    # Startup: the cached agent is built in the background so the server
+    # accepts requests immediately, whatever the dataset size.
+    app.state.answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_PATH)
+    app.state.workspaces = WorkspaceRegistry(WORKSPACES_DIR, CSV_FOLDER)
+    app.state.jobs = JobQueue(JOBS_DB_PATH or os.path.join(WORKSPACES_DIR, "jobs.sqlite"))
+    for kind, run in JOB_RUNNERS.items():
+        app.state.jobs.register(kind, job_handler(run))
+    await app.state.jobs.start()
+    start_agent_warmup(app.state.workspaces.get())
     yield
-    # Shutdown: (nothing needed, but you could clean up here)
+    await app.state.jobs.close()
+    app.state.workspaces.close()
+    # Shutdown: release pooled LLM connections
+    await close_http_clients()
 
 app = FastAPI(lifespan=lifespan)
 
+@app.exception_handler(InvalidWorkspace)
+async def invalid_workspace(request, exc):
+    return JSONResponse(status_code=400, content={"error": str(exc)})
+
 @app.get("/", include_in_schema=False)
 def redirect_to_docs():
     return RedirectResponse(url="/docs")
@@ -39,91 +269,389 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request, call_next):
+    # Streaming responses are timed until their headers are sent.
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        observe("dataverse_http_request_duration_seconds", time.perf_counter() - start,
+                method=request.method, route=getattr(route, "path", "unmatched"), status=status)
+
+def update_dataset_gauges(manifest):
+    groups = manifest.get("groups", {})
+    clear("dataverse_dataset_rows")
+    for fname, entry in groups.items():
+        set_gauge("dataverse_dataset_rows", entry["num_rows"], file=fname)
+    set_gauge("dataverse_dataset_files", len(groups))
+    set_gauge("dataverse_dataset_bytes", sum(entry["size"] for entry in groups.values()))
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(workspace: Workspace = Depends(get_workspace)):
+    update_dataset_gauges(read_manifest(workspace.folder))
+    stats = app.state.workspaces.stats()
+    set_gauge("dataverse_workspaces_resident", stats["resident"])
+    set_gauge("dataverse_workspaces_memory_bytes", round(stats["memory_mb"] * 2 ** 20))
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+def health(workspace: Workspace = Depends(get_workspace)):
+    # Liveness plus the workspace agent's warmup state.
+    return {"status": "ok", "workspace": workspace.id, "ready": agent_ready(workspace),
+            "agent": workspace.agent_status}
+
+@app.get("/health/ready")
+def readiness(workspace: Workspace = Depends(get_workspace)):
+    if not agent_ready(workspace):
+        return JSONResponse(status_code=503, content={"ready": False, "agent": workspace.agent_status},
+                            headers={"Retry-After": "5"})
+    return {"ready": True, "agent": workspace.agent_status}
+
+@app.post("/workspaces/")
+def create_workspace():
+    # A fresh, empty workspace; the id is also set as the workspace_id cookie.
+    workspace = app.state.workspaces.get(uuid.uuid4().hex)
+    response = JSONResponse(content={"workspace_id": workspace.id})
+    response.set_cookie(WORKSPACE_COOKIE, workspace.id, httponly=True, samesite="lax")
+    return response
+
+@app.get("/workspaces/stats")
+def workspace_stats():
+    return app.state.workspaces.stats()
+
 @app.post("/refresh-agent/")
-def refresh_agent():
-    app.state.cached_agent = create_merged_csv_agent()
+async def refresh_agent(workspace: Workspace = Depends(get_workspace)):
+    task = workspace.warmup_task
+    if task is not None and not task.done():
+        await asyncio.shield(task)
+    await asyncio.shield(start_agent_warmup(workspace))
+    data_changed(workspace)
+    if workspace.agent_status["state"] == "failed":
+        return JSONResponse(status_code=500, content={"error": workspace.agent_status["error"]})
     return {"status": "Agent and data refreshed"}
 
 @app.post("/generate-ideal-data/")
-def generate_ideal_sql(
+async def generate_ideal_sql(
     industry: str = Form(...),
-    subdomain: str = Form(...)
+    subdomain: str = Form(...),
+    parallel: bool = Form(False),
+    tables: int = Form(7),
+    rows_per_table: int = Form(7),
+    background: bool = Form(False),
+    workspace: Workspace = Depends(get_workspace)
 ):
+    params = {"industry": industry, "subdomain": subdomain, "parallel": parallel, "tables": tables,
+              "rows_per_table": rows_per_table}
+    if background:
+        return submit_job("generate-ideal-data", workspace, params)
     try:
-        sql_output = generate_ideal_sql_for_industry_subdomain(industry, subdomain, CSV_FOLDER)
-        return {"sql": sql_output}
+        return await run_generate_ideal(workspace, **params)
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
-    
+
 @app.post("/generate-data-with-realistic-errors/")
-def generate_sql(
+async def generate_sql(
     industry: str = Form(...),
-    subdomain: str = Form(...)
+    subdomain: str = Form(...),
+    parallel: bool = Form(False),
+    tables: int = Form(7),
+    rows_per_table: int = Form(7),
+    error_mode: str = Form("llm"),
+    error_seed: int = Form(0),
+    background: bool = Form(False),
+    workspace: Workspace = Depends(get_workspace)
 ):
+    if error_mode not in ("llm", "local"):
+        return JSONResponse(status_code=400, content={"error": "error_mode must be 'llm' or 'local'."})
+    params = {"industry": industry, "subdomain": subdomain, "parallel": parallel, "tables": tables,
+              "rows_per_table": rows_per_table, "error_mode": error_mode, "error_seed": error_seed}
+    if background:
+        return submit_job("generate-data-with-realistic-errors", workspace, params)
     try:
-        sql_output = generate_sql_for_industry_subdomain(industry, subdomain, CSV_FOLDER)
-        return {"sql": sql_output}
+        return await run_generate_with_errors(workspace, **params)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+@app.post("/generate-ideal-data/stream")
+async def generate_ideal_sql_stream(
+    industry: str = Form(...),
+    subdomain: str = Form(...),
+    parallel: bool = Form(False),
+    tables: int = Form(7),
+    rows_per_table: int = Form(7),
+    workspace: Workspace = Depends(get_workspace)
+):
+    if parallel:
+        # Progress events ("schema", then "table" per table) instead of SQL tokens.
+        events = stream_ideal_sql_parallel(industry, subdomain, workspace.folder, tables, rows_per_table)
+    else:
+        events = stream_ideal_sql_for_industry_subdomain(industry, subdomain, workspace.folder)
+    return StreamingResponse(sse_generation_stream(events, workspace), media_type="text/event-stream")
+
+@app.post("/generate-data-with-realistic-errors/stream")
+async def generate_sql_stream(
+    industry: str = Form(...),
+    subdomain: str = Form(...),
+    parallel: bool = Form(False),
+    tables: int = Form(7),
+    rows_per_table: int = Form(7),
+    workspace: Workspace = Depends(get_workspace)
+):
+    if parallel:
+        # Progress events ("schema", then "table" per table) instead of SQL tokens.
+        events = stream_sql_with_errors_parallel(industry, subdomain, workspace.folder, tables, rows_per_table)
+    else:
+        events = stream_sql_for_industry_subdomain(industry, subdomain, workspace.folder)
+    return StreamingResponse(sse_generation_stream(events, workspace), media_type="text/event-stream")
+
+@app.post("/expand-data/")
+async def expand_data(
+    rows_per_table: int = Form(...),
+    seed: int = Form(0),
+    background: bool = Form(False),
+    workspace: Workspace = Depends(get_workspace)
+):
+    # Scales the current tables to rows_per_table synthetic rows each, in place.
+    params = {"rows_per_table": rows_per_table, "seed": seed}
+    if background:
+        return submit_job("expand-data", workspace, params)
+    try:
+        return await run_expand_data(workspace, **params)
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
 
 @app.get("/get-original-sql-contents/", response_class=PlainTextResponse)
-def get_sql_contents():
-    # List all files in the CSV_FOLDER directory
-    sql_files = [f for f in os.listdir(CSV_FOLDER) if f.lower().endswith('.sql')]
+def get_sql_contents(workspace: Workspace = Depends(get_workspace)):
+    # List all files in the workspace's folder
+    sql_files = [f for f in os.listdir(workspace.folder) if f.lower().endswith('.sql')]
     if not sql_files:
         return "No SQL file found in the directory."
     if len(sql_files) > 1:
         return "Multiple SQL files found. Please ensure only one SQL file is present."
-    sql_file_path = os.path.join(CSV_FOLDER, sql_files[0])
+    sql_file_path = os.path.join(workspace.folder, sql_files[0])
     with open(sql_file_path, "r", encoding="utf-8") as f:
         contents = f.read()
     return contents
 
 @app.get("/errors-analysis/")
-def analyze_errors():
-    return {"results": analyze_all_csv_files(CSV_FOLDER)}
+def analyze_errors(request: Request, view: str = "summary", workspace: Workspace = Depends(get_workspace)):
+    # The summary has per-column counts and a few examples; view=full returns
+    # every outlier and suspicious value as before.
+    analyses = analyze_all_csv_files(workspace.folder)
+    if view == "full":
+        return encoded_response(request, {"results": analyses})
+    version = files_version(workspace.folder, [a["file_name"] for a in analyses])
+    return encoded_response(request, {"results": [summarize_analysis(a) for a in analyses], "data_version": version})
+
+@app.get("/errors-analysis/details")
+def analyze_errors_details(request: Request, file: str = None, column: str = None, kind: str = None,
+                           cursor: str = None, limit: int = RESULT_PAGE_SIZE,
+                           workspace: Workspace = Depends(get_workspace)):
+    analyses = analyze_all_csv_files(workspace.folder)
+    version = files_version(workspace.folder, [a["file_name"] for a in analyses])
+    try:
+        return encoded_response(request, issue_page(analyses, version, file, column, kind, cursor, limit))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+@app.get("/schema-catalog/")
+async def schema_catalog(workspace: Workspace = Depends(get_workspace)):
+    try:
+        catalog = await asyncio.to_thread(load_schema_catalog, workspace.folder)
+        return catalog.describe()
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/missing-values/")
-def missing_values():
+def missing_values(request: Request, prefix: str = None, column: str = None,
+                   workspace: Workspace = Depends(get_workspace)):
     try:
-        result = get_missing_values_by_prefix(MERGED_FILE_PATH)
-        return result
+        result = get_missing_values_by_prefix(workspace.folder)
+        if prefix:
+            result = {p: counts for p, counts in result.items() if p == prefix}
+        if column:
+            result = {p: {c: n for c, n in counts.items() if c in (column, f"{p}__{column}")}
+                      for p, counts in result.items()}
+            result = {p: counts for p, counts in result.items() if counts}
+        return encoded_response(request, result)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/missing-values/rows/")
+def missing_value_rows(request: Request, prefix: str, column: str, offset: int = 0, limit: int = 100,
+                       cursor: str = None, workspace: Workspace = Depends(get_workspace)):
+    # Pass next_cursor back as cursor to page on; offset is kept for older clients.
+    try:
+        version = files_version(workspace.folder, [f"{prefix}.csv"])
+        if cursor:
+            offset = decode_cursor(cursor, version)
+        result = get_null_rows(workspace.folder, prefix, column, offset, limit)
+        next_offset = offset + len(result["rows"])
+        result["next_cursor"] = encode_cursor(next_offset, version) if next_offset < result["total"] else None
+        return encoded_response(request, result)
+    except InvalidCursor as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except KeyError as e:
+        return JSONResponse(status_code=404, content={"error": str(e.args[0])})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/modify-data-interactive/")
-def modify_data_interactive(
+async def modify_data_interactive(
     filename: str = Form(...),
-    instruction: str = Form(...)
+    instruction: str = Form(...),
+    workspace: Workspace = Depends(get_workspace)
 ):
-    return modify_csv_file(CSV_FOLDER, filename, instruction)
+    result = await modify_csv_file(workspace.folder, filename, instruction)
+    data_changed(workspace)
+    return result
 
 @app.post("/modify-data-batch/")
 async def modify_data_batch(
-    instruction_file: UploadFile = File(...)
+    instruction_file: UploadFile = File(...),
+    background: bool = Form(False),
+    workspace: Workspace = Depends(get_workspace)
+):
+    filename = instruction_file.filename or "uploaded_file.txt"
+    params = {"instructions": (await instruction_file.read()).decode("utf-8", errors="replace"),
+              "suffix": os.path.splitext(filename)[-1]}
+    if background:
+        return submit_job("modify-data-batch", workspace, params)
+    return await run_modify_batch(workspace, **params)
+
+@app.post("/modify-data-batch/stream")
+async def modify_data_batch_stream(
+    instruction_file: UploadFile = File(...),
+    workspace: Workspace = Depends(get_workspace)
 ):
     filename = instruction_file.filename or "uploaded_file.txt"
     with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[-1]) as tmp:
         tmp.write(await instruction_file.read())
         temp_path = tmp.name
-    result = process_instruction_file(temp_path, CSV_FOLDER)
-    os.remove(temp_path)
-    return result
+
+    async def results():
+        try:
+            async for result in iter_instruction_results(temp_path, workspace.folder):
+                yield json.dumps(result, default=str) + "\n"
+        finally:
+            os.remove(temp_path)
+            data_changed(workspace)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 @app.post("/reduce-files/")
-def reduce_files_endpoint(n_keep: int = Form(...)):
-    result = reduce_files(CSV_FOLDER, n_keep)
-    if not result or "error" in result:
-        return {"error": "No result returned from reduce_files."}
-    return result
+async def reduce_files_endpoint(n_keep: int = Form(...), use_llm: bool = Form(False), background: bool = Form(False),
+                                workspace: Workspace = Depends(get_workspace)):
+    params = {"n_keep": n_keep, "use_llm": use_llm}
+    if background:
+        return submit_job("reduce-files", workspace, params)
+    return await run_reduce_files(workspace, **params)
 
 @app.post("/ask-csv-question/")
-def ask_csv_question(question: str = Form(...)):
-    cached_agent = app.state.cached_agent
+async def ask_csv_question(question: str = Form(...), workspace: Workspace = Depends(get_workspace)):
+    cached_agent = workspace.cached_agent
     if cached_agent is None:
+        if workspace.agent_status["state"] == "warming":
+            return JSONResponse(status_code=503, content={"error": "Agent is warming up, try again shortly."},
+                                headers={"Retry-After": "5"})
         return {"error": "Agent not initialized."}
+    answer_cache = app.state.answer_cache
+    version = workspace.data_version
+    cache_version = workspace.answer_scope(version)
+    cached = answer_cache.get(question, AGENT_MODEL_ID, cache_version)
+    if cached is not None:
+        return cached
+    try:
+        result = await run_llm(
+            AGENT_MODEL_ID,
+            lambda: cached_agent.ainvoke({"input": question}, config=agent_config(), handle_parsing_errors=True),
+            key=("ask", workspace.id, version, normalize_question(question)),
+        )
+        answer_cache.put(question, AGENT_MODEL_ID, cache_version, result)
+        return result
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.post("/ask-sql-question/")
+async def ask_sql_question(question: str = Form(...), workspace: Workspace = Depends(get_workspace)):
+    try:
+        sql_agent, version = await asyncio.to_thread(load_sql_agent, workspace)
+    except DatasetNotFound as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    app.state.workspaces.agent_loaded(workspace, workspace.memory_bytes)
+    answer_cache = app.state.answer_cache
+    cache_version = workspace.answer_scope(f"sql:{version}")
+    cached = answer_cache.get(question, AGENT_MODEL_ID, cache_version)
+    if cached is not None:
+        return cached
     try:
-        result = cached_agent.invoke({"input": question}, handle_parsing_errors=True)
+        result = await run_llm(
+            AGENT_MODEL_ID,
+            lambda: sql_agent.ainvoke({"input": question}, config=agent_config(), handle_parsing_errors=True),
+            key=("ask-sql", workspace.id, version, normalize_question(question)),
+        )
+        answer_cache.put(question, AGENT_MODEL_ID, cache_version, result)
         return result
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.post("/sql-query/")
+async def sql_query(query: str = Form(...), workspace: Workspace = Depends(get_workspace)):
+    try:
+        return await asyncio.to_thread(run_query, workspace.folder, query)
+    except DatasetNotFound as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except sqlite3.Error as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+@app.get("/sql-tables/")
+async def sql_tables(workspace: Workspace = Depends(get_workspace)):
+    try:
+        return await asyncio.to_thread(list_tables, workspace.folder)
+    except DatasetNotFound as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+
+@app.get("/dataset-version/")
+def dataset_version(workspace: Workspace = Depends(get_workspace)):
+    # Latest committed version and the snapshots readers currently pin.
+    return get_dataset(workspace.folder).status()
+
+@app.get("/jobs/")
+def list_jobs(workspace: Workspace = Depends(get_workspace)):
+    return {"jobs": app.state.jobs.list(workspace.id)}
+
+@app.get("/jobs/{job_id}")
+def job_status(request: Request, job_id: str, workspace: Workspace = Depends(get_workspace)):
+    job = app.state.jobs.get(job_id, workspace.id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found."})
+    return encoded_response(request, job.describe())
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, workspace: Workspace = Depends(get_workspace)):
+    # One "status" event per change until the job finishes; comments keep idle
+    # connections open.
+    if app.state.jobs.get(job_id, workspace.id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found."})
+
+    async def events():
+        async for state in app.state.jobs.watch(job_id, workspace.id):
+            yield sse_event("status", state) if state is not None else ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, workspace: Workspace = Depends(get_workspace)):
+    job = app.state.jobs.cancel(job_id, workspace.id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found."})
+    return {"job_id": job.id, "status": job.status if job.status in FINISHED_STATES else "cancelling"}
+
+@app.get("/answer-cache/stats")
+def answer_cache_stats():
+    return app.state.answer_cache.stats()
@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+import pyarrow as pa
+from telemetry import traced, inc
+from dataset_versions import pin_snapshot
+
+STORE_DIR_NAME = ".merged_store"
+MANIFEST_NAME = "manifest.json"
+MERGED_FILE_NAME = "__merged_all_data.csv"
+
+# One refresh at a time per dataset folder; different workspaces refresh concurrently.
+_refresh_locks = {}
+_refresh_locks_guard = threading.Lock()
+
+
+def _store_dir(csv_folder):
+    return os.path.join(csv_folder, STORE_DIR_NAME)
+
+
+def _refresh_lock(csv_folder):
+    key = os.path.abspath(csv_folder)
+    with _refresh_locks_guard:
+        lock = _refresh_locks.get(key)
+        if lock is None:
+            lock = _refresh_locks[key] = threading.Lock()
+        return lock
+
+
+def _source_files(csv_folder):
+    return sorted(f for f in os.listdir(csv_folder)
+                  if f.lower().endswith('.csv') and f != MERGED_FILE_NAME
+                  and os.path.isfile(os.path.join(csv_folder, f)))
+
+
+def read_manifest(csv_folder):
+    try:
+        with open(os.path.join(_store_dir(csv_folder), MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"version": 0, "groups": {}}
+
+
+def _write_manifest(csv_folder, manifest):
+    path = os.path.join(_store_dir(csv_folder), MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _write_group(df, path):
+    # Uncompressed Arrow IPC so readers can memory-map the columns without copying.
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def build_group(csv_folder, fname, df=None, source_folder=None):
+    # source_folder is where the CSV is read from, e.g. a pinned snapshot.
+    path = os.path.join(source_folder or csv_folder, fname)
+    st = os.stat(path)
+    if df is None:
+        df = pd.read_csv(path)
+    prefix = os.path.splitext(fname)[0]
+    prefixed = df.add_prefix(f"{prefix}__")
+    group_file = f"{prefix}.arrow"
+    _write_group(prefixed, os.path.join(_store_dir(csv_folder), group_file))
+    return {
+        "prefix": prefix,
+        "group_file": group_file,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "columns": list(prefixed.columns),
+        "num_rows": int(len(df)),
+    }, df
+
+
+@traced("merged_store_refresh")
+def refresh_merged_store(csv_folder, on_group_built=None):
+    # Rebuilds only the column groups whose source CSV changed since the last
+    # refresh and drops groups whose source was removed. Sources are read from
+    # one pinned dataset version, so the store never mixes two versions.
+    with _refresh_lock(csv_folder), pin_snapshot(csv_folder) as snapshot:
+        os.makedirs(_store_dir(csv_folder), exist_ok=True)
+        manifest = read_manifest(csv_folder)
+        groups = manifest.get("groups", {})
+        current = _source_files(snapshot.folder)
+        failed = {f: e for f, e in manifest.get("failed", {}).items() if f in current}
+        changed = False
+        for fname in list(groups):
+            if fname not in current:
+                entry = groups.pop(fname)
+                try:
+                    os.remove(os.path.join(_store_dir(csv_folder), entry["group_file"]))
+                except OSError:
+                    pass
+                changed = True
+        for fname in current:
+            st = os.stat(snapshot.path(fname))
+            entry = groups.get(fname)
+            if (entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+                    and os.path.exists(os.path.join(_store_dir(csv_folder), entry["group_file"]))):
+                continue
+            try:
+                groups[fname], df = build_group(csv_folder, fname, source_folder=snapshot.folder)
+            except Exception as e:
+                # Keep serving the last good group, if any; its old size/mtime
+                # makes the next refresh retry the build.
+                print(f"Warning: could not build merged store group for {fname}: {e}")
+                inc("dataverse_merged_store_build_failures_total")
+                failed[fname] = str(e)
+                if entry and not os.path.exists(os.path.join(_store_dir(csv_folder), entry["group_file"])):
+                    groups.pop(fname, None)
+                continue
+            failed.pop(fname, None)
+            if on_group_built is not None:
+                on_group_built(fname, df, snapshot.folder)
+            changed = True
+        if changed or "version" not in manifest:
+            manifest["version"] = manifest.get("version", 0) + 1
+        manifest["groups"] = groups
+        manifest["failed"] = failed
+        manifest["dataset_version"] = snapshot.version
+        _write_manifest(csv_folder, manifest)
+        return manifest
+
+
+def load_group_tables(csv_folder, manifest=None, columns=None):
+    # Memory-mapped Arrow tables keyed by source file name; no data is copied.
+    manifest = manifest or read_manifest(csv_folder)
+    tables = {}
+    for fname, entry in manifest.get("groups", {}).items():
+        source = pa.memory_map(os.path.join(_store_dir(csv_folder), entry["group_file"]), "r")
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select([c for c in table.column_names if c in columns])
+        tables[fname] = table
+    return tables
+
+
+def load_merged_dataframe(csv_folder, manifest=None, columns=None):
+    tables = load_group_tables(csv_folder, manifest, columns)
+    frames = [table.to_pandas() for table in tables.values() if table.num_columns]
+    if not frames:
+        return None
+    return pd.concat(frames, axis=1)
+
+
+def data_version(manifest):
+    # Changes whenever any column group is rebuilt, added or dropped.
+    digest = hashlib.blake2b(digest_size=12)
+    for fname, entry in sorted(manifest.get("groups", {}).items()):
+        digest.update(f"{fname}\x1f{entry['size']}\x1f{entry['mtime_ns']}\x1e".encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,142 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from merged_store import STORE_DIR_NAME, MERGED_FILE_NAME
+from dataset_versions import pin_snapshot
+
+INDEX_FILE_NAME = "null_index.json"
+
+_lock = threading.Lock()
+# csv_folder -> loaded index, so requests never touch the index file once warm
+_indexes = {}
+
+
+def _index_dir(csv_folder):
+    return os.path.join(csv_folder, STORE_DIR_NAME)
+
+
+def _bitmap_path(csv_folder, prefix):
+    return os.path.join(_index_dir(csv_folder), f"{prefix}.nulls.npy")
+
+
+def _load_index(csv_folder):
+    index = _indexes.get(csv_folder)
+    if index is None:
+        try:
+            with open(os.path.join(_index_dir(csv_folder), INDEX_FILE_NAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        _indexes[csv_folder] = index
+    return index
+
+
+def _save_index(csv_folder, index):
+    os.makedirs(_index_dir(csv_folder), exist_ok=True)
+    path = os.path.join(_index_dir(csv_folder), INDEX_FILE_NAME)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _save_bitmap(csv_folder, prefix, nulls):
+    path = _bitmap_path(csv_folder, prefix)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.packbits(nulls, axis=0))
+    os.replace(tmp_path, path)
+
+
+def _build_entry(csv_folder, fname, df, source_folder=None):
+    # The size and mtime recorded are those of the file the frame came from.
+    st = os.stat(os.path.join(source_folder or csv_folder, fname))
+    prefix = os.path.splitext(fname)[0]
+    nulls = df.isnull().to_numpy()
+    os.makedirs(_index_dir(csv_folder), exist_ok=True)
+    _save_bitmap(csv_folder, prefix, nulls)
+    counts = nulls.sum(axis=0)
+    return {
+        "prefix": prefix,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "num_rows": int(len(df)),
+        "columns": [str(c) for c in df.columns],
+        "null_counts": {f"{prefix}__{c}": int(n) for c, n in zip(df.columns, counts)},
+    }
+
+
+def update_null_index(csv_folder, fname, df=None, source_folder=None):
+    # Called with the frame that was just loaded or written, so no re-read is
+    # needed; source_folder is where it was read from, e.g. a pinned snapshot.
+    if df is None:
+        df = pd.read_csv(os.path.join(source_folder or csv_folder, fname))
+    entry = _build_entry(csv_folder, fname, df, source_folder)
+    with _lock:
+        index = _load_index(csv_folder)
+        index[fname] = entry
+        _save_index(csv_folder, index)
+
+
+def remove_from_null_index(csv_folder, fname):
+    with _lock:
+        index = _load_index(csv_folder)
+        entry = index.pop(fname, None)
+        if entry is None:
+            return
+        _save_index(csv_folder, index)
+    try:
+        os.remove(_bitmap_path(csv_folder, entry["prefix"]))
+    except OSError:
+        pass
+
+
+def sync_null_index(csv_folder):
+    # Only stats the folder; files whose size or mtime changed behind the
+    # index's back are re-indexed from a pinned snapshot, removed files are
+    # dropped.
+    with pin_snapshot(csv_folder) as snapshot:
+        current = {f for f in snapshot.files if f.lower().endswith('.csv') and f != MERGED_FILE_NAME}
+        with _lock:
+            index = dict(_load_index(csv_folder))
+        for fname in set(index) - current:
+            remove_from_null_index(csv_folder, fname)
+        for fname in current:
+            st = os.stat(snapshot.path(fname))
+            entry = index.get(fname)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                continue
+            try:
+                update_null_index(csv_folder, fname, source_folder=snapshot.folder)
+            except Exception:
+                pass
+
+
+def get_null_counts(csv_folder):
+    with _lock:
+        index = _load_index(csv_folder)
+        return {entry["prefix"]: dict(entry["null_counts"]) for entry in index.values()}
+
+
+def get_null_rows(csv_folder, prefix, column, offset=0, limit=100):
+    with _lock:
+        index = _load_index(csv_folder)
+        entry = next((e for e in index.values() if e["prefix"] == prefix), None)
+    if entry is None:
+        raise KeyError(f"No data file with prefix '{prefix}'.")
+    name = column.split('__', 1)[1] if column.startswith(f"{prefix}__") else column
+    if name not in entry["columns"]:
+        raise KeyError(f"Column '{column}' not found in '{prefix}'.")
+    col_idx = entry["columns"].index(name)
+    bitmap = np.load(_bitmap_path(csv_folder, prefix), mmap_mode="r")
+    nulls = np.unpackbits(bitmap[:, col_idx], count=entry["num_rows"]).astype(bool)
+    rows = np.flatnonzero(nulls)
+    return {
+        "prefix": prefix,
+        "column": f"{prefix}__{name}",
+        "total": int(len(rows)),
+        "offset": offset,
+        "rows": rows[offset:offset + limit].tolist(),
+    }
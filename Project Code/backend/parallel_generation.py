@@ -0,0 +1,204 @@
+import os
+import asyncio
+from llm_runtime import get_chat_model, run_llm
+from sql_stream import StatementSplitter
+from sql_tokenizer import tokenize, parse_table_schema, parse_insert, align_rows
+from schema_catalog import dependency_order
+from telemetry import traced
+
+GENERATION_MAX_PARALLEL_TABLES = int(os.getenv("GENERATION_MAX_PARALLEL_TABLES", 4))
+GENERATION_TABLE_RETRIES = int(os.getenv("GENERATION_TABLE_RETRIES", 2))
+# Parent key values passed to a child table's prompt, per foreign key.
+MAX_PARENT_KEY_VALUES = 50
+
+SCHEMA_PROMPT_TEMPLATE = """
+    You are an expert SQL database designer.
+
+    {question}
+
+    Generate ONLY the schema: {tables} well-structured CREATE TABLE statements with PRIMARY KEY
+    constraints and FOREIGN KEY ... REFERENCES constraints between related tables.
+
+    Strict formatting rules:
+    - DO NOT generate INSERT statements.
+    - DO NOT use markdown formatting (no triple backticks).
+    - DO NOT include explanations or prefaces like “Here is”.
+    - ONLY return the SQL.
+    """
+
+ROWS_PROMPT_TEMPLATE = """
+    You are an expert SQL data generator.
+
+    {question}
+
+    The table is defined as:
+    {create_statement}
+    {parent_keys}
+    Generate {rows} rows for the table {table} as INSERT INTO {table} (...) VALUES (...), (...); statements.
+    All values must look realistic and relevant to the industry and sub-domain.
+    {row_rules}
+    Strict formatting rules:
+    - ONLY generate INSERT INTO {table} statements, nothing for other tables.
+    - DO NOT use markdown formatting (no triple backticks).
+    - DO NOT include explanations or prefaces like “Here is”.
+    - ONLY return the SQL.
+    """
+
+
+def _statements(text):
+    text = text.replace("```sql", "").replace("```", "")
+    splitter = StatementSplitter()
+    statements = splitter.feed(text) + splitter.flush()
+    return [s.rstrip(";").strip() + ";" for s in statements if s.rstrip(";").strip()]
+
+
+async def _complete(llm, model_id, prompt_text, key=None, retries=None):
+    response = await run_llm(model_id, lambda: llm.ainvoke(prompt_text), key=key, retries=retries)
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def _parent_keys_text(schema, produced):
+    lines = []
+    for columns, parent, ref_columns in schema["foreign_keys"]:
+        parent_columns, rows = produced.get(parent.lower(), (None, None))
+        if not rows or len(columns) != 1:
+            continue
+        lowered = [c.lower() for c in parent_columns]
+        ref = (ref_columns[0] if ref_columns else parent_columns[0]).lower()
+        if ref not in lowered:
+            continue
+        index = lowered.index(ref)
+        values = []
+        for row in rows:
+            if index < len(row) and row[index] is not None and row[index] not in values:
+                values.append(row[index])
+            if len(values) >= MAX_PARENT_KEY_VALUES:
+                break
+        lines.append(f"    The column {columns[0]} must only use these existing {parent}.{ref} values: "
+                     f"{', '.join(str(v) for v in values)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _table_inserts(text, table, schema):
+    # Rows come back in the schema's column order, whatever order each
+    # INSERT listed its columns in.
+    columns = [name for name, _ in schema["columns"]]
+    known_columns = {table: columns}
+    statements, rows = [], []
+    for statement in _statements(text):
+        parsed = parse_insert(list(tokenize(statement)), known_columns)
+        if parsed and parsed[0].lower() == table:
+            statements.append(statement)
+            rows.extend(align_rows(parsed[1], columns, parsed[2]))
+    return statements, columns, rows
+
+
+@traced("parallel_generation")
+async def generate_tables_parallel(question, model_id, row_rules="", tables=7, rows_per_table=7,
+                                   max_parallel=None, retries=None, on_progress=None, cache_key=None):
+    # Phase one asks for the schema only; phase two generates each table's rows
+    # in its own call, parents before children so child prompts can reuse the
+    # parent keys already produced. Independent tables run concurrently, so the
+    # wall time follows the longest foreign-key chain rather than the table count.
+    max_parallel = max_parallel or GENERATION_MAX_PARALLEL_TABLES
+    retries = GENERATION_TABLE_RETRIES if retries is None else retries
+    notify = on_progress or (lambda event: None)
+    llm = get_chat_model(model_id)
+
+    schema_text = await _complete(
+        llm, model_id, SCHEMA_PROMPT_TEMPLATE.format(question=question, tables=tables),
+        key=(cache_key, "schema", question, tables) if cache_key else None,
+    )
+    creates, schemas = {}, {}
+    for statement in _statements(schema_text):
+        schema = parse_table_schema(list(tokenize(statement)))
+        if schema and schema["columns"]:
+            creates[schema["table"].lower()] = statement
+            schemas[schema["table"].lower()] = schema
+    if not schemas:
+        raise ValueError("The model returned no CREATE TABLE statements.")
+    order, parents = dependency_order(schemas)
+    notify({"phase": "schema", "tables": order, "dependencies": parents})
+
+    finished = {t: asyncio.Event() for t in order}
+    produced = {}
+    inserts = {}
+    report = {}
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def run_table(table):
+        try:
+            for parent in parents[table]:
+                await finished[parent].wait()
+            # Rows of a child whose parent has none could only reference keys
+            # that do not exist.
+            missing = [parent for parent in parents[table] if parent not in produced]
+            if missing:
+                report[table] = {"status": "skipped", "rows": 0, "attempts": 0,
+                                 "error": f"Parent table {', '.join(missing)} has no rows."}
+                notify({"phase": "table", "table": table, **report[table]})
+                return
+            async with semaphore:
+                notify({"phase": "table", "table": table, "status": "started"})
+                prompt_text = ROWS_PROMPT_TEMPLATE.format(
+                    question=question, create_statement=creates[table], table=schemas[table]["table"],
+                    parent_keys=_parent_keys_text(schemas[table], produced), rows=rows_per_table, row_rules=row_rules,
+                )
+                error = None
+                # This loop is the only retry: it also covers responses without
+                # usable rows, so run_llm does not retry underneath it.
+                for attempt in range(1, retries + 2):
+                    try:
+                        statements, columns, rows = _table_inserts(
+                            await _complete(llm, model_id, prompt_text, retries=0), table, schemas[table])
+                        if rows:
+                            inserts[table] = statements
+                            produced[table] = (columns, rows)
+                            report[table] = {"status": "done", "rows": len(rows), "attempts": attempt}
+                            notify({"phase": "table", "table": table, **report[table]})
+                            return
+                        error = f"No INSERT INTO {table} rows in the response."
+                    except Exception as e:
+                        error = str(e) or type(e).__name__
+                    if attempt <= retries:
+                        notify({"phase": "table", "table": table, "status": "retrying",
+                                "attempt": attempt, "error": error})
+                report[table] = {"status": "failed", "rows": 0, "attempts": retries + 1, "error": error}
+                notify({"phase": "table", "table": table, **report[table]})
+        finally:
+            finished[table].set()
+
+    await asyncio.gather(*(run_table(t) for t in order))
+    sql_parts = [creates[t] for t in order] + [s for t in order for s in inserts.get(t, [])]
+    return "\n\n".join(sql_parts), report
+
+
+def require_generated_rows(report):
+    # A run in which no table produced rows must not replace the current dataset.
+    if not any(entry["status"] == "done" for entry in report.values()):
+        reasons = "; ".join(f"{table}: {entry.get('error', entry['status']).rstrip('.')}" for table, entry in report.items())
+        raise ValueError(f"No table produced any rows, so the current dataset was kept ({reasons}).")
+
+
+async def stream_progress(run):
+    # run(on_progress) -> awaitable of (sql, report); yields (event, data) for
+    # every progress event and finally ("done", {"sql": sql, "tables": report}).
+    queue = asyncio.Queue()
+    task = asyncio.ensure_future(run(queue.put_nowait))
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            event = getter.result()
+            yield event["phase"], event
+        while not queue.empty():
+            event = queue.get_nowait()
+            yield event["phase"], event
+        sql, report = task.result()
+        yield "done", {"sql": sql, "tables": report}
+    finally:
+        if not task.done():
+            task.cancel()
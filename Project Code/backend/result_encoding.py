@@ -0,0 +1,148 @@
+import os
+import gzip
+import json
+import base64
+import hashlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RESULT_MAX_EXAMPLES = int(os.getenv("RESULT_MAX_EXAMPLES", 5))
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", 500))
+RESULT_MAX_PAGE_SIZE = 5000
+# Bodies smaller than this are sent uncompressed.
+COMPRESS_MIN_BYTES = 1024
+ISSUE_KINDS = ("outliers", "suspicious")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str).encode("utf-8")
+
+
+def encode_body(obj, accept_encoding=""):
+    # Returns (body, content_encoding or None). zstd is preferred when the
+    # client accepts it and zstandard is installed, then gzip.
+    body = dumps(obj)
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if "zstd" in accepted and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(body), "zstd"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def files_version(csv_folder, filenames):
+    # Changes whenever one of the files is rewritten, so cursors from an older
+    # version of the data are rejected instead of silently skipping rows.
+    digest = hashlib.blake2b(digest_size=8)
+    for fname in sorted(filenames):
+        try:
+            st = os.stat(os.path.join(csv_folder, fname))
+        except OSError:
+            continue
+        digest.update(f"{fname}\x1f{st.st_size}\x1f{st.st_mtime_ns}\x1e".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def encode_cursor(offset, version):
+    return base64.urlsafe_b64encode(json.dumps([offset, version]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, version):
+    try:
+        offset, cursor_version = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(offset)
+    except Exception:
+        raise InvalidCursor("Malformed cursor.")
+    if cursor_version != version or offset < 0:
+        raise InvalidCursor("The data changed since this cursor was issued; start again without a cursor.")
+    return offset
+
+
+def summarize_analysis(analysis, max_examples=RESULT_MAX_EXAMPLES):
+    # Per-column counts with a few example values and their row numbers; the
+    # full lists are served page by page from issue_page().
+    if "error" in analysis:
+        return analysis
+    outlier_counts = analysis.get("outlier_counts", {})
+    outlier_rows = analysis.get("outlier_rows", {})
+    suspicious_counts = analysis.get("suspicious_counts", {})
+    suspicious_cells = analysis.get("suspicious_cells", {})
+    return {
+        "file_name": analysis["file_name"],
+        "num_rows": analysis["num_rows"],
+        "num_columns": analysis["num_columns"],
+        "mode": analysis.get("mode", "exact"),
+        "missing_data": analysis.get("missing_data", {}),
+        "date_formats": analysis.get("date_formats", {}),
+        "outliers": {
+            col: {"count": outlier_counts.get(col, len(values)), "examples": values[:max_examples],
+                  "rows": outlier_rows.get(col, [])[:max_examples]}
+            for col, values in analysis.get("outliers", {}).items()
+        },
+        "suspicious_values": {
+            col: {"count": suspicious_counts.get(col, len(values)), "examples": values[:max_examples],
+                  "rows": [row for row, _ in suspicious_cells.get(col, [])[:max_examples]]}
+            for col, values in analysis.get("suspicious_values", {}).items()
+        },
+    }
+
+
+def _issue_groups(analyses, file, column, kind):
+    for analysis in analyses:
+        if "error" in analysis or (file and analysis["file_name"] != file):
+            continue
+        for issue_kind in ISSUE_KINDS:
+            if kind and issue_kind != kind:
+                continue
+            if issue_kind == "outliers":
+                values = analysis.get("outliers", {})
+                rows = analysis.get("outlier_rows", {})
+                cells = {col: list(zip(rows.get(col) or [None] * len(v), v)) for col, v in values.items()}
+            else:
+                cells = analysis.get("suspicious_cells") or {
+                    col: [(None, v) for v in values] for col, values in analysis.get("suspicious_values", {}).items()}
+            for col in analysis.get("columns", list(cells)):
+                if col in cells and (not column or col == column):
+                    yield analysis["file_name"], issue_kind, col, cells[col]
+
+
+def issue_page(analyses, version, file=None, column=None, kind=None, cursor=None, limit=RESULT_PAGE_SIZE):
+    # One page of individual outlier/suspicious cells, ordered by file, kind,
+    # column and row. The cursor is opaque and tied to the data version.
+    if kind and kind not in ISSUE_KINDS:
+        raise ValueError(f"Unknown kind '{kind}'. Use one of: {', '.join(ISSUE_KINDS)}")
+    offset = decode_cursor(cursor, version) if cursor else 0
+    limit = max(1, min(int(limit), RESULT_MAX_PAGE_SIZE))
+    items = []
+    total = 0
+    skip = offset
+    for fname, issue_kind, col, cells in _issue_groups(analyses, file, column, kind):
+        total += len(cells)
+        if skip >= len(cells):
+            skip -= len(cells)
+            continue
+        for row, value in cells[skip:skip + limit - len(items)]:
+            items.append({"file": fname, "kind": issue_kind, "column": col, "row": row, "value": value})
+        skip = 0
+    next_offset = offset + len(items)
+    return {
+        "items": items,
+        "total": total,
+        "next_cursor": encode_cursor(next_offset, version) if next_offset < total else None,
+        "data_version": version,
+    }
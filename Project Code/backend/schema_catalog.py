@@ -0,0 +1,271 @@
+import os
+from collections import deque
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from merged_store import load_group_tables, read_manifest
+from sql_database import read_table_schemas, table_name_for_file
+
+# Share of a candidate foreign key's distinct values that must appear in the
+# referenced key before the relationship is inferred from data alone.
+MIN_KEY_OVERLAP = 0.9
+
+
+def singular(name):
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    if name.endswith("ses") or name.endswith("xes"):
+        return name[:-2]
+    if name.endswith("s") and not name.endswith("ss"):
+        return name[:-1]
+    return name
+
+
+def _as_strings(column):
+    return pc.cast(column, pa.string()) if column.type != pa.string() else column
+
+
+def dependency_order(schemas):
+    # Tables ordered parents-first, and each table's parents among the tables
+    # before it. Foreign keys that close a cycle are ignored for scheduling.
+    pending = {t: {fk[1].lower() for fk in s["foreign_keys"] if fk[1].lower() in schemas and fk[1].lower() != t}
+               for t, s in schemas.items()}
+    order = []
+    while pending:
+        ready = sorted(t for t, deps in pending.items() if not deps - set(order))
+        if not ready:
+            ready = [sorted(pending)[0]]
+        for t in ready:
+            order.append(t)
+            del pending[t]
+    position = {t: i for i, t in enumerate(order)}
+    parents = {t: sorted({fk[1].lower() for fk in schemas[t]["foreign_keys"]
+                          if fk[1].lower() in position and position[fk[1].lower()] < position[t]})
+               for t in order}
+    return order, parents
+
+
+class JoinView:
+    # A join across related tables that is only evaluated by to_pandas(), which
+    # reads just the requested columns (plus join keys) from the memory-mapped
+    # tables. Columns are addressed as "table.column".
+
+    def __init__(self, catalog, tables, how="left"):
+        self.catalog = catalog
+        self.how = how
+        self.steps = catalog.join_path(tables)
+        self.tables = [tables[0]] + [step[2] for step in self.steps]
+
+    @property
+    def columns(self):
+        return [f"{t}.{c}" for t in self.tables for c in self.catalog.columns(t)]
+
+    def to_pandas(self, columns=None):
+        needed = {t: set() for t in self.tables}
+        if columns is None:
+            for t in self.tables:
+                needed[t].update(self.catalog.columns(t))
+        else:
+            for qualified in columns:
+                table, _, column = qualified.partition(".")
+                if table not in needed or column not in self.catalog.columns(table):
+                    raise KeyError(f"Column '{qualified}' is not part of this view.")
+                needed[table].add(column)
+        for left, left_cols, right, right_cols in self.steps:
+            needed[left].update(left_cols)
+            needed[right].update(right_cols)
+
+        def frame(t):
+            cols = [c for c in self.catalog.columns(t) if c in needed[t]]
+            return self.catalog.table(t, cols).add_prefix(f"{t}.")
+
+        result = frame(self.tables[0])
+        for left, left_cols, right, right_cols in self.steps:
+            result = result.merge(
+                frame(right),
+                how=self.how,
+                left_on=[f"{left}.{c}" for c in left_cols],
+                right_on=[f"{right}.{c}" for c in right_cols],
+            )
+        return result if columns is None else result[list(columns)]
+
+    def __repr__(self):
+        joins = ", ".join(f"{l}.{'+'.join(lc)} = {r}.{'+'.join(rc)}" for l, lc, r, rc in self.steps)
+        return f"JoinView({' -> '.join(self.tables)}{'; ' + joins if joins else ''})"
+
+
+class SchemaCatalog:
+    # Per-table view of the merged store with primary/foreign keys taken from
+    # the generated CREATE TABLE statements or, failing that, inferred from
+    # column names and value overlap. Tables stay memory-mapped; frames are
+    # only built for the columns a caller asks for.
+
+    def __init__(self, csv_folder, manifest=None):
+        self.csv_folder = csv_folder
+        manifest = manifest or read_manifest(csv_folder)
+        # Files whose latest version failed to load; they are stale or missing here.
+        self.failed_files = manifest.get("failed", {})
+        self._tables = {}
+        self.source_files = {}
+        for fname, table in load_group_tables(csv_folder, manifest).items():
+            name = table_name_for_file(fname)
+            prefix = f"{os.path.splitext(fname)[0]}__"
+            self._tables[name] = table.rename_columns(
+                [c[len(prefix):] if c.startswith(prefix) else c for c in table.column_names])
+            self.source_files[name] = fname
+        self.primary_keys = {}
+        self.relationships = []
+        self._load_keys(read_table_schemas(csv_folder))
+
+    @property
+    def table_names(self):
+        return sorted(self._tables)
+
+    def columns(self, table):
+        return self._tables[table].column_names
+
+    def num_rows(self, table):
+        return self._tables[table].num_rows
+
+    def table(self, name, columns=None):
+        if name not in self._tables:
+            raise KeyError(f"Unknown table '{name}'. Tables: {', '.join(self.table_names)}")
+        table = self._tables[name]
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas()
+
+    def join(self, *tables, how="left"):
+        return JoinView(self, list(tables), how)
+
+    def views(self):
+        # One lazy view per relationship, named "<child>__<parent>".
+        return {f"{r['child']}__{r['parent']}": self.join(r["child"], r["parent"]) for r in self.relationships}
+
+    def _column_lookup(self, table, column):
+        lowered = {c.lower(): c for c in self.columns(table)}
+        return lowered.get(column.lower())
+
+    def _load_keys(self, schemas):
+        for table in self._tables:
+            schema = schemas.get(table)
+            columns = [self._column_lookup(table, c) for c in (schema or {}).get("primary_key", [])]
+            if columns and all(columns):
+                self.primary_keys[table] = columns
+            else:
+                key = self._infer_primary_key(table)
+                if key:
+                    self.primary_keys[table] = [key]
+        for table in self._tables:
+            for fk_columns, ref_table, ref_columns in (schemas.get(table) or {}).get("foreign_keys", []):
+                self._add_declared(table, fk_columns, ref_table.lower(), ref_columns)
+        self._infer_foreign_keys()
+
+    def _add_declared(self, table, fk_columns, parent, ref_columns):
+        if parent not in self._tables:
+            return
+        child_columns = [self._column_lookup(table, c) for c in fk_columns]
+        parent_columns = [self._column_lookup(parent, c) for c in (ref_columns or self.primary_keys.get(parent, []))]
+        if child_columns and all(child_columns) and parent_columns and all(parent_columns):
+            self.relationships.append({"child": table, "child_columns": child_columns, "parent": parent,
+                                       "parent_columns": parent_columns, "source": "declared"})
+
+    def _infer_primary_key(self, table):
+        candidates = ["id", f"{table}_id", f"{singular(table)}_id"]
+        for candidate in candidates:
+            column = self._column_lookup(table, candidate)
+            if column is None:
+                continue
+            values = self._tables[table].column(column)
+            if values.null_count == 0 and len(pc.unique(values)) == len(values):
+                return column
+        return None
+
+    def _overlap(self, child, child_column, parent, parent_column):
+        child_values = _as_strings(pc.unique(self._tables[child].column(child_column)).drop_null())
+        if len(child_values) == 0:
+            return 0.0
+        parent_values = _as_strings(pc.unique(self._tables[parent].column(parent_column)).drop_null())
+        return pc.sum(pc.is_in(child_values, value_set=parent_values)).as_py() / len(child_values)
+
+    def _infer_foreign_keys(self):
+        linked = {(r["child"], tuple(r["child_columns"])) for r in self.relationships}
+        for parent, key in self.primary_keys.items():
+            if len(key) != 1:
+                continue
+            parent_column = key[0]
+            names = {parent_column.lower()} if parent_column.lower() != "id" else set()
+            names.update({f"{parent}_id", f"{singular(parent)}_id"})
+            for child in self._tables:
+                if child == parent:
+                    continue
+                for name in names:
+                    column = self._column_lookup(child, name)
+                    if column is None or (child, (column,)) in linked:
+                        continue
+                    if self._overlap(child, column, parent, parent_column) >= MIN_KEY_OVERLAP:
+                        self.relationships.append({"child": child, "child_columns": [column], "parent": parent,
+                                                   "parent_columns": [parent_column], "source": "inferred"})
+                        linked.add((child, (column,)))
+
+    def join_path(self, tables):
+        # Join steps (joined_table, columns, new_table, columns) connecting all
+        # of ``tables``, starting from the first and going through intermediate
+        # tables where needed.
+        for t in tables:
+            if t not in self._tables:
+                raise KeyError(f"Unknown table '{t}'. Tables: {', '.join(self.table_names)}")
+        edges = {}
+        for r in self.relationships:
+            edges.setdefault(r["child"], []).append((r["child_columns"], r["parent"], r["parent_columns"]))
+            edges.setdefault(r["parent"], []).append((r["parent_columns"], r["child"], r["child_columns"]))
+        joined = [tables[0]]
+        steps = []
+        for target in tables[1:]:
+            if target in joined:
+                continue
+            previous = {t: None for t in joined}
+            queue = deque(joined)
+            while queue and target not in previous:
+                current = queue.popleft()
+                for cols, other, other_cols in edges.get(current, []):
+                    if other not in previous:
+                        previous[other] = (current, cols, other, other_cols)
+                        queue.append(other)
+            if target not in previous:
+                raise ValueError(f"No key relationship connects '{target}' to {', '.join(joined)}.")
+            path = []
+            node = target
+            while previous[node] is not None:
+                path.append(previous[node])
+                node = previous[node][0]
+            for step in reversed(path):
+                steps.append(step)
+                joined.append(step[2])
+        return steps
+
+    def overview(self):
+        # One row per column: what the agent sees instead of the data itself.
+        foreign = {}
+        for r in self.relationships:
+            for c, p in zip(r["child_columns"], r["parent_columns"]):
+                foreign[(r["child"], c)] = f"{r['parent']}.{p}"
+        rows = []
+        for t in self.table_names:
+            schema = self._tables[t].schema
+            for field in schema:
+                key = "primary" if field.name in self.primary_keys.get(t, []) else ""
+                if (t, field.name) in foreign:
+                    key = (key + ", " if key else "") + f"foreign -> {foreign[(t, field.name)]}"
+                rows.append({"table": t, "column": field.name, "dtype": str(field.type),
+                             "rows": self.num_rows(t), "key": key})
+        return pd.DataFrame(rows, columns=["table", "column", "dtype", "rows", "key"])
+
+    def describe(self):
+        return {
+            "tables": {t: {"columns": self.columns(t), "rows": self.num_rows(t),
+                           "primary_key": self.primary_keys.get(t, []), "file": self.source_files[t]}
+                       for t in self.table_names},
+            "relationships": self.relationships,
+            "failed_files": self.failed_files,
+        }
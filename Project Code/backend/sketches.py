@@ -0,0 +1,114 @@
+import math
+import random
+import numpy as np
+
+
+class KLLSketch:
+    # Mergeable approximate-quantile sketch (Karnin, Lang, Liberty). Each level
+    # holds items of weight 2**level; a full level is sorted and every other
+    # item is promoted. Rank error is roughly 1.7 / k.
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self):
+        return sum(len(level) for level in self.levels)
+
+    def _max_size(self):
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self):
+        while self._size() > self._max_size():
+            for h, items in enumerate(self.levels):
+                if len(items) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append(np.empty(0))
+                    items = np.sort(items)
+                    if len(items) % 2:
+                        keep, items = items[-1:], items[:-1]
+                    else:
+                        keep = items[:0]
+                    offset = self._rng.randint(0, 1)
+                    self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset::2]])
+                    self.levels[h] = keep
+                    break
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self._compress()
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=float)
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        if not self.count:
+            return float("nan")
+        items, weights = self._weighted()
+        cumulative = np.cumsum(weights)
+        target = q * cumulative[-1]
+        idx = min(int(np.searchsorted(cumulative, target, side="left")), len(items) - 1)
+        return float(items[idx])
+
+    def rank(self, value):
+        # Estimated fraction of values strictly below ``value``.
+        if not self.count:
+            return 0.0
+        items, weights = self._weighted()
+        return float(weights[items < value].sum() / weights.sum())
+
+
+class ReservoirSample:
+    # Uniform sample of at most ``size`` items from a stream (Algorithm R).
+
+    def __init__(self, size=100, seed=0):
+        self.size = size
+        self.seen = 0
+        self.items = []
+        self._rng = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = self._rng.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def merge(self, other):
+        total = self.seen + other.seen
+        if not total:
+            return
+        pool = [(item, self.seen) for item in self.items] + [(item, other.seen) for item in other.items]
+        self._rng.shuffle(pool)
+        weighted = sorted(pool, key=lambda p: self._rng.random() ** (1.0 / p[1]), reverse=True)
+        self.items = [item for item, _ in weighted[:self.size]]
+        self.seen = total
@@ -0,0 +1,281 @@
+import os
+import csv
+import time
+import hashlib
+import sqlite3
+import threading
+from merged_store import STORE_DIR_NAME
+from dataset_versions import pin_snapshot
+from sql_tokenizer import tokenize, iter_statements, parse_table_schema, parse_insert, table_header, align_rows
+from telemetry import traced
+
+SQL_FILE_NAME = "create_insert_statements.sql"
+DATABASE_FILE_NAME = "dataset.db"
+DATA_FILE_SUFFIX = "_data.csv"
+QUERY_MAX_ROWS = int(os.getenv("SQL_QUERY_MAX_ROWS", 1000))
+QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", 30))
+INSERT_BATCH_ROWS = 5000
+# Ad-hoc queries may only read; anything else (ATTACH, PRAGMA, writes) is denied.
+_QUERY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                  getattr(sqlite3, "SQLITE_RECURSIVE", 33)}
+
+_build_lock = threading.Lock()
+
+
+class DatasetNotFound(Exception):
+    pass
+
+
+def database_path(csv_folder):
+    return os.path.join(csv_folder, STORE_DIR_NAME, DATABASE_FILE_NAME)
+
+
+def _quote(identifier):
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _affinity(type_name):
+    # SQLite type affinity for a declared (usually MySQL-flavoured) type.
+    t = (type_name or "").upper()
+    if "INT" in t:
+        return "INTEGER"
+    if any(k in t for k in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if any(k in t for k in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    if any(k in t for k in ("DEC", "NUM", "BOOL")):
+        return "NUMERIC"
+    return "TEXT"
+
+
+def _data_files(csv_folder):
+    return {table_name_for_file(f): f for f in os.listdir(csv_folder)
+            if f.lower().endswith(DATA_FILE_SUFFIX) and os.path.isfile(os.path.join(csv_folder, f))}
+
+
+def dataset_fingerprint(csv_folder):
+    # Changes whenever the generated SQL or any per-table CSV changes.
+    sql_path = os.path.join(csv_folder, SQL_FILE_NAME)
+    digest = hashlib.blake2b(digest_size=12)
+    names = sorted(_data_files(csv_folder).values())
+    if os.path.exists(sql_path):
+        names.insert(0, SQL_FILE_NAME)
+    if not names:
+        return None
+    for name in names:
+        st = os.stat(os.path.join(csv_folder, name))
+        digest.update(f"{name}\x1f{st.st_size}\x1f{st.st_mtime_ns}\x1e".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def table_name_for_file(filename):
+    # "customers_data.csv" -> "customers"
+    name = filename.lower()
+    if name.endswith(DATA_FILE_SUFFIX):
+        return name[:-len(DATA_FILE_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+
+def read_table_schemas(csv_folder):
+    # {table: schema} for every CREATE TABLE in the generated SQL.
+    sql_path = os.path.join(csv_folder, SQL_FILE_NAME)
+    if not os.path.exists(sql_path):
+        return {}
+    with open(sql_path, "r", encoding="utf-8") as f:
+        sql_text = f.read()
+    schemas = {}
+    for statement in iter_statements(tokenize(sql_text)):
+        schema = parse_table_schema(statement)
+        if schema:
+            schemas[schema["table"].lower()] = schema
+    return schemas
+
+
+def _read_generated_sql(csv_folder):
+    # Returns ({table: schema}, {table: (columns, rows)}) from the generated SQL.
+    schemas = {}
+    inserts = {}
+    sql_path = os.path.join(csv_folder, SQL_FILE_NAME)
+    if not os.path.exists(sql_path):
+        return schemas, inserts
+    with open(sql_path, "r", encoding="utf-8") as f:
+        sql_text = f.read()
+    known_columns = {}
+    for statement in iter_statements(tokenize(sql_text)):
+        schema = parse_table_schema(statement)
+        if schema:
+            table = schema["table"].lower()
+            schemas[table] = schema
+            known_columns[table] = [name for name, _ in schema["columns"]]
+            continue
+        parsed = parse_insert(statement, known_columns)
+        if parsed:
+            table_name, columns, rows = parsed
+            table = table_name.lower()
+            entry = inserts.setdefault(table, (known_columns.get(table) or table_header(columns, rows), []))
+            entry[1].extend(align_rows(columns, entry[0], rows))
+    return schemas, inserts
+
+
+def _csv_rows(path):
+    with open(path, "r", newline='', encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        yield columns
+        for row in reader:
+            yield [None if v == "" else v for v in row]
+
+
+def _create_table(conn, table, columns, schema, tables):
+    types = dict((name.lower(), type_name) for name, type_name in (schema or {}).get("columns", []))
+    definitions = [f"{_quote(c)} {_affinity(types.get(c.lower()))}" for c in columns]
+    present = {c.lower() for c in columns}
+    # Keys are declared for the query planner and the agent's schema view but
+    # not enforced: datasets generated with errors contain duplicate keys.
+    for fk_columns, ref_table, ref_columns in (schema or {}).get("foreign_keys", []):
+        if ref_table.lower() in tables and all(c.lower() in present for c in fk_columns):
+            refs = f" ({', '.join(_quote(c) for c in ref_columns)})" if ref_columns else ""
+            definitions.append(f"FOREIGN KEY ({', '.join(_quote(c) for c in fk_columns)}) "
+                               f"REFERENCES {_quote(ref_table.lower())}{refs}")
+    conn.execute(f"CREATE TABLE {_quote(table)} ({', '.join(definitions)})")
+
+    keys = []
+    if schema and schema["primary_key"]:
+        keys.append(("pk", schema["primary_key"]))
+    keys.extend(("fk", fk_columns) for fk_columns, _, _ in (schema or {}).get("foreign_keys", []))
+    for n, (kind, key_columns) in enumerate(keys):
+        if all(c.lower() in present for c in key_columns):
+            conn.execute(f"CREATE INDEX {_quote(f'ix_{table}_{kind}{n}')} ON {_quote(table)} "
+                         f"({', '.join(_quote(c) for c in key_columns)})")
+
+
+def _insert_rows(conn, table, columns, rows):
+    placeholders = ", ".join("?" * len(columns))
+    statement = f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) VALUES ({placeholders})"
+    width = len(columns)
+    batch = []
+    for row in rows:
+        batch.append((list(row) + [None] * width)[:width])
+        if len(batch) >= INSERT_BATCH_ROWS:
+            conn.executemany(statement, batch)
+            batch = []
+    if batch:
+        conn.executemany(statement, batch)
+
+
+@traced("sql_database_build")
+def build_sql_database(csv_folder):
+    # Loads the dataset into SQLite: tables and keys come from the generated
+    # CREATE TABLE statements, rows from each table's CSV (so edits made through
+    # the modification endpoints are visible) or, when no CSV exists for the
+    # dataset at all, from the generated INSERT statements.
+    # Everything is read from one pinned dataset version; its files keep the
+    # live names, sizes and mtimes, so the stored fingerprint matches.
+    with pin_snapshot(csv_folder) as snapshot:
+        source = snapshot.folder
+        schemas, inserts = _read_generated_sql(source)
+        data_files = _data_files(source)
+        tables = sorted(data_files) if data_files else sorted(set(schemas) | set(inserts))
+        if not tables:
+            raise DatasetNotFound("No generated dataset found.")
+        path = database_path(csv_folder)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            for table in tables:
+                if table in data_files:
+                    rows = _csv_rows(os.path.join(source, data_files[table]))
+                    columns = next(rows)
+                else:
+                    columns, rows = inserts.get(table) or ([], [])
+                    if not columns:
+                        columns = [name for name, _ in schemas[table]["columns"]]
+                if not columns:
+                    continue
+                _create_table(conn, table, columns, schemas.get(table), tables)
+                _insert_rows(conn, table, columns, rows)
+            conn.execute("CREATE TABLE _dataset_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT INTO _dataset_meta VALUES ('fingerprint', ?)", (dataset_fingerprint(source),))
+            conn.commit()
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+    return path
+
+
+def _stored_fingerprint(path):
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM _dataset_meta WHERE key = 'fingerprint'").fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+
+def ensure_sql_database(csv_folder):
+    # Returns (path, fingerprint), rebuilding the database if the dataset changed.
+    with _build_lock:
+        fingerprint = dataset_fingerprint(csv_folder)
+        if fingerprint is None:
+            raise DatasetNotFound("No generated dataset found.")
+        path = database_path(csv_folder)
+        if not os.path.exists(path) or _stored_fingerprint(path) != fingerprint:
+            build_sql_database(csv_folder)
+        return path, fingerprint
+
+
+def connect_readonly(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+
+@traced("sql_query")
+def run_query(csv_folder, query, max_rows=QUERY_MAX_ROWS, timeout=QUERY_TIMEOUT):
+    path, fingerprint = ensure_sql_database(csv_folder)
+    conn = connect_readonly(path)
+    deadline = time.monotonic() + timeout
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    conn.set_authorizer(lambda action, *_: sqlite3.SQLITE_OK if action in _QUERY_ACTIONS else sqlite3.SQLITE_DENY)
+    try:
+        cursor = conn.execute(query)
+        columns = [d[0] for d in cursor.description or []]
+        rows = cursor.fetchmany(max_rows + 1)
+    finally:
+        conn.close()
+    return {
+        "columns": columns,
+        "rows": [list(r) for r in rows[:max_rows]],
+        "truncated": len(rows) > max_rows,
+        "data_version": fingerprint,
+    }
+
+
+def list_tables(csv_folder):
+    path, _ = ensure_sql_database(csv_folder)
+    conn = connect_readonly(path)
+    try:
+        names = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' AND name != '_dataset_meta' ORDER BY name")]
+        return {name: [r[1] for r in conn.execute(f"PRAGMA table_info({_quote(name)})")] for name in names}
+    finally:
+        conn.close()
+
+
+def create_sql_database_agent(csv_folder, llm):
+    # LangChain SQL agent whose tool executes queries against the dataset's
+    # SQLite database (read-only).
+    from langchain_community.agent_toolkits import create_sql_agent
+    from langchain_community.utilities import SQLDatabase
+
+    path, _ = ensure_sql_database(csv_folder)
+    db = SQLDatabase.from_uri(f"sqlite:///file:{path}?mode=ro&uri=true", ignore_tables=["_dataset_meta"])
+    return create_sql_agent(llm, db=db, verbose=False)
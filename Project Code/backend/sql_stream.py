@@ -0,0 +1,249 @@
+import os
+import csv
+import re
+import shutil
+import asyncio
+from dataset_versions import get_dataset
+from sql_tokenizer import tokenize, parse_insert, parse_create_table, table_header, align_rows, NULL
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+_FENCE = re.compile(r"^`{3,}(?:sql)?", re.IGNORECASE)
+_ANY_FENCE = re.compile(r"`{3,}(?:sql)?", re.IGNORECASE)
+# A chunk ending in backticks, or backticks and part of "sql", may be the first
+# half of a fence.
+_PARTIAL_FENCE = re.compile(r"`+(?:s|sq)?$", re.IGNORECASE)
+_REACT_LABELS = ("question:", "thought:", "action:", "action input:", "observation:", "final answer:")
+
+
+class FenceFilter:
+    # Removes ``` and ```sql fences from streamed text. A trailing partial
+    # fence is held back until the next chunk shows whether it is one.
+
+    def __init__(self):
+        self._tail = ""
+
+    def feed(self, text):
+        text = self._tail + text
+        held = _PARTIAL_FENCE.search(text)
+        cut = held.start() if held else len(text)
+        self._tail = text[cut:]
+        return _ANY_FENCE.sub("", text[:cut])
+
+    def flush(self):
+        text, self._tail = self._tail, ""
+        return _ANY_FENCE.sub("", text)
+
+
+def _opens_with_react(text):
+    # True if the reply starts with ReAct labels, so its SQL follows the
+    # Final Answer marker; False if it starts with anything else; None while
+    # too little has arrived to tell.
+    head = text.lstrip().lower()
+    if "\n" not in head and len(head) < max(len(label) for label in _REACT_LABELS):
+        if any(label.startswith(head) for label in _REACT_LABELS):
+            return None
+    return head.startswith(_REACT_LABELS)
+
+
+class StatementSplitter:
+    # Splits SQL text arriving in arbitrary chunks into complete statements,
+    # ignoring semicolons inside quotes and comments.
+
+    def __init__(self):
+        self._buffer = []
+        self._quote = None
+        self._line_comment = False
+        self._block_comment = False
+        self._prev = ""
+        self._escaped = False
+
+    def feed(self, text):
+        statements = []
+        for ch in text:
+            self._buffer.append(ch)
+            prev, self._prev = self._prev, ch
+            if self._line_comment:
+                if ch == "\n":
+                    self._line_comment = False
+                continue
+            if self._block_comment:
+                if prev == "*" and ch == "/":
+                    self._block_comment = False
+                    self._prev = ""
+                continue
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                continue
+            if ch in ("'", '"'):
+                self._quote = ch
+            elif prev == "-" and ch == "-":
+                self._line_comment = True
+            elif prev == "/" and ch == "*":
+                self._block_comment = True
+                self._prev = ""
+            elif ch == ";":
+                statement = "".join(self._buffer).strip()
+                self._buffer = []
+                if statement != ";":
+                    statements.append(statement)
+        return statements
+
+    def flush(self):
+        statement = "".join(self._buffer).strip()
+        self._buffer = []
+        return [statement] if statement else []
+
+
+def parse_insert_statement(statement, known_columns=None):
+    return parse_insert(list(tokenize(statement)), known_columns)
+
+
+def parse_create_statement(statement):
+    return parse_create_table(list(tokenize(statement)))
+
+
+class TableCSVAppender:
+    # Appends parsed INSERT rows to <table>_data.csv; the first write for a
+    # table in this session replaces the file and writes the header. Rows are
+    # matched to the header by column name.
+
+    def __init__(self, csv_folder, known_columns=None):
+        self.csv_folder = csv_folder
+        self.known_columns = {} if known_columns is None else known_columns
+        self.headers = {}
+        self.row_counts = {}
+        os.makedirs(csv_folder, exist_ok=True)
+
+    def append(self, table_name, columns, rows):
+        table = table_name.lower()
+        filename = os.path.join(self.csv_folder, f"{table}_data.csv")
+        first = table not in self.row_counts
+        if first:
+            self.headers[table] = self.known_columns.get(table) or table_header(columns, rows)
+        header = self.headers[table]
+        with open(filename, "w" if first else "a", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if first:
+                writer.writerow(header)
+            writer.writerows([["" if v is NULL else v for v in row] for row in align_rows(columns, header, rows)])
+        self.row_counts[table] = self.row_counts.get(table, 0) + len(rows)
+        return self.row_counts[table]
+
+
+async def stream_sql_generation(llm, prompt_text, csv_folder, on_complete=None):
+    # Streams the LLM completion and yields (event, data) pairs: "token" for
+    # SQL text, "table" / "rows" as statements close and are materialized, and
+    # a final "done" carrying the full SQL.
+    splitter = StatementSplitter()
+    known_columns = {}
+    appender = TableCSVAppender(csv_folder, known_columns)
+    fences = FenceFilter()
+    raw = []
+    sql_started = False
+    react = None
+    pending = ""
+
+    def materialize(statements):
+        events = []
+        for statement in statements:
+            statement = _FENCE.sub("", statement).strip()
+            created = parse_create_statement(statement)
+            if created:
+                known_columns[created[0].lower()] = created[1]
+                events.append(("table", {"table": created[0].lower(), "columns": created[1]}))
+                continue
+            parsed = parse_insert_statement(statement, known_columns)
+            if parsed:
+                table_name, columns, rows = parsed
+                total = appender.append(table_name, columns, rows)
+                events.append(("rows", {"table": table_name.lower(), "added": len(rows), "total": total}))
+        return events
+
+    async for chunk in llm.astream(prompt_text):
+        text = chunk.content if hasattr(chunk, "content") else str(chunk)
+        if not text:
+            continue
+        raw.append(text)
+        if not sql_started:
+            pending += text
+            # Only the new text, and a marker split across chunks, is searched.
+            start = max(0, len(pending) - len(text) - len(FINAL_ANSWER_MARKER) + 1)
+            marker = pending.find(FINAL_ANSWER_MARKER, start)
+            if marker >= 0:
+                text = pending[marker + len(FINAL_ANSWER_MARKER):]
+            else:
+                if react is None:
+                    react = _opens_with_react(pending)
+                if react is not False:
+                    continue
+                # The model skipped the ReAct preamble; the whole reply is SQL.
+                text = pending
+            sql_started = True
+            pending = ""
+        text = fences.feed(text)
+        if text:
+            yield "token", text
+        for event in materialize(splitter.feed(text)):
+            yield event
+    # A preamble without a marker: fall back to treating the whole reply as SQL.
+    text = fences.feed(pending) if not sql_started else ""
+    text += fences.flush()
+    if text:
+        yield "token", text
+    for event in materialize(splitter.feed(text) + splitter.flush()):
+        yield event
+    output = "".join(raw)
+    if FINAL_ANSWER_MARKER in output:
+        output = output.split(FINAL_ANSWER_MARKER, 1)[1]
+    output = _ANY_FENCE.sub("", output).strip()
+    if on_complete is not None:
+        on_complete(output)
+    yield "done", {"sql": output, "tables": appender.row_counts}
+
+
+async def stream_sql_to_dataset(llm, prompt_text, csv_folder, save_sql):
+    # stream_sql_generation for csv_folder's dataset: each table is committed
+    # as its own version once the model moves on to another table, so readers
+    # see tables as they complete. The first commit replaces the previous
+    # dataset; "done" commits save_sql(sql, folder) with any table still open.
+    # A stream that fails part way leaves the tables committed so far.
+    dataset = get_dataset(csv_folder)
+    # Rows accumulate in the staging area of a transaction that is never
+    # committed; closed tables are copied from it into their own commits.
+    scratch = dataset.transaction()
+    totals, committed = {}, {}
+    replaced = False
+    current = None
+
+    def commit(tables, sql=None):
+        nonlocal replaced
+        names = [f"{table}_data.csv" for table in tables]
+        with dataset.transaction(names, replace=not replaced) as txn:
+            for name in names:
+                # Copied, not linked: the scratch file keeps growing if the
+                # model returns to the table.
+                shutil.copyfile(scratch.path(name), txn.path(name))
+            if sql is not None:
+                save_sql(sql, txn.staging_dir)
+        replaced = True
+        committed.update((table, totals[table]) for table in tables)
+
+    try:
+        async for event, data in stream_sql_generation(llm, prompt_text, scratch.staging_dir):
+            if event == "rows":
+                if current is not None and current != data["table"] and committed.get(current) != totals[current]:
+                    await asyncio.to_thread(commit, [current])
+                current = data["table"]
+                totals[current] = data["total"]
+            elif event == "done":
+                await asyncio.to_thread(
+                    commit, [t for t in totals if committed.get(t) != totals[t]], data["sql"])
+            yield event, data
+    finally:
+        scratch.abort()
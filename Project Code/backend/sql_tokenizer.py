@@ -0,0 +1,298 @@
+import os
+import csv
+import re
+from telemetry import traced
+
+# One alternative per token kind. Each alternative is decided by its first
+# character, so matching never backtracks across tokens and a dump is
+# scanned in a single linear pass.
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^'\\]|\\.|'')*(?:'|\Z))
+  | (?P<quoted>"(?:[^"]|"")*(?:"|\Z)|`[^`]*(?:`|\Z)|\[[^\]]*(?:\]|\Z))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "0": "\0", "\\": "\\", "'": "'", '"': '"'}
+_ESCAPE_PATTERN = re.compile(r"\\(.)|''", re.DOTALL)
+
+NULL = None
+
+
+def _unescape_string(token):
+    body = token[1:-1] if len(token) >= 2 and token.endswith("'") else token[1:]
+    if "\\" not in body and "''" not in body:
+        return body
+    return _ESCAPE_PATTERN.sub(lambda m: "'" if m.group(0) == "''" else _ESCAPES.get(m.group(1), m.group(1)), body)
+
+
+def _identifier(token):
+    kind, value = token
+    if kind == "quoted":
+        return value[1:-1].replace('""', '"')
+    return value
+
+
+def tokenize(sql_text):
+    # Yields (kind, value) tokens, skipping whitespace and comments. Kinds:
+    # string, quoted (identifier), number, word, punct.
+    for match in _TOKEN.finditer(sql_text):
+        kind = match.lastgroup
+        if kind == "space" or kind == "comment":
+            continue
+        yield kind, match.group()
+
+
+def iter_statements(tokens):
+    statement = []
+    for token in tokens:
+        if token == ("punct", ";"):
+            if statement:
+                yield statement
+            statement = []
+        else:
+            statement.append(token)
+    if statement:
+        yield statement
+
+
+def _literal(tokens):
+    if len(tokens) == 1:
+        kind, value = tokens[0]
+        if kind == "string":
+            return _unescape_string(value)
+        if kind == "word" and value.upper() == "NULL":
+            return NULL
+        if kind == "quoted":
+            return _identifier(tokens[0])
+        return value
+    if len(tokens) == 2 and tokens[0] in (("punct", "-"), ("punct", "+")) and tokens[1][0] == "number":
+        return tokens[0][1] + tokens[1][1] if tokens[0][1] == "-" else tokens[1][1]
+    # Expressions such as NOW() or DATE '2024-01-01' are kept as written.
+    return " ".join(_literal([t]) if t[0] == "string" else t[1] for t in tokens)
+
+
+def _split_top_level(tokens, start):
+    # Reads a parenthesised, comma-separated list starting at tokens[start]
+    # == "(" and returns (items, index after the closing paren).
+    items = []
+    current = []
+    depth = 0
+    i = start
+    while i < len(tokens):
+        token = tokens[i]
+        if token == ("punct", "("):
+            depth += 1
+            if depth > 1:
+                current.append(token)
+        elif token == ("punct", ")"):
+            depth -= 1
+            if depth == 0:
+                items.append(current)
+                return items, i + 1
+            current.append(token)
+        elif token == ("punct", ",") and depth == 1:
+            items.append(current)
+            current = []
+        else:
+            current.append(token)
+        i += 1
+    if current:
+        items.append(current)
+    return items, i
+
+
+def _is_word(token, *words):
+    return token[0] == "word" and token[1].upper() in words
+
+
+def _table_name(tokens, i):
+    # Handles schema-qualified names; returns (name, next index).
+    name = _identifier(tokens[i])
+    i += 1
+    while i + 1 < len(tokens) and tokens[i] == ("punct", ".") and tokens[i + 1][0] in ("word", "quoted"):
+        name = _identifier(tokens[i + 1])
+        i += 2
+    return name, i
+
+
+_CONSTRAINT_WORDS = ("PRIMARY", "FOREIGN", "CONSTRAINT", "UNIQUE", "KEY", "INDEX", "CHECK", "FULLTEXT")
+
+
+def _column_list(tokens, i):
+    # Reads "(a, b)" at tokens[i]; returns (names, next index).
+    if i >= len(tokens) or tokens[i] != ("punct", "("):
+        return [], i
+    items, i = _split_top_level(tokens, i)
+    return [_identifier(item[0]) for item in items if item], i
+
+
+def _find_word(tokens, word):
+    for i, token in enumerate(tokens):
+        if _is_word(token, word):
+            return i
+    return -1
+
+
+def _references(tokens, i):
+    # Reads "REFERENCES table (cols)" at tokens[i]; returns (table, columns).
+    if i + 1 >= len(tokens):
+        return None, []
+    table, j = _table_name(tokens, i + 1)
+    columns, _ = _column_list(tokens, j)
+    return table, columns
+
+
+def parse_table_schema(statement):
+    # Returns {"table", "columns": [(name, type)], "primary_key": [...],
+    # "foreign_keys": [(columns, ref_table, ref_columns)]} for a CREATE TABLE
+    # statement, else None.
+    if not (len(statement) > 2 and _is_word(statement[0], "CREATE")):
+        return None
+    i = 1
+    while i < len(statement) and _is_word(statement[i], "TEMPORARY", "TEMP"):
+        i += 1
+    if not (i < len(statement) and _is_word(statement[i], "TABLE")):
+        return None
+    i += 1
+    if i + 2 < len(statement) and _is_word(statement[i], "IF"):
+        i += 3
+    if i >= len(statement):
+        return None
+    table, i = _table_name(statement, i)
+    schema = {"table": table, "columns": [], "primary_key": [], "foreign_keys": []}
+    if i >= len(statement) or statement[i] != ("punct", "("):
+        return schema
+    definitions, _ = _split_top_level(statement, i)
+    for d in definitions:
+        if not d or d[0][0] not in ("word", "quoted"):
+            continue
+        if _is_word(d[0], *_CONSTRAINT_WORDS):
+            primary = _find_word(d, "PRIMARY")
+            foreign = _find_word(d, "FOREIGN")
+            if primary >= 0 and primary + 1 < len(d) and _is_word(d[primary + 1], "KEY"):
+                schema["primary_key"], _ = _column_list(d, primary + 2)
+            elif foreign >= 0 and foreign + 1 < len(d) and _is_word(d[foreign + 1], "KEY"):
+                columns, j = _column_list(d, foreign + 2)
+                if j < len(d) and _is_word(d[j], "REFERENCES"):
+                    ref_table, ref_columns = _references(d, j)
+                    schema["foreign_keys"].append((columns, ref_table, ref_columns))
+            continue
+        name = _identifier(d[0])
+        type_name = d[1][1] if len(d) > 1 and d[1][0] == "word" else ""
+        schema["columns"].append((name, type_name))
+        primary = _find_word(d, "PRIMARY")
+        if primary >= 0 and primary + 1 < len(d) and _is_word(d[primary + 1], "KEY"):
+            schema["primary_key"] = [name]
+        references = _find_word(d, "REFERENCES")
+        if references >= 0:
+            ref_table, ref_columns = _references(d, references)
+            schema["foreign_keys"].append(([name], ref_table, ref_columns))
+    return schema
+
+
+def parse_create_table(statement):
+    # Returns (table, columns) for a CREATE TABLE statement, else None.
+    schema = parse_table_schema(statement)
+    if schema is None:
+        return None
+    return schema["table"], [name for name, _ in schema["columns"]]
+
+
+def parse_insert(statement, known_columns=None):
+    # Returns (table, columns, rows) for an INSERT ... VALUES statement, else None.
+    if not (statement and _is_word(statement[0], "INSERT", "REPLACE")):
+        return None
+    i = 1
+    while i < len(statement) and _is_word(statement[i], "IGNORE", "INTO", "LOW_PRIORITY", "DELAYED", "HIGH_PRIORITY"):
+        i += 1
+    if i >= len(statement):
+        return None
+    table, i = _table_name(statement, i)
+    columns = None
+    if i < len(statement) and statement[i] == ("punct", "("):
+        items, i = _split_top_level(statement, i)
+        columns = [_identifier(item[0]) for item in items if item]
+    if not (i < len(statement) and _is_word(statement[i], "VALUES", "VALUE")):
+        return None
+    i += 1
+    if columns is None:
+        columns = list((known_columns or {}).get(table.lower(), []))
+    rows = []
+    while i < len(statement):
+        if statement[i] == ("punct", "("):
+            items, i = _split_top_level(statement, i)
+            rows.append([_literal(item) if item else "" for item in items])
+        elif statement[i] == ("punct", ","):
+            i += 1
+        else:
+            break
+    return table, columns, rows
+
+
+def iter_insert_rows(sql_text, known_columns=None):
+    # Yields (table, columns, rows) per INSERT statement, in order. Columns of
+    # every CREATE TABLE seen are recorded in known_columns.
+    known_columns = {} if known_columns is None else known_columns
+    for statement in iter_statements(tokenize(sql_text)):
+        created = parse_create_table(statement)
+        if created:
+            known_columns[created[0].lower()] = created[1]
+            continue
+        parsed = parse_insert(statement, known_columns)
+        if parsed:
+            yield parsed
+
+
+def table_header(columns, rows):
+    # Header for a table's first INSERT; one without a column list and no
+    # CREATE TABLE gets column_1, column_2, ...
+    if columns:
+        return list(columns)
+    return [f"column_{i}" for i in range(1, max((len(row) for row in rows), default=0) + 1)]
+
+
+def align_rows(columns, header, rows):
+    # Reorders rows given in `columns` order onto `header` by name. Header
+    # columns the INSERT did not list are NULL; listed columns that are not in
+    # the header are dropped. Rows without a column list stay positional.
+    if not columns or [c.lower() for c in columns] == [h.lower() for h in header]:
+        return rows
+    positions = {c.lower(): i for i, c in enumerate(columns)}
+    index = [positions.get(h.lower()) for h in header]
+    return [[row[i] if i is not None and i < len(row) else NULL for i in index] for row in rows]
+
+
+def _csv_value(value):
+    return "" if value is NULL else value
+
+
+@traced("sql_import")
+def write_inserts_to_csv(sql_text, csv_folder):
+    # Streams every INSERT row into <table>_data.csv and returns row counts per
+    # table. Rows from several INSERT statements for one table are combined
+    # under the CREATE TABLE columns, or the first INSERT's if there is none.
+    os.makedirs(csv_folder, exist_ok=True)
+    known_columns = {}
+    handles = {}
+    counts = {}
+    try:
+        for table_name, columns, rows in iter_insert_rows(sql_text, known_columns):
+            table = table_name.lower()
+            if table not in handles:
+                f = open(os.path.join(csv_folder, f"{table}_data.csv"), "w", newline='', encoding="utf-8")
+                writer = csv.writer(f)
+                header = known_columns.get(table) or table_header(columns, rows)
+                handles[table] = (f, writer, header)
+                writer.writerow(header)
+                counts[table] = 0
+            _, writer, header = handles[table]
+            writer.writerows([_csv_value(v) for v in row] for row in align_rows(columns, header, rows))
+            counts[table] += len(rows)
+    finally:
+        for f, _, _ in handles.values():
+            f.close()
+    return counts
@@ -0,0 +1,312 @@
+import os
+import re
+import time
+import zlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from date_inference import infer_dates, FALLBACK_FORMAT, SWAPPED_DATE_FORMATS
+from merged_store import refresh_merged_store
+from dataset_versions import get_dataset
+from schema_catalog import SchemaCatalog, dependency_order
+from sql_database import DATA_FILE_SUFFIX
+from telemetry import traced
+
+EXPAND_CHUNK_ROWS = int(os.getenv("EXPAND_CHUNK_ROWS", 250_000))
+OUTPUT_FORMATS = ("csv", "parquet", "arrow")
+# String columns with fewer distinct values than this share of rows are
+# sampled as categories rather than templates.
+CATEGORICAL_RATIO = 0.5
+
+_KEY_PATTERN = re.compile(r"^(\D*?)(\d+)$")
+_DIGITS = re.compile(r"\d+")
+_DATE_FIELDS = {"%Y": 4, "%m": 2, "%d": 2, "%H": 2, "%M": 2, "%S": 2}
+
+
+def _zfill(numbers, width):
+    return np.char.zfill(numbers.astype(str), width)
+
+
+class _KeyModel:
+    # Sequential surrogate keys, keeping the seed's "C001"-style prefix if any.
+
+    def __init__(self, values):
+        self.prefix, self.width = None, 0
+        if pd.api.types.is_numeric_dtype(values):
+            self.type = pa.int64()
+            return
+        self.type = pa.string()
+        match = _KEY_PATTERN.match(str(values.iloc[0])) if len(values) else None
+        self.prefix = match.group(1) if match else "K"
+        self.width = len(match.group(2)) if match else 6
+
+    def sample(self, rng, n, offset):
+        ids = np.arange(offset + 1, offset + n + 1, dtype=np.int64)
+        if self.prefix is None:
+            return ids
+        return np.char.add(self.prefix, _zfill(ids, self.width)).astype(object)
+
+
+class _ForeignKeyModel:
+    # Draws from the keys already generated for the parent table.
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.type = None
+        self.keys = None
+
+    def sample(self, rng, n, offset):
+        return self.keys[rng.integers(0, len(self.keys), n)]
+
+
+class _NumericModel:
+    # Resamples seed values with Gaussian jitter (Silverman bandwidth), clipped
+    # to the seed range and rounded like the seed.
+
+    def __init__(self, values):
+        self.values = values.to_numpy(dtype=np.float64)
+        self.is_int = pd.api.types.is_integer_dtype(values) or bool(np.all(self.values == np.round(self.values)))
+        self.type = pa.int64() if self.is_int else pa.float64()
+        self.low, self.high = self.values.min(), self.values.max()
+        std = self.values.std()
+        self.bandwidth = 1.06 * std * len(self.values) ** -0.2 if std > 0 else 0.0
+        decimals = [len(str(v).split(".")[1]) for v in values.astype(str) if "." in str(v)]
+        self.decimals = min(max(decimals, default=2), 6)
+
+    def sample(self, rng, n, offset):
+        out = self.values[rng.integers(0, len(self.values), n)]
+        if self.bandwidth:
+            out = np.clip(out + rng.normal(0.0, self.bandwidth, n), self.low, self.high)
+        if self.is_int:
+            return np.round(out).astype(np.int64)
+        return np.round(out, self.decimals)
+
+
+class _CategoricalModel:
+    def __init__(self, values):
+        counts = values.astype(str).value_counts()
+        self.values = counts.index.to_numpy(dtype=object)
+        self.probs = (counts / counts.sum()).to_numpy()
+        self.type = pa.string()
+
+    def sample(self, rng, n, offset):
+        return self.values[rng.choice(len(self.values), n, p=self.probs)]
+
+
+class _TemplateModel:
+    # Picks a seed value and redraws every digit run with the same width, so
+    # "555-0142" or "INV-2024-0007" keep their shape with fresh digits.
+
+    def __init__(self, values):
+        self.templates = []
+        for value in values.astype(str).unique():
+            literals = _DIGITS.split(value)
+            widths = [len(d) for d in _DIGITS.findall(value)]
+            self.templates.append((literals, widths))
+        self.type = pa.string()
+
+    def sample(self, rng, n, offset):
+        choice = rng.integers(0, len(self.templates), n)
+        out = np.empty(n, dtype=object)
+        for j, (literals, widths) in enumerate(self.templates):
+            rows = np.flatnonzero(choice == j)
+            if not len(rows):
+                continue
+            parts = np.full(len(rows), literals[0])
+            for literal, width in zip(literals[1:], widths):
+                digits = _zfill(rng.integers(0, 10 ** min(width, 18), len(rows)), width)
+                parts = np.char.add(np.char.add(parts, digits), literal)
+            out[rows] = parts
+        return out
+
+
+class _WordMixModel:
+    # Multi-word text (names, addresses): each word position is drawn
+    # independently from the seed words at that position.
+
+    def __init__(self, values):
+        words = values.astype(str).str.split()
+        self.length = int(words.str.len().mode().iloc[0])
+        same = words[words.str.len() == self.length]
+        self.pools = [np.array(sorted({w[i] for w in same}), dtype=object) for i in range(self.length)]
+        self.type = pa.string()
+
+    def sample(self, rng, n, offset):
+        out = self.pools[0][rng.integers(0, len(self.pools[0]), n)].astype(str)
+        for pool in self.pools[1:]:
+            out = np.char.add(np.char.add(out, " "), pool[rng.integers(0, len(pool), n)].astype(str))
+        return out.astype(object)
+
+
+class _DateModel:
+    def __init__(self, dates, formats):
+        seconds = dates.dropna().to_numpy().astype("datetime64[s]").astype(np.int64)
+        self.low, self.high = int(seconds.min()), int(seconds.max())
+        self.has_time = bool(np.any(seconds % 86400))
+        known = formats.dropna()
+        known = known[(known != FALLBACK_FORMAT) & ~known.isin(list(SWAPPED_DATE_FORMATS))]
+        self.format = known.mode().iloc[0] if not known.empty else "%Y-%m-%d"
+        if self.has_time and "%H" not in self.format:
+            self.format += " %H:%M:%S"
+        self.type = pa.string()
+
+    def sample(self, rng, n, offset):
+        seconds = rng.integers(self.low, self.high + 1, n)
+        if not self.has_time:
+            seconds -= seconds % 86400
+        return _format_dates(seconds.astype("datetime64[s]"), self.format)
+
+
+def _format_dates(values, fmt):
+    fields = re.findall(r"%.", fmt)
+    if any(f not in _DATE_FIELDS for f in fields):
+        return pd.Series(values).dt.strftime(fmt).to_numpy(dtype=object)
+    months = values.astype("datetime64[M]")
+    days = values.astype("datetime64[D]")
+    seconds_of_day = (values - days).astype(np.int64)
+    numbers = {
+        "%Y": values.astype("datetime64[Y]").astype(np.int64) + 1970,
+        "%m": months.astype(np.int64) % 12 + 1,
+        "%d": (days - months.astype("datetime64[D]")).astype(np.int64) + 1,
+        "%H": seconds_of_day // 3600,
+        "%M": seconds_of_day // 60 % 60,
+        "%S": seconds_of_day % 60,
+    }
+    literals = re.split(r"%.", fmt)
+    out = np.full(len(values), literals[0])
+    for field, literal in zip(fields, literals[1:]):
+        out = np.char.add(np.char.add(out, _zfill(numbers[field], _DATE_FIELDS[field])), literal)
+    return out.astype(object)
+
+
+class _NullModel:
+    type = pa.string()
+
+    def sample(self, rng, n, offset):
+        return np.full(n, None, dtype=object)
+
+
+def fit_column(series, primary=False):
+    values = series.dropna()
+    if primary:
+        return _KeyModel(values)
+    if values.empty:
+        return _NullModel()
+    if pd.api.types.is_bool_dtype(values):
+        return _CategoricalModel(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return _NumericModel(values)
+    inferred = infer_dates(values.astype(str))
+    if inferred is not None and inferred[0].notna().mean() >= 0.8:
+        return _DateModel(*inferred)
+    text = values.astype(str)
+    if text.nunique() <= max(3, CATEGORICAL_RATIO * len(text)):
+        return _CategoricalModel(values)
+    if text.str.contains(r"\d").mean() >= 0.5:
+        return _TemplateModel(values)
+    if (text.str.split().str.len() > 1).mean() >= 0.5:
+        return _WordMixModel(values)
+    return _CategoricalModel(values)
+
+
+def fit_table(catalog, table):
+    # Returns ([(column, model, null_rate)], key column or None).
+    df = catalog.table(table)
+    key = catalog.primary_keys.get(table, [])
+    key = key[0] if len(key) == 1 else None
+    foreign = {}
+    for r in catalog.relationships:
+        if r["child"] == table and len(r["child_columns"]) == 1 and r["parent"] != table \
+                and catalog.primary_keys.get(r["parent"]) == r["parent_columns"]:
+            foreign[r["child_columns"][0]] = r["parent"]
+    models = []
+    for column in df.columns:
+        if column in foreign:
+            model = _ForeignKeyModel(foreign[column])
+        else:
+            model = fit_column(df[column], primary=column == key)
+        null_rate = 0.0 if column == key else float(df[column].isna().mean())
+        models.append((column, model, null_rate))
+    return models, key
+
+
+def _open_writer(path, schema, fmt):
+    if fmt == "csv":
+        return pa_csv.CSVWriter(path, schema, write_options=pa_csv.WriteOptions(quoting_style="needed"))
+    if fmt == "parquet":
+        return pq.ParquetWriter(path, schema)
+    return pa.ipc.new_file(path, schema)
+
+
+def _output_name(table, fmt):
+    return f"{table}{DATA_FILE_SUFFIX}" if fmt == "csv" else f"{table}_data.{fmt}"
+
+
+@traced("expand_dataset")
+def expand_dataset(csv_folder, rows_per_table, output_folder=None, seed=0, fmt="csv",
+                   chunk_rows=EXPAND_CHUNK_ROWS):
+    # Fits per-column models to the seed tables in csv_folder and writes
+    # rows_per_table (an int, or {table: rows}) synthetic rows per table in
+    # chunks. Parents are generated first so foreign keys only reference keys
+    # that exist. Output replaces the seed files when output_folder is
+    # csv_folder (the default).
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}'. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    output_folder = output_folder or csv_folder
+    os.makedirs(output_folder, exist_ok=True)
+    catalog = SchemaCatalog(csv_folder, refresh_merged_store(csv_folder))
+    if not catalog.table_names:
+        raise ValueError("No seed tables found.")
+    schemas = {t: {"foreign_keys": [(r["child_columns"], r["parent"], r["parent_columns"])
+                                    for r in catalog.relationships if r["child"] == t]}
+               for t in catalog.table_names}
+    order, _ = dependency_order(schemas)
+    fitted = {t: fit_table(catalog, t) for t in order}
+    keys = {}
+    report = {}
+    # In place, all tables are staged and committed as one dataset version, so
+    # readers see either the seed tables or the complete expansion.
+    txn = None
+    if os.path.abspath(output_folder) == os.path.abspath(csv_folder):
+        txn = get_dataset(csv_folder).transaction([_output_name(t, fmt) for t in order])
+    try:
+        for table in order:
+            start = time.perf_counter()
+            n_rows = rows_per_table.get(table, 0) if isinstance(rows_per_table, dict) else int(rows_per_table)
+            models, key = fitted[table]
+            for _, model, _ in models:
+                if isinstance(model, _ForeignKeyModel):
+                    model.keys, model.type = keys.get(model.parent, (np.full(1, None, dtype=object), pa.string()))
+            schema = pa.schema([(column, model.type) for column, model, _ in models])
+            rng = np.random.default_rng([seed, zlib.crc32(table.encode("utf-8"))])
+            path = os.path.join(txn.staging_dir if txn else output_folder, _output_name(table, fmt))
+            tmp_path = f"{path}.tmp"
+            key_chunks = []
+            with pa.OSFile(tmp_path, "wb") as sink:
+                writer = _open_writer(sink, schema, fmt)
+                for offset in range(0, n_rows, chunk_rows):
+                    n = min(chunk_rows, n_rows - offset)
+                    arrays = []
+                    for (column, model, null_rate), field in zip(models, schema):
+                        values = model.sample(rng, n, offset)
+                        if column == key:
+                            key_chunks.append(values)
+                        mask = rng.random(n) < null_rate if null_rate else None
+                        arrays.append(pa.array(values, type=field.type, mask=mask, from_pandas=True))
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                if n_rows == 0:
+                    writer.write_table(schema.empty_table())
+                writer.close()
+            os.replace(tmp_path, path)
+            if key_chunks:
+                keys[table] = (np.concatenate(key_chunks), schema.field(key).type)
+            report[table] = {"rows": n_rows, "file": _output_name(table, fmt),
+                             "seconds": round(time.perf_counter() - start, 3)}
+        if txn:
+            txn.commit()
+    finally:
+        if txn:
+            txn.abort()
+    return report
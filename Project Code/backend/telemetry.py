@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+# JSON-lines file receiving one record per finished span; unset disables tracing.
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+METRICS = {
+    "dataverse_http_request_duration_seconds": ("histogram", "HTTP request latency by route."),
+    "dataverse_stage_duration_seconds": ("histogram", "Time spent in each instrumented backend stage."),
+    "dataverse_llm_call_duration_seconds": ("histogram", "run_llm latency per model, including queueing and retries."),
+    "dataverse_llm_request_duration_seconds": ("histogram", "Latency of single chat-model round trips per model."),
+    "dataverse_llm_calls_total": ("counter", "run_llm calls per model and outcome."),
+    "dataverse_llm_retries_total": ("counter", "Retried LLM attempts per model."),
+    "dataverse_llm_tokens_total": ("counter", "LLM tokens per model and type (prompt/completion)."),
+    "dataverse_agent_step_duration_seconds": ("histogram", "Agent tool-step latency by tool."),
+    "dataverse_merged_store_build_failures_total": ("counter", "Source CSVs the merged store failed to rebuild."),
+    "dataverse_dataset_files": ("gauge", "CSV files in the current dataset."),
+    "dataverse_dataset_bytes": ("gauge", "Total size of the dataset CSV files."),
+    "dataverse_dataset_rows": ("gauge", "Rows per dataset file."),
+    "dataverse_workspaces_resident": ("gauge", "Workspaces with a loaded agent."),
+    "dataverse_workspaces_memory_bytes": ("gauge", "Estimated memory of all resident workspace agents."),
+}
+
+_lock = threading.Lock()
+_trace_lock = threading.Lock()
+# name -> {labels tuple: value}; histograms hold [bucket counts, sum, count]
+_values = {name: {} for name in METRICS}
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+_trace_file = None
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(labels)
+    with _lock:
+        series = _values[name]
+        series[key] = series.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    if not TELEMETRY_ENABLED:
+        return
+    with _lock:
+        _values[name][_key(labels)] = value
+
+
+def clear(name):
+    with _lock:
+        _values[name].clear()
+
+
+def observe(name, seconds, **labels):
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(labels)
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        series = _values[name]
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        entry[0][index] += 1
+        entry[1] += seconds
+        entry[2] += 1
+
+
+def _write_trace(record):
+    global _trace_file
+    line = json.dumps(record, default=str) + "\n"
+    with _trace_lock:
+        if _trace_file is None:
+            _trace_file = open(TRACE_LOG_PATH, "a", encoding="utf-8", buffering=1)
+        _trace_file.write(line)
+
+
+class span:
+    # Times a stage into dataverse_stage_duration_seconds and, with
+    # TRACE_LOG_PATH set, logs it with its trace and parent span ids. Works
+    # as a context manager in sync and async code alike.
+
+    __slots__ = ("name", "attrs", "ids", "token", "start", "wall")
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        if not TELEMETRY_ENABLED:
+            return self
+        self.start = time.perf_counter()
+        if TRACE_LOG_PATH:
+            parent = _current_span.get()
+            span_id = uuid.uuid4().hex[:16]
+            self.ids = (parent[0] if parent else span_id, span_id, parent[1] if parent else None)
+            self.wall = time.time()
+            self.token = _current_span.set(self.ids)
+        return self
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        if not TELEMETRY_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self.start
+        observe("dataverse_stage_duration_seconds", elapsed, stage=self.name)
+        if TRACE_LOG_PATH:
+            _current_span.reset(self.token)
+            trace_id, span_id, parent_id = self.ids
+            _write_trace({"trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "name": self.name,
+                          "start": self.wall, "seconds": round(elapsed, 6),
+                          "status": "error" if exc_type else "ok", **self.attrs})
+        return False
+
+
+def traced(name):
+    # Decorator form of span() for sync and async functions.
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_tokens(model, prompt_tokens, completion_tokens):
+    if prompt_tokens:
+        inc("dataverse_llm_tokens_total", prompt_tokens, model=model, type="prompt")
+    if completion_tokens:
+        inc("dataverse_llm_tokens_total", completion_tokens, model=model, type="completion")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_metrics():
+    # Prometheus text exposition format (version 0.0.4).
+    with _lock:
+        snapshot = {name: {k: (v if not isinstance(v, list) else [list(v[0]), v[1], v[2]])
+                           for k, v in series.items()} for name, series in _values.items()}
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(snapshot[name].items()):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(key)} {value}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_labels(key)} {round(total, 6)}")
+            lines.append(f"{name}_count{_labels(key)} {count}")
+    return "\n".join(lines) + "\n"
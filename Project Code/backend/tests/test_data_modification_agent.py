@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from data_modification_agent import apply_compiled  # noqa: E402
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "name": ["a", None, "c"],
+        "price": [1.0, None, 3.0],
+        "mixed": [1, "two", None],
+    })
+
+
+def test_compiled_error_falls_back_to_the_agent(df):
+    # The mean of a text column raises a TypeError inside pandas.
+    assert apply_compiled("fill nulls in name with the mean", df) is None
+    assert apply_compiled("fill nulls in mixed with the mean", df) is None
+    assert df["name"].isna().sum() == 1
+    out, _ = apply_compiled("fill nulls in price with the mean", df)
+    assert out["price"].tolist() == [1.0, 2.0, 3.0]
@@ -0,0 +1,27 @@
+import os
+import threading
+
+from dataset_versions import get_dataset
+
+
+def test_concurrent_replace_commits_do_not_deadlock(tmp_path):
+    for name in ("a.csv", "b.csv"):
+        (tmp_path / name).write_text("x\n1\n")
+    dataset = get_dataset(str(tmp_path))
+    ready = threading.Barrier(2)
+
+    def replace_with(name):
+        # Each transaction holds its own file's lock and needs the other's to replace.
+        txn = dataset.transaction([name], replace=True)
+        with open(txn.path(name), "w") as f:
+            f.write("x\n2\n")
+        ready.wait()
+        txn.commit()
+
+    threads = [threading.Thread(target=replace_with, args=(name,), daemon=True) for name in ("b.csv", "a.csv")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert not any(t.is_alive() for t in threads)
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".csv")]) == 1
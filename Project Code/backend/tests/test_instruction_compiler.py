@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from instruction_compiler import compile_instruction, InstructionNotApplicable
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "country": ["US", "UK", "XX", None],
+        "price": [1.0, None, 3.0, None],
+        "name": ["a", "b", "b", "c"],
+    })
+
+
+def test_fill_nulls_with_number(df):
+    out = compile_instruction("fill nulls in price with 0").apply(df)
+    assert out["price"].tolist() == [1.0, 0.0, 3.0, 0.0]
+
+
+def test_fill_nulls_with_strategy(df):
+    out = compile_instruction("fill missing values in price with the mean").apply(df)
+    assert out["price"].tolist() == [1.0, 2.0, 3.0, 2.0]
+    out = compile_instruction("fill nulls in name with the most frequent value").apply(df)
+    assert out["name"].tolist() == ["a", "b", "b", "c"]
+
+
+def test_fill_nulls_with_quoted_value(df):
+    out = compile_instruction("fill nulls in country with 'not known'").apply(df)
+    assert out["country"].tolist() == ["US", "UK", "XX", "not known"]
+
+
+def test_drop_rows_where(df):
+    out = compile_instruction("drop rows where country is XX").apply(df)
+    assert out["name"].tolist() == ["a", "b", "c"]
+    out = compile_instruction("remove rows where price > 2").apply(df)
+    assert out["name"].tolist() == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("instruction", [
+    "fill nulls in price with 0 for rows where country is US",
+    "fill nulls in price with 0 if country is US",
+    "fill nulls in price with 0 except for UK",
+    "drop rows where country is XX or UK",
+    "drop rows where country is 'XX' or 'UK'",
+    "drop rows where country is US and price > 2",
+    "drop rows where price > 2 for UK",
+    "drop rows with missing values in price where country is US",
+    "drop rows with null values in price or country",
+    "remove duplicates based on name if price is set",
+    "drop columns price and name except for country",
+])
+def test_qualified_instructions_fall_through(instruction):
+    assert compile_instruction(instruction) is None
+
+
+def test_column_lists_with_and_still_compile(df):
+    out = compile_instruction("drop columns price and name").apply(df)
+    assert list(out.columns) == ["country"]
+    out = compile_instruction("drop rows with missing values in price, country").apply(df)
+    assert out["name"].tolist() == ["a", "b"]
+
+
+def test_unknown_column_is_not_applicable(df):
+    with pytest.raises(InstructionNotApplicable):
+        compile_instruction("fill nulls in nope with 0").apply(df)
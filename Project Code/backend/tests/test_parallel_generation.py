@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from parallel_generation import _table_inserts, _parent_keys_text, require_generated_rows  # noqa: E402
+from sql_tokenizer import tokenize, parse_table_schema  # noqa: E402
+
+
+def _schema(sql):
+    return parse_table_schema(list(tokenize(sql)))
+
+
+def test_parent_keys_use_the_referenced_column_by_name():
+    parent = _schema("CREATE TABLE customers (id INT PRIMARY KEY, name TEXT);")
+    child = _schema("CREATE TABLE orders (id INT, customer_id INT REFERENCES customers(id));")
+    text = ("INSERT INTO customers (id, name) VALUES (1, 'Ann');\n"
+            "INSERT INTO customers (name, id) VALUES ('Bob', 2);")
+    _, columns, rows = _table_inserts(text, "customers", parent)
+    assert columns == ["id", "name"]
+    assert rows == [["1", "Ann"], ["2", "Bob"]]
+    keys = _parent_keys_text(child, {"customers": (columns, rows)})
+    assert "customers.id values: 1, 2" in keys
+
+
+def test_a_run_without_rows_is_refused():
+    require_generated_rows({"customers": {"status": "done", "rows": 2, "attempts": 1},
+                            "orders": {"status": "failed", "rows": 0, "attempts": 3, "error": "timeout"}})
+    with pytest.raises(ValueError, match="orders: Parent table customers has no rows"):
+        require_generated_rows({"customers": {"status": "failed", "rows": 0, "attempts": 3, "error": "timeout"},
+                                "orders": {"status": "skipped", "rows": 0, "attempts": 0,
+                                           "error": "Parent table customers has no rows."}})
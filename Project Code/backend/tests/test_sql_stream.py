@@ -0,0 +1,53 @@
+import asyncio
+import csv
+import os
+
+from sql_stream import stream_sql_generation, FenceFilter
+
+
+class ChunkedLLM:
+    # Replays a reply in fixed chunks, the way a streaming chat model would.
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def astream(self, prompt_text):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _run(chunks, folder):
+    async def collect():
+        return [event async for event in stream_sql_generation(ChunkedLLM(chunks), "prompt", folder)]
+    return asyncio.run(collect())
+
+
+def _tokens(events):
+    return "".join(data for event, data in events if event == "token")
+
+
+def test_fence_split_across_chunks_does_not_leak_backticks():
+    fences = FenceFilter()
+    text = "".join(fences.feed(chunk) for chunk in ["Final Answer:\n`", "``s", "ql\nSELECT 1;\n``", "`"])
+    assert text + fences.flush() == "Final Answer:\n\nSELECT 1;\n"
+
+
+def test_stream_after_marker_with_split_fence(tmp_path):
+    chunks = ["Thought: done\nFinal Ans", "wer:\n``", "`sql\nCREATE TABLE t (id INT, name TEXT);\n",
+              "INSERT INTO t VALUES (1, 'a');\n`", "``"]
+    events = _run(chunks, str(tmp_path))
+    assert "`" not in _tokens(events)
+    assert "Thought" not in _tokens(events)
+    assert events[-1][1]["tables"] == {"t": 1}
+    with open(os.path.join(tmp_path, "t_data.csv"), newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["id", "name"], ["1", "a"]]
+
+
+def test_reply_without_marker_streams_before_the_end(tmp_path):
+    chunks = ["CREATE TABLE t (id INT);\n", "INSERT INTO t VALUES (1);\n", "INSERT INTO t VALUES (2);\n"]
+    events = _run(chunks, str(tmp_path))
+    # Rows for the first INSERT arrive before the last chunk's token.
+    first_rows = next(i for i, (event, _) in enumerate(events) if event == "rows")
+    last_token = max(i for i, (event, _) in enumerate(events) if event == "token")
+    assert first_rows < last_token
+    assert events[-1][1]["tables"] == {"t": 2}
@@ -0,0 +1,60 @@
+import csv
+import os
+
+import pytest
+
+from sql_tokenizer import write_inserts_to_csv, align_rows, NULL
+
+
+def _read(folder, table):
+    with open(os.path.join(folder, f"{table}_data.csv"), newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_rows_follow_create_table_columns(tmp_path):
+    sql = """
+    CREATE TABLE users (id INT, name TEXT, city TEXT);
+    INSERT INTO users (id, name, city) VALUES (1, 'Ann', 'Oslo');
+    INSERT INTO users (city, id, name) VALUES ('Rome', 2, 'Bob');
+    INSERT INTO users VALUES (3, 'Cy', 'Lima');
+    """
+    assert write_inserts_to_csv(sql, str(tmp_path)) == {"users": 3}
+    assert _read(tmp_path, "users") == [
+        ["id", "name", "city"], ["1", "Ann", "Oslo"], ["2", "Bob", "Rome"], ["3", "Cy", "Lima"]]
+
+
+def test_partial_column_lists_leave_missing_columns_empty(tmp_path):
+    sql = """
+    CREATE TABLE users (id INT, name TEXT, city TEXT);
+    INSERT INTO users (name, id) VALUES ('Ann', 1), ('Bob', 2);
+    INSERT INTO users (id, city) VALUES (3, 'Lima');
+    """
+    write_inserts_to_csv(sql, str(tmp_path))
+    assert _read(tmp_path, "users") == [
+        ["id", "name", "city"], ["1", "Ann", ""], ["2", "Bob", ""], ["3", "", "Lima"]]
+
+
+def test_first_insert_sets_the_header_without_create_table(tmp_path):
+    sql = """
+    INSERT INTO orders (id, total) VALUES (1, 9.5);
+    INSERT INTO orders (total, id, coupon) VALUES (3.0, 2, 'X');
+    """
+    write_inserts_to_csv(sql, str(tmp_path))
+    # Columns the header does not have are dropped.
+    assert _read(tmp_path, "orders") == [["id", "total"], ["1", "9.5"], ["2", "3.0"]]
+
+
+def test_insert_without_column_list_or_create_table(tmp_path):
+    write_inserts_to_csv("INSERT INTO t VALUES (1, 'a'), (2, 'b');", str(tmp_path))
+    assert _read(tmp_path, "t") == [["column_1", "column_2"], ["1", "a"], ["2", "b"]]
+
+
+@pytest.mark.parametrize("columns, rows, expected", [
+    (["a", "b"], [[1, 2]], [[1, 2]]),
+    (["B", "a"], [[2, 1]], [[1, 2]]),
+    (["b"], [[2]], [[NULL, 2]]),
+    (["c", "a"], [[3, 1]], [[1, NULL]]),
+    ([], [[1, 2]], [[1, 2]]),
+])
+def test_align_rows(columns, rows, expected):
+    assert align_rows(columns, ["a", "b"], rows) == expected
@@ -0,0 +1,152 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# Dataset folder of the default workspace, used when a request names none.
+CSV_FOLDER = os.getenv("CSV_FOLDER", r"D:\PROJECTS\DataVerse Hub\Project Code\backend\Industry-Sub_domain Data")
+# Every other workspace gets its own folder under this directory.
+WORKSPACES_DIR = os.getenv("WORKSPACES_DIR", os.path.join(os.path.dirname(CSV_FOLDER), "workspaces"))
+WORKSPACE_HEADER = "X-Workspace-Id"
+WORKSPACE_COOKIE = "workspace_id"
+DEFAULT_WORKSPACE_ID = "default"
+# Idle workspaces drop their agents after this many seconds; their data stays on disk.
+WORKSPACE_TTL = float(os.getenv("WORKSPACE_TTL", 1800))
+WORKSPACE_MAX_RESIDENT = int(os.getenv("WORKSPACE_MAX_RESIDENT", 32))
+# Estimated memory of all resident agents together.
+WORKSPACE_MEMORY_BUDGET_MB = int(os.getenv("WORKSPACE_MEMORY_BUDGET_MB", 2048))
+
+_WORKSPACE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class InvalidWorkspace(ValueError):
+    pass
+
+
+class Workspace:
+    # Everything that used to be process-wide for the one dataset: its folder,
+    # the cached CSV agent and its warmup state, the SQL agent, and an epoch
+    # that scopes answer-cache entries to the current data.
+
+    def __init__(self, workspace_id, folder):
+        self.id = workspace_id
+        self.folder = folder
+        self.cached_agent = None
+        self.data_version = None
+        self.agent_status = {"state": "cold", "error": None, "seconds": None}
+        self.warmup_task = None
+        self.sql_agent = None
+        self.sql_agent_version = None
+        self.answer_epoch = 0
+        self.memory_bytes = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def resident(self):
+        return self.cached_agent is not None or self.sql_agent is not None
+
+    def answer_scope(self, version):
+        return f"{self.id}:{self.answer_epoch}:{version}"
+
+    def data_changed(self):
+        self.answer_epoch += 1
+
+    def evict(self):
+        if self.warmup_task is not None and not self.warmup_task.done():
+            self.warmup_task.cancel()
+        self.cached_agent = None
+        self.sql_agent = None
+        self.sql_agent_version = None
+        self.memory_bytes = 0
+        self.agent_status = {"state": "cold", "error": None, "seconds": None}
+
+    def describe(self):
+        return {"id": self.id, "agent": self.agent_status, "resident": self.resident,
+                "memory_mb": round(self.memory_bytes / 2 ** 20, 2),
+                "idle_seconds": round(time.monotonic() - self.last_used, 1)}
+
+
+class WorkspaceRegistry:
+    # Workspaces in least-recently-used order. Agents of idle workspaces are
+    # dropped after `ttl` seconds, and the least recently used ones go first
+    # when more than `max_resident` are loaded or their estimated memory
+    # exceeds the budget.
+
+    def __init__(self, root=WORKSPACES_DIR, default_folder=CSV_FOLDER, ttl=WORKSPACE_TTL,
+                 max_resident=WORKSPACE_MAX_RESIDENT, memory_budget_mb=WORKSPACE_MEMORY_BUDGET_MB):
+        self.root = root
+        self.default_folder = default_folder
+        self.ttl = ttl
+        self.max_resident = max_resident
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def folder_for(self, workspace_id):
+        if workspace_id == DEFAULT_WORKSPACE_ID:
+            return self.default_folder
+        return os.path.join(self.root, workspace_id)
+
+    def get(self, workspace_id=None):
+        workspace_id = workspace_id or DEFAULT_WORKSPACE_ID
+        if not _WORKSPACE_ID.match(workspace_id):
+            raise InvalidWorkspace("Workspace ids are 1-64 letters, digits, '-' or '_'.")
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is None:
+                folder = self.folder_for(workspace_id)
+                os.makedirs(folder, exist_ok=True)
+                workspace = self._workspaces[workspace_id] = Workspace(workspace_id, folder)
+            workspace.last_used = time.monotonic()
+            self._workspaces.move_to_end(workspace_id)
+            self._evict(keep=workspace)
+            return workspace
+
+    def agent_loaded(self, workspace, memory_bytes):
+        with self._lock:
+            workspace.memory_bytes = memory_bytes
+            self._evict(keep=workspace)
+
+    def _evict(self, keep):
+        others = [w for w in self._workspaces.values() if w is not keep]
+        resident = [w for w in others if w.resident]
+        count = len(resident) + keep.resident
+        memory = sum(w.memory_bytes for w in resident) + keep.memory_bytes
+        for workspace in resident:
+            if count <= self.max_resident and memory <= self.memory_budget:
+                break
+            memory -= workspace.memory_bytes
+            count -= 1
+            workspace.evict()
+            self.evictions += 1
+        # Idle workspaces are forgotten altogether; the next request recreates
+        # them from their folder.
+        now = time.monotonic()
+        for workspace in others:
+            if now - workspace.last_used <= self.ttl:
+                break
+            if workspace.resident:
+                self.evictions += 1
+            workspace.evict()
+            del self._workspaces[workspace.id]
+
+    def close(self):
+        with self._lock:
+            for workspace in self._workspaces.values():
+                workspace.evict()
+            self._workspaces.clear()
+
+    def stats(self):
+        with self._lock:
+            workspaces = [w.describe() for w in self._workspaces.values()]
+        return {
+            "workspaces": workspaces,
+            "resident": sum(1 for w in workspaces if w["resident"]),
+            "memory_mb": round(sum(w["memory_mb"] for w in workspaces), 2),
+            "memory_budget_mb": round(self.memory_budget / 2 ** 20, 2),
+            "max_resident": self.max_resident,
+            "ttl_seconds": self.ttl,
+            "evictions": self.evictions,
+        }